@@ -2,6 +2,7 @@ from __future__ import annotations
 
 import json
 import time
+import uuid
 from collections import OrderedDict, defaultdict
 from functools import lru_cache
 from pathlib import Path
@@ -19,16 +20,16 @@ from rich.tree import Tree
 
 from agent.config import ModelSpec, llama_config
 from agent.core.agent_logger import agent_logger
+from agent.core.blob_store import blob_store
+from agent.core.checkpoint import invoke_with_checkpoint
 from agent.core.llm import get_llm_stats, reset_llm_stats
 from agent.core.model_downloader import model_downloader
 from agent.core.model_manager import model_manager
+from agent.core.speculation import speculator
 from agent.core.state import AgentState, initial_state
+from agent.core.tokens import estimate_tokens
 from agent.tools.document_loader import DocumentLoader
-from agent.tools.legal_rag import legal_rag_tool
-try:
-    import tiktoken
-except ImportError:  # pragma: no cover - optional dependency
-    tiktoken = None  # type: ignore[assignment]
+from agent.tools.legal_rag import legal_indexes
 
 
 app = typer.Typer(add_completion=False)
@@ -38,18 +39,22 @@ console = Console()
 document_loader = DocumentLoader()
 
 NODE_LABELS = {
+    "router": "Маршрутизатор",
     "planner": "Планировщик",
     "executor": "Исполнитель",
     "reflector": "Рефлектор",
     "synthesizer": "Синтезатор",
+    "direct_answer": "Прямой ответ",
     "document_loader": "Загрузка документов",
 }
 
 NODE_ICONS = {
+    "router": "🧭",
     "planner": "🧠",
     "executor": "⚙️",
     "reflector": "🔁",
     "synthesizer": "🧾",
+    "direct_answer": "💬",
     "document_loader": "📄",
 }
 
@@ -84,10 +89,12 @@ def ensure_models(download: bool = True) -> None:
     MODELS_READY = True
 
 
-def run_query(query: str, files: List[Path]) -> AgentState:
+def run_query(
+    query: str, files: List[Path], thread_id: str | None = None, namespace: str | None = None
+) -> AgentState:
     ensure_models()
     reset_llm_stats()
-    state = initial_state(query, [str(path) for path in files])
+    state = initial_state(query, [str(path) for path in files], namespace=namespace)
     if files:
         doc_rows = _collect_file_metadata(state, files)
         if doc_rows:
@@ -96,21 +103,31 @@ def run_query(query: str, files: List[Path]) -> AgentState:
     console.rule("[bold]Старт когнитивного цикла[/bold]")
     layout, live_callback = _build_live_view()
     agent_logger.subscribe(live_callback)
+    result: AgentState | None = None
     try:
         with Live(layout, console=console, refresh_per_second=4, transient=True):
-            result = _agent_graph().invoke(state)
+            result = invoke_with_checkpoint(_agent_graph(), state, thread_id or _new_thread_id())
     finally:
         agent_logger.reset_subscribers()
+        # Упавший прогон сохраняет блобы для продолжения с чекпоинта; их убирает TTL.
+        if result is not None:
+            blob_store.release(result.get("run_id"))
+        speculator.discard(state.get("run_id"))
     result["llm_stats"] = get_llm_stats().to_dict()
+    result["llm_stats"]["skipped_calls"] = sum(result.get("llm_calls_skipped", {}).values())
     result["llm_backend"] = model_manager.backend_report()
     return result
 
 
+def _new_thread_id() -> str:
+    return f"cli-{uuid.uuid4().hex}"
+
+
 @lru_cache(maxsize=1)
 def _agent_graph():
-    from agent.core.graph import agent_graph as graph
+    from agent.core.graph import get_agent_graph
 
-    return graph
+    return get_agent_graph()
 
 
 @app.command(context_settings={"allow_extra_args": True})
@@ -123,12 +140,13 @@ def query(
         "-f",
         help="Список файлов для контекста (можно перечислить несколько путей через пробел после опции)",
     ),
+    org: Optional[str] = typer.Option(None, "--org", help="Организация: поиск по её юридическому индексу"),
 ) -> None:
     """Одноразовый запуск агента."""
 
     extra_files = [Path(arg) for arg in ctx.args]
     all_files = list(files) + extra_files
-    result = run_query(text, all_files)
+    result = run_query(text, all_files, namespace=org)
     events = result.get("events", [])
     if events:
         _print_timeline(events)
@@ -153,6 +171,7 @@ def interactive() -> None:
 
     console.print("[bold]Интерактивный режим. Введите 'exit' для выхода.[/bold]")
     files: List[Path] = []
+    thread_id = _new_thread_id()
     while True:
         user = console.input("[bold blue]Вы[/bold blue]: ")
         if user.strip().lower() in {"exit", "quit"}:
@@ -166,7 +185,7 @@ def interactive() -> None:
             else:
                 console.print(f"[red]Файл {file_path} не найден[/red]")
             continue
-        result = run_query(user, files)
+        result = run_query(user, files, thread_id=thread_id)
         console.print(Markdown(result.get("final_answer", "нет ответа")))
         _print_stats(result.get("llm_stats"))
 
@@ -174,11 +193,116 @@ def interactive() -> None:
 @app.command("index-documents")
 def index_documents(
     directory: Path = typer.Argument(..., exists=True, file_okay=False, help="Путь к папке с договорами"),
+    rebuild: bool = typer.Option(False, "--rebuild", help="Пересобрать индекс с нуля"),
+    org: Optional[str] = typer.Option(None, "--org", help="Организация: индекс в legal/orgs/<id>"),
+    run_benchmark: bool = typer.Option(False, "--benchmark", help="Замерить recall и задержку новой версии"),
+) -> None:
+    """Построение RAG индекса для юридических документов (инкрементально)."""
+
+    report = legal_indexes.get(org, create=True).index_documents(
+        directory, rebuild=rebuild, run_benchmark=run_benchmark
+    )
+    console.print(
+        f"[green]Документов в индексе: {report.documents}[/green] "
+        f"(добавлено {report.added}, обновлено {report.updated}, удалено {report.removed}, "
+        f"без изменений {report.unchanged}; новых фрагментов {report.embedded_chunks})"
+    )
+    if report.failed:
+        console.print(
+            f"[yellow]Не удалось извлечь текст из {report.failed} файлов — они будут разобраны "
+            "при следующем запуске (подробности в логе).[/yellow]"
+        )
+    if report.benchmark.get("runs"):
+        table = Table("Параметры", f"Recall@{report.benchmark['k']}", "Задержка, мс/запрос")
+        for run in report.benchmark["runs"]:
+            params = ", ".join(f"{key}={value}" for key, value in run.items() if key not in {"recall", "latency_ms"})
+            table.add_row(params or "точный поиск", f"{run['recall']:.3f}", f"{run['latency_ms']:.3f}")
+        codec = "" if report.codec == "none" else f" ({report.codec})"
+        console.print(
+            Panel(table, title=f"Индекс {report.index_type}{codec}: {report.benchmark['vectors']} векторов")
+        )
+    if report.embedded_chunks:
+        _print_embedding_cache()
+
+
+@app.command("legal-eval")
+def legal_eval(
+    k: int = typer.Option(10, "--k", help="Сколько соседей сравнивать"),
+    queries: int = typer.Option(200, "--queries", help="Число запросов из корпуса"),
+    org: Optional[str] = typer.Option(None, "--org", help="Организация: индекс в legal/orgs/<id>"),
 ) -> None:
-    """Построение RAG индекса для юридических документов."""
+    """Потеря recall при сжатии юридического индекса относительно float-поиска."""
+
+    result = legal_indexes.get(org).evaluate_compression(k=k, queries=queries)
+    if not result["variants"]:
+        console.print("[yellow]Индекс пуст[/yellow]")
+        return
+    baseline = result["variants"][0]["bytes"] or 1
+    table = Table("Вариант", "Размер, МБ", "Сжатие", f"Recall@{result['k']}", "С уточнением", "Задержка, мс/запрос")
+    for row in result["variants"]:
+        table.add_row(
+            row["codec"],
+            f"{row['bytes'] / 2**20:.1f}",
+            f"{baseline / max(row['bytes'], 1):.1f}×",
+            f"{row['recall']:.3f}",
+            f"{row['recall_rerank']:.3f}",
+            f"{row['latency_ms']:.3f}",
+        )
+    console.print(
+        Panel(
+            table,
+            title=f"Индекс {result['type']}: {result['vectors']} векторов, уточнение по {result['rerank_fetch']} кандидатам",
+        )
+    )
+    if result["skipped"]:
+        console.print(
+            f"[yellow]Пропущены (слишком мало векторов для обучения): {', '.join(result['skipped'])}[/yellow]"
+        )
+
+
+@app.command("plan-cache")
+def plan_cache_stats() -> None:
+    """Статистика кэша шаблонов планов."""
+
+    from agent.core.plan_cache import plan_cache
 
-    count = legal_rag_tool.index_documents(directory)
-    console.print(f"[green]Загружено документов: {count}[/green]")
+    stats = plan_cache.stats()
+    table = Table("Показатель", "Значение")
+    table.add_row("Шаблонов", str(stats["templates"]))
+    table.add_row("Поисков / попаданий", f"{stats['lookups']} / {stats['hits']}")
+    table.add_row("Hit rate", f"{stats['hit_rate']:.1%}")
+    table.add_row(
+        "Успешных прогонов по шаблону",
+        f"{stats['cache_success']} из {stats['cache_success'] + stats['cache_failure']} ({stats['success_rate']:.1%})",
+    )
+    table.add_row("Порог сходства", str(stats["threshold"]))
+    console.print(Panel(table, title="Кэш планов"))
+
+
+@app.command("embedding-cache")
+def embedding_cache_stats() -> None:
+    """Статистика кэша эмбеддингов."""
+
+    _print_embedding_cache()
+
+
+def _print_embedding_cache() -> None:
+    from agent.core.embeddings import embeddings
+
+    stats = embeddings.cache.stats()
+    table = Table("Показатель", "Значение")
+    table.add_row("Модель", stats["model"])
+    table.add_row("Векторов на диске", str(stats["stored_rows"]))
+    table.add_row(
+        "Поисков (память / диск / промах)",
+        f"{stats['lookups']} ({stats['memory_hits']} / {stats['disk_hits']} / {stats['misses']})",
+    )
+    table.add_row("Hit rate", f"{stats['hit_rate']:.1%}")
+    batches = embeddings.batcher.stats()
+    if batches["batches"]:
+        table.add_row("Запросов / батчей модели", f"{batches['requests']} / {batches['batches']}")
+        table.add_row("Средний батч, текстов", str(batches["avg_batch"]))
+    console.print(Panel(table, title="Кэш эмбеддингов"))
 
 
 SLOT_LABELS = {"orchestrator": "Оркестратор", "executor": "Исполнитель"}
@@ -199,6 +323,8 @@ def _print_stats(stats: dict | None, *, backend: dict | None = None) -> None:
         f"{stats.get('prompt_ms', 0.0)} / {stats.get('eval_ms', 0.0)}",
     )
     table.add_row("Скорость, ток/с", f"{stats.get('tokens_per_second', 0.0)}")
+    if skipped := stats.get("skipped_calls"):
+        table.add_row("Пропущено вызовов LLM", str(skipped))
     console.print(Panel(table, title="LLM статистика"))
     if backend:
         _print_backend_info(backend)
@@ -218,32 +344,6 @@ def _print_backend_info(backend: dict) -> None:
     console.print(Panel(table, title="LLM Backend"))
 
 
-_TOKEN_ENCODER = None
-
-
-def _ensure_token_encoder():
-    global _TOKEN_ENCODER
-    if _TOKEN_ENCODER is not None:
-        return _TOKEN_ENCODER
-    if tiktoken is None:
-        return None
-    try:
-        _TOKEN_ENCODER = tiktoken.get_encoding("cl100k_base")
-    except Exception:  # pragma: no cover - fallback path
-        _TOKEN_ENCODER = None
-    return _TOKEN_ENCODER
-
-
-def _estimate_tokens(text: str) -> int:
-    encoder = _ensure_token_encoder()
-    if encoder is None:
-        return max(1, len(text) // 4) if text else 0
-    try:
-        return len(encoder.encode(text))
-    except Exception:  # pragma: no cover - encoding edge cases
-        return max(1, len(text) // 4) if text else 0
-
-
 def _collect_file_metadata(state: AgentState, files: List[Path]) -> List[dict]:
     rows: List[dict] = []
     for file_path in files:
@@ -279,7 +379,7 @@ def _build_document_row(path: Path, record: dict) -> dict:
         "size": _format_bytes(size_bytes),
         "size_bytes": size_bytes,
         "lines": lines,
-        "tokens": _estimate_tokens(text),
+        "tokens": estimate_tokens(text),
     }
 
 
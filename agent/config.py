@@ -78,8 +78,111 @@ class LlamaConfig:
     embed_model_name: str = os.getenv("EMBEDDER_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
 
 
+def _per_tool_from_env(name: str, defaults: dict[str, int]) -> dict[str, int]:
+    """Parse ``tool=value,tool=value`` integer overrides on top of defaults."""
+
+    values = dict(defaults)
+    for item in os.getenv(name, "").split(","):
+        tool, _, value = item.partition("=")
+        if tool.strip() and value.strip().isdigit():
+            values[tool.strip()] = int(value)
+    return values
+
+
+@dataclass(slots=True)
+class AgentConfig:
+    """Runtime knobs of the LangGraph pipeline."""
+
+    max_parallel_steps: int = int(os.getenv("AGENT_MAX_PARALLEL_STEPS", "4"))
+    tool_cache_enabled: bool = os.getenv("TOOL_CACHE_ENABLED", "true").lower() in {"1", "true", "yes"}
+    tool_cache_dir: Path = Path(os.getenv("TOOL_CACHE_DIR", DATA_DIR / "cache" / "tools"))
+    tool_cache_memory_items: int = int(os.getenv("TOOL_CACHE_MEMORY_ITEMS", "128"))
+    tool_cache_ttls: dict[str, int] = field(
+        default_factory=lambda: _per_tool_from_env(
+            "TOOL_CACHE_TTLS",
+            {"financial_analyzer": 3600, "legal_retriever": 86400, "document_loader": 86400},
+        )
+    )
+    checkpointer: str = os.getenv("AGENT_CHECKPOINTER", "sqlite")
+    checkpoint_path: Path = Path(os.getenv("AGENT_CHECKPOINT_PATH", DATA_DIR / "checkpoints.sqlite"))
+    checkpoint_dsn: str | None = os.getenv("AGENT_CHECKPOINT_DSN")
+    history_turns: int = int(os.getenv("AGENT_HISTORY_TURNS", "4"))
+    blob_inline_chars: int = int(os.getenv("BLOB_INLINE_CHARS", "2000"))
+    blob_memory_bytes: int = int(os.getenv("BLOB_MEMORY_BYTES", str(64 * 1024 * 1024)))
+    blob_dir: Path = Path(os.getenv("BLOB_DIR", DATA_DIR / "cache" / "blobs"))
+    blob_ttl_seconds: int = int(os.getenv("BLOB_TTL_SECONDS", str(24 * 3600)))
+    synthesizer_result_chars: int = int(os.getenv("SYNTHESIZER_RESULT_CHARS", "6000"))
+    plan_cache_enabled: bool = os.getenv("PLAN_CACHE_ENABLED", "true").lower() in {"1", "true", "yes"}
+    plan_cache_path: Path = Path(os.getenv("PLAN_CACHE_PATH", DATA_DIR / "cache" / "plans.json"))
+    plan_cache_threshold: float = float(os.getenv("PLAN_CACHE_THRESHOLD", "0.9"))
+    plan_cache_max_entries: int = int(os.getenv("PLAN_CACHE_MAX_ENTRIES", "256"))
+    router_enabled: bool = os.getenv("ROUTER_ENABLED", "true").lower() in {"1", "true", "yes"}
+    router_threshold: float = float(os.getenv("ROUTER_THRESHOLD", "0.6"))
+    router_margin: float = float(os.getenv("ROUTER_MARGIN", "0.05"))
+    speculation_enabled: bool = os.getenv("SPECULATION_ENABLED", "true").lower() in {"1", "true", "yes"}
+    speculation_workers: int = int(os.getenv("SPECULATION_WORKERS", "2"))
+    tool_timeouts: dict[str, int] = field(
+        default_factory=lambda: _per_tool_from_env(
+            "TOOL_TIMEOUTS",
+            {"financial_analyzer": 300, "legal_retriever": 60, "marketing_generator": 300, "document_loader": 120},
+        )
+    )
+    tool_concurrency: dict[str, int] = field(
+        default_factory=lambda: _per_tool_from_env(
+            "TOOL_CONCURRENCY",
+            {"financial_analyzer": 2, "legal_retriever": 4, "marketing_generator": 2, "document_loader": 2},
+        )
+    )
+    tool_plugins: tuple[str, ...] = tuple(
+        item.strip() for item in os.getenv("AGENT_TOOL_PLUGINS", "").split(",") if item.strip()
+    )
+    cpu_pool_enabled: bool = os.getenv("AGENT_CPU_POOL", "true").lower() in {"1", "true", "yes"}
+    cpu_pool_workers: int = int(os.getenv("AGENT_CPU_WORKERS", str(min(4, os.cpu_count() or 1))))
+    pdf_max_pages: int = int(os.getenv("PDF_MAX_PAGES", "0"))
+    doc_max_tokens: int = int(os.getenv("DOC_MAX_TOKENS", str(int(os.getenv("LLAMA_CTX", "8192")) // 2)))
+    doc_chunk_tokens: int = int(os.getenv("DOC_CHUNK_TOKENS", str(int(os.getenv("LLAMA_CTX", "8192")) // 4)))
+    doc_summary_tokens: int = int(os.getenv("DOC_SUMMARY_TOKENS", "300"))
+    doc_summary_workers: int = int(os.getenv("DOC_SUMMARY_WORKERS", "2"))
+    doc_digest_budget_s: float = float(os.getenv("DOC_DIGEST_BUDGET_S", "90"))
+    doc_summary_cache_dir: Path = Path(os.getenv("DOC_SUMMARY_CACHE_DIR", DATA_DIR / "cache" / "summaries"))
+    context_budget_tokens: int = int(
+        os.getenv("CONTEXT_BUDGET_TOKENS", str(int(os.getenv("LLAMA_CTX", "8192")) // 2))
+    )
+    context_chunk_tokens: int = int(os.getenv("CONTEXT_CHUNK_TOKENS", "300"))
+    context_dense_weight: float = float(os.getenv("CONTEXT_DENSE_WEIGHT", "0.6"))
+    legal_snippet_tokens: int = int(os.getenv("LEGAL_SNIPPET_TOKENS", "200"))
+    legal_chunk_tokens: int = int(os.getenv("LEGAL_CHUNK_TOKENS", "200"))
+    legal_chunk_overlap: int = int(os.getenv("LEGAL_CHUNK_OVERLAP", "40"))
+    legal_chunk_candidates: int = int(os.getenv("LEGAL_CHUNK_CANDIDATES", "5"))
+    legal_index_type: str = os.getenv("LEGAL_INDEX_TYPE", "auto")
+    legal_hnsw_m: int = int(os.getenv("LEGAL_HNSW_M", "32"))
+    legal_ef_construction: int = int(os.getenv("LEGAL_EF_CONSTRUCTION", "80"))
+    legal_ef_search: int = int(os.getenv("LEGAL_EF_SEARCH", "64"))
+    legal_nprobe: int = int(os.getenv("LEGAL_NPROBE", "16"))
+    legal_pq_m: int = int(os.getenv("LEGAL_PQ_M", "0"))
+    legal_train_sample: int = int(os.getenv("LEGAL_TRAIN_SAMPLE", "50000"))
+    legal_compression: str = os.getenv("LEGAL_COMPRESSION", "none")
+    legal_reduce: str = os.getenv("LEGAL_REDUCE", "none")
+    legal_reduced_dim: int = int(os.getenv("LEGAL_REDUCED_DIM", "256"))
+    legal_rerank_factor: int = int(os.getenv("LEGAL_RERANK_FACTOR", "4"))
+    legal_max_shards: int = int(os.getenv("LEGAL_MAX_SHARDS", "8"))
+    legal_shards_memory_mb: int = int(os.getenv("LEGAL_SHARDS_MEMORY_MB", "2048"))
+    legal_shared_fallback: bool = os.getenv("LEGAL_SHARED_FALLBACK", "false").lower() == "true"
+    legal_reload_interval: float = float(os.getenv("LEGAL_RELOAD_INTERVAL", "2"))
+    legal_versions_kept: int = int(os.getenv("LEGAL_VERSIONS_KEPT", "2"))
+    legal_hybrid: bool = os.getenv("LEGAL_HYBRID", "true").lower() == "true"
+    legal_rrf_k: int = int(os.getenv("LEGAL_RRF_K", "60"))
+    embed_cache_enabled: bool = os.getenv("EMBED_CACHE_ENABLED", "true").lower() in {"1", "true", "yes"}
+    embed_cache_dir: Path = Path(os.getenv("EMBED_CACHE_DIR", DATA_DIR / "cache" / "embeddings"))
+    embed_cache_memory_items: int = int(os.getenv("EMBED_CACHE_MEMORY_ITEMS", "4096"))
+    embed_batching: bool = os.getenv("EMBED_BATCHING", "true").lower() in {"1", "true", "yes"}
+    embed_batch_max: int = int(os.getenv("EMBED_BATCH_MAX", "64"))
+    embed_batch_wait_ms: float = float(os.getenv("EMBED_BATCH_WAIT_MS", "5"))
+
+
 langsmith_config = LangSmithConfig()
 llama_config = LlamaConfig()
+agent_config = AgentConfig()
 
 
 def bootstrap_environment() -> None:
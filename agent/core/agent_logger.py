@@ -126,6 +126,23 @@ class AgentLogger:
             },
         )
 
+    def log_llm_skipped(
+        self,
+        state: AgentState,
+        *,
+        node: str,
+        reason: str,
+        details: dict[str, Any] | None = None,
+    ) -> None:
+        skipped = state.setdefault("llm_calls_skipped", {})
+        skipped[node] = skipped.get(node, 0) + 1
+        self.log_event(
+            state,
+            node=node,
+            event_type="llm_call_skipped",
+            details={"reason": reason, **(details or {})},
+        )
+
     def log_document_load(
         self,
         state: AgentState,
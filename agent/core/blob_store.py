@@ -0,0 +1,126 @@
+from __future__ import annotations
+
+import hashlib
+import logging
+import shutil
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+
+from agent.config import AgentConfig, agent_config
+
+logger = logging.getLogger(__name__)
+
+BLOB_SCHEME = "blob://"
+
+
+class BlobStore:
+    """Run-scoped storage for large tool outputs.
+
+    AgentState keeps only ``blob://<run_id>/<digest>`` handles. Payloads live in
+    memory until ``blob_memory_bytes`` is reached, then spill to ``blob_dir``.
+    Blobs that were only in memory do not survive a process restart; callers
+    must treat a missing blob as "use the summary".
+
+    A run's blobs are released after it succeeds. Runs that failed keep them so
+    a resume from the checkpoint still finds its handles; they are swept once
+    untouched for ``blob_ttl_seconds``.
+    """
+
+    SWEEP_INTERVAL = 600
+
+    def __init__(self, config: AgentConfig | None = None) -> None:
+        self._config = config or agent_config
+        self._lock = threading.Lock()
+        self._memory: dict[str, dict[str, bytes]] = {}
+        self._memory_bytes = 0
+        self._touched: dict[str, float] = {}
+        self._swept_at = 0.0
+        self.directory = self._config.blob_dir
+
+    def put(self, run_id: str, text: str) -> str:
+        data = text.encode("utf-8")
+        name = hashlib.sha256(data).hexdigest()[:24]
+        handle = f"{BLOB_SCHEME}{run_id}/{name}"
+        with self._lock:
+            self._touched[run_id] = time.time()
+            blobs = self._memory.setdefault(run_id, {})
+            if name in blobs:
+                return handle
+            if self._memory_bytes + len(data) <= self._config.blob_memory_bytes:
+                blobs[name] = data
+                self._memory_bytes += len(data)
+                return handle
+        path = self._path(run_id, name)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(data)
+        return handle
+
+    def get(self, handle: str) -> Optional[str]:
+        parsed = self._parse(handle)
+        if parsed is None:
+            return None
+        run_id, name = parsed
+        with self._lock:
+            data = self._memory.get(run_id, {}).get(name)
+        if data is None:
+            try:
+                data = self._path(run_id, name).read_bytes()
+            except OSError:
+                return None
+        return data.decode("utf-8")
+
+    def release(self, run_id: str | None) -> None:
+        if not run_id:
+            return
+        with self._lock:
+            blobs = self._memory.pop(run_id, {})
+            self._touched.pop(run_id, None)
+            self._memory_bytes -= sum(len(data) for data in blobs.values())
+        shutil.rmtree(self.directory / run_id, ignore_errors=True)
+        self.sweep()
+
+    def sweep(self, *, force: bool = False) -> None:
+        """Drop blobs of runs untouched for ``blob_ttl_seconds``, in memory and on disk."""
+
+        now = time.time()
+        if not force and now - self._swept_at < self.SWEEP_INTERVAL:
+            return
+        self._swept_at = now
+        deadline = now - self._config.blob_ttl_seconds
+        with self._lock:
+            expired = [run_id for run_id, touched in self._touched.items() if touched < deadline]
+            for run_id in expired:
+                blobs = self._memory.pop(run_id, {})
+                self._touched.pop(run_id, None)
+                self._memory_bytes -= sum(len(data) for data in blobs.values())
+        try:
+            runs = list(self.directory.iterdir())
+        except OSError:
+            return
+        for path in runs:
+            try:
+                stale = path.stat().st_mtime < deadline
+            except OSError:
+                continue
+            if stale and path.name not in self._touched:
+                shutil.rmtree(path, ignore_errors=True)
+
+    def memory_bytes(self) -> int:
+        return self._memory_bytes
+
+    def _path(self, run_id: str, name: str) -> Path:
+        return self.directory / run_id / f"{name}.txt"
+
+    @staticmethod
+    def _parse(handle: str) -> Optional[tuple[str, str]]:
+        if not handle or not handle.startswith(BLOB_SCHEME):
+            return None
+        run_id, _, name = handle[len(BLOB_SCHEME) :].partition("/")
+        if not run_id or not name or "/" in name or ".." in run_id:
+            return None
+        return run_id, name
+
+
+blob_store = BlobStore()
@@ -0,0 +1,162 @@
+from __future__ import annotations
+
+import logging
+import sqlite3
+import threading
+import zlib
+from typing import Any
+
+import orjson
+from langgraph.checkpoint.base import BaseCheckpointSaver
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+
+from agent.config import AgentConfig, agent_config
+from agent.core.state import AgentState
+
+logger = logging.getLogger(__name__)
+
+
+class CompactSerializer:
+    """orjson + zlib for plain state payloads, JsonPlus for everything else.
+
+    AgentState is made of dicts, lists and scalars, so most checkpoint writes
+    take the fast path; objects orjson cannot encode fall back transparently.
+    """
+
+    TYPE = "orjson+zlib"
+
+    def __init__(self, level: int = 3, fallback: JsonPlusSerializer | None = None) -> None:
+        self.level = level
+        self._fallback = fallback or JsonPlusSerializer()
+
+    def dumps_typed(self, obj: Any) -> tuple[str, bytes]:
+        try:
+            raw = orjson.dumps(obj)
+        except TypeError:
+            return self._fallback.dumps_typed(obj)
+        return self.TYPE, zlib.compress(raw, self.level)
+
+    def loads_typed(self, data: tuple[str, bytes]) -> Any:
+        type_, payload = data
+        if type_ == self.TYPE:
+            return orjson.loads(zlib.decompress(payload))
+        return self._fallback.loads_typed(data)
+
+    def dumps(self, obj: Any) -> bytes:
+        return self._fallback.dumps(obj)
+
+    def loads(self, data: bytes) -> Any:
+        return self._fallback.loads(data)
+
+
+def build_checkpointer(config: AgentConfig | None = None) -> BaseCheckpointSaver | None:
+    """Saver selected by ``AGENT_CHECKPOINTER``.
+
+    A missing driver package or an unreachable database does not stop the
+    process: the run state is then kept in memory only, with a warning.
+    """
+
+    config = config or agent_config
+    kind = config.checkpointer.strip().lower()
+    serde = CompactSerializer()
+    if kind in {"", "none", "off"}:
+        return None
+    if kind == "memory":
+        return _memory_saver(serde)
+    try:
+        return _persistent_saver(kind, config, serde)
+    except ValueError:
+        raise
+    except Exception as exc:  # нет пакета драйвера, БД недоступна и т.п.
+        logger.warning("Чекпоинтер %s недоступен, состояние хранится только в памяти: %s", kind, exc)
+        return _memory_saver(serde)
+
+
+def _memory_saver(serde: CompactSerializer) -> BaseCheckpointSaver:
+    from langgraph.checkpoint.memory import MemorySaver
+
+    return MemorySaver(serde=serde)
+
+
+def _persistent_saver(kind: str, config: AgentConfig, serde: CompactSerializer) -> BaseCheckpointSaver:
+    if kind == "sqlite":
+        from langgraph.checkpoint.sqlite import SqliteSaver
+
+        config.checkpoint_path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(str(config.checkpoint_path), check_same_thread=False)
+        saver = SqliteSaver(conn, serde=serde)
+        saver.setup()
+        return saver
+    if kind == "postgres":
+        from langgraph.checkpoint.postgres import PostgresSaver
+        from psycopg.rows import dict_row
+        from psycopg_pool import ConnectionPool
+
+        if not config.checkpoint_dsn:
+            raise RuntimeError("AGENT_CHECKPOINT_DSN не задан для postgres-чекпоинтера")
+        pool = ConnectionPool(
+            config.checkpoint_dsn,
+            max_size=4,
+            kwargs={"autocommit": True, "prepare_threshold": 0, "row_factory": dict_row},
+        )
+        saver = PostgresSaver(pool, serde=serde)
+        saver.setup()
+        return saver
+    raise ValueError(f"Неизвестный чекпоинтер: {config.checkpointer}")
+
+
+_checkpointer_lock = threading.Lock()
+_checkpointer: tuple[BaseCheckpointSaver | None] | None = None
+
+
+def get_checkpointer() -> BaseCheckpointSaver | None:
+    """Process-wide saver, built on first use."""
+
+    global _checkpointer
+    with _checkpointer_lock:
+        if _checkpointer is None:
+            _checkpointer = (build_checkpointer(),)
+        return _checkpointer[0]
+
+
+def thread_config(thread_id: str) -> dict[str, Any]:
+    return {"configurable": {"thread_id": thread_id}}
+
+
+def session_thread_id(session_id: int | str) -> str:
+    return f"chat-{session_id}"
+
+
+def invoke_with_checkpoint(graph: Any, state: AgentState, thread_id: str) -> AgentState:
+    """Resume an interrupted run of the same request or start a new turn in the thread.
+
+    A run is resumed when the thread's last checkpoint still has pending nodes
+    and belongs to the same query and files; LangGraph then continues after the
+    last completed node. Otherwise the previous turn is carried over as history.
+    """
+
+    if getattr(graph, "checkpointer", None) is None:
+        return graph.invoke(state)
+
+    config = thread_config(thread_id)
+    snapshot = graph.get_state(config)
+    previous: dict[str, Any] = dict(snapshot.values or {})
+    if (
+        snapshot.next
+        and previous.get("query") == state.get("query")
+        and previous.get("files") == state.get("files")
+    ):
+        logger.info("Resuming thread %s from %s", thread_id, ", ".join(snapshot.next))
+        result = graph.invoke(None, config)
+        result["resumed_from"] = list(snapshot.next)
+        return result
+
+    state["history"] = _carry_history(previous, agent_config.history_turns)
+    return graph.invoke(state, config)
+
+
+def _carry_history(previous: dict[str, Any], turns: int) -> list[dict[str, str]]:
+    history = list(previous.get("history") or [])
+    if previous.get("query") and previous.get("final_answer"):
+        history.append({"query": previous["query"], "answer": previous["final_answer"]})
+    return history[-turns:] if turns > 0 else []
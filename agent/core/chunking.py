@@ -0,0 +1,154 @@
+from __future__ import annotations
+
+import re
+from typing import Callable, List
+
+from agent.core.tokens import estimate_tokens
+
+_PARAGRAPH_RE = re.compile(r"\n\s*\n")
+# После цифры с точкой предложение кончается, только если дальше заглавная буква:
+# «до 2024. Стороны…» режется, «п. 2.3 настоящего договора» — нет.
+_SENTENCE_RE = re.compile(r"(?<=[^\d\s][.!?…;])\s+|(?<=\d[.!?…;])\s+(?=[«\"(]?[A-ZА-ЯЁ])")
+# Одиночный номер («2.3.», «п. 4.») не считается предложением и приклеивается к соседнему.
+_NUMBER_ONLY_RE = re.compile(r"^(?:(?i:п|пп|ст|ч)\.\s*)?\d+(?:\.\d+)*\.?$")
+_CLAUSE_RE = re.compile(
+    r"^(?:(?i:статья|раздел|глава|пункт|п\.)\s*\d+|§\s*\d+|\d+(?:\.\d+)*\.?\s+[«\"(]?[A-ZА-ЯЁ]|[IVXLC]+\.\s+\S)"
+)
+
+
+def _hard_split(text: str, max_tokens: int, count: Callable[[str], int]) -> List[str]:
+    # Последний рубеж для строк без границ предложений (таблицы, сплошной текст).
+    tokens = max(1, count(text))
+    step = max(1, int(len(text) * max_tokens / tokens))
+    return [text[start : start + step] for start in range(0, len(text), step)]
+
+
+def _sentences(line: str) -> List[str]:
+    sentences: List[str] = []
+    carry = ""
+    for sentence in _SENTENCE_RE.split(line):
+        sentence = sentence.strip()
+        if not sentence:
+            continue
+        if carry:
+            sentence = f"{carry} {sentence}"
+            carry = ""
+        if _NUMBER_ONLY_RE.match(sentence):
+            if not sentences:
+                # Номер пункта в начале строки открывает следующее предложение.
+                carry = sentence
+                continue
+            # «…по ст. 450.» — номер закрывает предыдущее предложение.
+            sentences[-1] = f"{sentences[-1]} {sentence}"
+            continue
+        sentences.append(sentence)
+    if carry:
+        sentences.append(carry)
+    return sentences
+
+
+def _units(text: str, max_tokens: int, count: Callable[[str], int]) -> List[str]:
+    units: List[str] = []
+    for paragraph in _PARAGRAPH_RE.split(text):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        if count(paragraph) <= max_tokens:
+            units.append(paragraph)
+            continue
+        for line in paragraph.splitlines():
+            for sentence in _sentences(line):
+                if count(sentence) <= max_tokens:
+                    units.append(sentence)
+                else:
+                    units.extend(_hard_split(sentence, max_tokens, count))
+    return units
+
+
+def split_sentences(text: str) -> List[str]:
+    return [sentence for line in text.splitlines() for sentence in _sentences(line)]
+
+
+def _pack(units: List[str], max_tokens: int, overlap_tokens: int, count: Callable[[str], int]) -> List[str]:
+    chunks: List[str] = []
+    current: List[tuple[str, int]] = []
+    size = 0
+    for unit in units:
+        tokens = count(unit) + 1  # + перевод строки при склейке
+        if current and size + tokens > max_tokens:
+            chunks.append("\n".join(item for item, _ in current))
+            tail: List[tuple[str, int]] = []
+            tail_size = 0
+            for item, item_tokens in reversed(current):
+                if tail_size + item_tokens > overlap_tokens or tail_size + item_tokens + tokens > max_tokens:
+                    break
+                tail.insert(0, (item, item_tokens))
+                tail_size += item_tokens
+            current, size = tail, tail_size
+        current.append((unit, tokens))
+        size += tokens
+    if current:
+        chunks.append("\n".join(item for item, _ in current))
+    return chunks
+
+
+def split_by_tokens(
+    text: str,
+    max_tokens: int,
+    *,
+    overlap_tokens: int = 0,
+    count: Callable[[str], int] = estimate_tokens,
+) -> List[str]:
+    """Split text into chunks of at most ``max_tokens`` along paragraph/sentence borders.
+
+    ``overlap_tokens`` repeats the tail units of a chunk at the start of the next one.
+    """
+
+    max_tokens = max(1, max_tokens)
+    return _pack(_units(text, max_tokens, count), max_tokens, overlap_tokens, count)
+
+
+def clause_label(text: str) -> str:
+    """Header of the first numbered clause in ``text`` or an empty string."""
+
+    for line in text.splitlines():
+        line = line.strip()
+        if _CLAUSE_RE.match(line):
+            return line[:80]
+    return ""
+
+
+def split_clauses(
+    text: str,
+    max_tokens: int,
+    *,
+    overlap_tokens: int = 0,
+    count: Callable[[str], int] = estimate_tokens,
+) -> List[str]:
+    """Split a contract on numbered clauses (``1.``, ``2.3.``, ``Статья 5``, ``§ 2``).
+
+    Short neighbouring clauses share a chunk; a clause longer than ``max_tokens``
+    is split with overlap, and every piece repeats the clause header.
+    """
+
+    max_tokens = max(1, max_tokens)
+    clauses: List[List[str]] = [[]]
+    for line in text.splitlines():
+        if _CLAUSE_RE.match(line.strip()) and clauses[-1]:
+            clauses.append([])
+        clauses[-1].append(line)
+
+    units: List[str] = []
+    for lines in clauses:
+        clause = "\n".join(lines).strip()
+        if not clause:
+            continue
+        if count(clause) < max_tokens:
+            units.append(clause)
+            continue
+        header = clause_label(clause)
+        pieces = split_by_tokens(clause, max_tokens - count(header) - 1, overlap_tokens=overlap_tokens, count=count)
+        units.append(pieces[0])
+        units.extend(f"{header}\n{piece}" if header else piece for piece in pieces[1:])
+    # Отдельные пункты не режем, а только склеиваем соседние короткие без перекрытия.
+    return _pack(units, max_tokens, 0, count)
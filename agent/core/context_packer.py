@@ -0,0 +1,145 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from pathlib import Path
+from typing import List, Optional, Sequence
+
+import numpy as np
+
+from agent.config import AgentConfig, agent_config
+from agent.core.agent_logger import agent_logger
+from agent.core.bm25 import BM25
+from agent.core.chunking import split_by_tokens
+from agent.core.embeddings import EmbeddingProvider, embeddings
+from agent.core.speculation import query_embedding
+from agent.core.state import AgentState
+from agent.core.tokens import estimate_tokens
+
+
+@dataclass(slots=True)
+class ContextChunk:
+    source: int
+    position: int
+    text: str
+    tokens: int
+    score: float = 0.0
+
+
+@dataclass(slots=True)
+class PackedContext:
+    chunks: List[ContextChunk]
+    total_chunks: int
+    source_tokens: int
+    used_tokens: int
+    budget: int
+
+
+class ContextPacker:
+    """Fits several loaded documents into one token budget.
+
+    Documents are cut into chunks, each chunk is scored against the query as a
+    weighted sum of cosine similarity and normalized BM25, and the budget is
+    filled greedily: first the best chunk of every document, then the rest by
+    score. Selected chunks keep their source and reading order.
+    """
+
+    def __init__(self, config: AgentConfig | None = None, embedder: EmbeddingProvider | None = None) -> None:
+        self._config = config or agent_config
+        self._embedder = embedder or embeddings
+
+    def needs_packing(self, docs: Sequence[dict]) -> bool:
+        texts = [doc.get("text") or "" for doc in docs]
+        if self._config.context_budget_tokens <= 0 or sum(1 for text in texts if text) < 2:
+            return False
+        return sum(estimate_tokens(text) for text in texts) > self._config.context_budget_tokens
+
+    def pack(self, docs: Sequence[dict], query: str, *, state: Optional[AgentState] = None) -> PackedContext:
+        chunks = [
+            ContextChunk(source=source, position=position, text=text, tokens=estimate_tokens(text))
+            for source, doc in enumerate(docs)
+            for position, text in enumerate(split_by_tokens(doc.get("text") or "", self._config.context_chunk_tokens))
+        ]
+        budget = self._config.context_budget_tokens
+        if chunks:
+            self._score(chunks, query, state)
+
+        selected: List[ContextChunk] = []
+        used = 0
+        best_per_source: dict[int, ContextChunk] = {}
+        for chunk in chunks:
+            if chunk.source not in best_per_source or chunk.score > best_per_source[chunk.source].score:
+                best_per_source[chunk.source] = chunk
+        ranked = list(best_per_source.values()) + sorted(chunks, key=lambda item: item.score, reverse=True)
+        taken: set[tuple[int, int]] = set()
+        for chunk in ranked:
+            key = (chunk.source, chunk.position)
+            if key in taken or used + chunk.tokens > budget:
+                continue
+            taken.add(key)
+            selected.append(chunk)
+            used += chunk.tokens
+
+        selected.sort(key=lambda item: (item.source, item.position))
+        packed = PackedContext(
+            chunks=selected,
+            total_chunks=len(chunks),
+            source_tokens=sum(item.tokens for item in chunks),
+            used_tokens=used,
+            budget=budget,
+        )
+        if state is not None:
+            agent_logger.log_event(
+                state,
+                node="context_packer",
+                event_type="context_packed",
+                details={
+                    "documents": len(docs),
+                    "chunks": len(selected),
+                    "total_chunks": packed.total_chunks,
+                    "source_tokens": packed.source_tokens,
+                    "used_tokens": used,
+                    "budget": budget,
+                },
+            )
+        return packed
+
+    def _score(self, chunks: List[ContextChunk], query: str, state: Optional[AgentState]) -> None:
+        texts = [chunk.text for chunk in chunks]
+        if state is not None and state.get("query") == query:
+            vector = query_embedding(state, self._embedder)
+        else:
+            vector = self._embedder.embed_query(query)
+        dense = np.asarray(self._embedder.embed_documents(texts), dtype=np.float32) @ np.asarray(
+            vector, dtype=np.float32
+        )
+        sparse = np.asarray(BM25(texts).scores(query), dtype=np.float32)
+        if sparse.max() > 0:
+            sparse = sparse / sparse.max()
+        weight = self._config.context_dense_weight
+        for chunk, score in zip(chunks, weight * dense + (1 - weight) * sparse):
+            chunk.score = float(score)
+
+    @staticmethod
+    def to_documents(docs: Sequence[dict], packed: PackedContext) -> List[dict]:
+        """Loaded documents with text replaced by their selected chunks, each tagged with its source."""
+
+        by_source: dict[int, List[ContextChunk]] = {}
+        for chunk in packed.chunks:
+            by_source.setdefault(chunk.source, []).append(chunk)
+        result: List[dict] = []
+        for source, doc in enumerate(docs):
+            selected = by_source.get(source, [])
+            name = Path(doc.get("path", "")).name or f"документ {source + 1}"
+            text = "\n…\n".join(f"[{name}, фрагмент {chunk.position + 1}]\n{chunk.text}" for chunk in selected)
+            metadata = {
+                **(doc.get("metadata") or {}),
+                "packed": {
+                    "chunks": [chunk.position + 1 for chunk in selected],
+                    "scores": [round(chunk.score, 3) for chunk in selected],
+                },
+            }
+            result.append({**doc, "text": text, "metadata": metadata})
+        return result
+
+
+context_packer = ContextPacker()
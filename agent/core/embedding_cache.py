@@ -0,0 +1,211 @@
+from __future__ import annotations
+
+import hashlib
+import logging
+import re
+import sqlite3
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from agent.config import AgentConfig, agent_config
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS settings (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS vectors (key TEXT PRIMARY KEY, row INTEGER NOT NULL);
+"""
+
+_SPACES_RE = re.compile(r"\s+")
+# Ограничение SQLite на число параметров в одном запросе.
+_SQL_BATCH = 500
+
+
+def normalize_text(text: str) -> str:
+    return _SPACES_RE.sub(" ", unicodedata.normalize("NFC", text)).strip()
+
+
+def text_key(text: str) -> str:
+    return hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """Two-tier (LRU memory + memory-mapped file) cache of embeddings of one model.
+
+    Every model gets its own directory: ``vectors.f32`` holds float32 rows read
+    through ``np.memmap``, ``keys.sqlite`` maps the sha256 of the normalized
+    text to a row. Rows are appended under the SQLite write lock, so the CLI
+    and the backend can fill the same cache.
+    """
+
+    def __init__(self, model_name: str, config: AgentConfig | None = None) -> None:
+        self.model_name = model_name
+        self._config = config or agent_config
+        slug = re.sub(r"[^\w.-]+", "_", model_name).strip("_") or "model"
+        self.directory = self._config.embed_cache_dir / slug
+        self.vectors_path = self.directory / "vectors.f32"
+        self._lock = threading.RLock()
+        self._memory: OrderedDict[str, np.ndarray] = OrderedDict()
+        self._conn: sqlite3.Connection | None = None
+        self._dim: int | None = None
+        self._mmap: np.memmap | None = None
+        self._stats = {"lookups": 0, "memory_hits": 0, "disk_hits": 0, "stored": 0}
+
+    @property
+    def enabled(self) -> bool:
+        return self._config.embed_cache_enabled
+
+    def get_many(self, texts: Sequence[str]) -> List[Optional[np.ndarray]]:
+        if not self.enabled or not texts:
+            return [None] * len(texts)
+        keys = [text_key(text) for text in texts]
+        result: List[Optional[np.ndarray]] = [None] * len(texts)
+        with self._lock:
+            self._stats["lookups"] += len(keys)
+            for idx, key in enumerate(keys):
+                vector = self._memory.get(key)
+                if vector is not None:
+                    self._memory.move_to_end(key)
+                    result[idx] = vector
+                    self._stats["memory_hits"] += 1
+
+            pending = {key for key, vector in zip(keys, result) if vector is None}
+            if not pending:
+                return result
+            try:
+                found = self._read(pending)
+            except (sqlite3.Error, OSError, ValueError) as exc:
+                logger.warning("Кэш эмбеддингов недоступен: %s", exc)
+                return result
+            for idx, key in enumerate(keys):
+                if result[idx] is None and key in found:
+                    result[idx] = found[key]
+                    self._stats["disk_hits"] += 1
+            for key, vector in found.items():
+                self._remember(key, vector)
+        return result
+
+    def put_many(self, texts: Sequence[str], vectors: np.ndarray) -> None:
+        if not self.enabled or not len(texts):
+            return
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32).reshape(len(texts), -1)
+        items = dict(zip((text_key(text) for text in texts), vectors))
+        with self._lock:
+            for key, vector in items.items():
+                self._remember(key, vector)
+            try:
+                self._append(items)
+            except (sqlite3.Error, OSError) as exc:
+                logger.warning("Не удалось сохранить эмбеддинги в кэш: %s", exc)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["memory_items"] = len(self._memory)
+        stats["misses"] = stats["lookups"] - stats["memory_hits"] - stats["disk_hits"]
+        lookups = stats["lookups"]
+        stats["hit_rate"] = round((stats["memory_hits"] + stats["disk_hits"]) / lookups, 3) if lookups else 0.0
+        try:
+            with self._lock:
+                stats["stored_rows"] = int(self._setting("rows", "0"))
+        except sqlite3.Error:
+            stats["stored_rows"] = 0
+        stats["model"] = self.model_name
+        return stats
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(
+                str(self.directory / "keys.sqlite"), timeout=30, isolation_level=None, check_same_thread=False
+            )
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(_SCHEMA)
+        return self._conn
+
+    def _setting(self, key: str, default: str) -> str:
+        row = self._connection().execute("SELECT value FROM settings WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+    def _read(self, keys: set[str]) -> Dict[str, np.ndarray]:
+        conn = self._connection()
+        rows: Dict[str, int] = {}
+        ordered = sorted(keys)
+        for start in range(0, len(ordered), _SQL_BATCH):
+            batch = ordered[start : start + _SQL_BATCH]
+            placeholders = ",".join("?" * len(batch))
+            rows.update(conn.execute(f"SELECT key, row FROM vectors WHERE key IN ({placeholders})", batch).fetchall())
+        if not rows:
+            return {}
+        matrix = self._matrix(max(rows.values()) + 1)
+        return {key: np.array(matrix[row]) for key, row in rows.items()}
+
+    def _matrix(self, min_rows: int) -> np.memmap:
+        if self._dim is None:
+            self._dim = int(self._setting("dim", "0"))
+        if self._mmap is None or len(self._mmap) < min_rows:
+            # Файл только растёт: при нехватке строк отображаем его заново.
+            rows = self.vectors_path.stat().st_size // (4 * self._dim)
+            if rows < min_rows:
+                raise ValueError("файл векторов короче индекса ключей")
+            self._mmap = np.memmap(self.vectors_path, dtype=np.float32, mode="r", shape=(rows, self._dim))
+        return self._mmap
+
+    def _append(self, items: Dict[str, np.ndarray]) -> None:
+        conn = self._connection()
+        # BEGIN IMMEDIATE сериализует дозапись между процессами.
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            known: set[str] = set()
+            keys = list(items)
+            for start in range(0, len(keys), _SQL_BATCH):
+                batch = keys[start : start + _SQL_BATCH]
+                placeholders = ",".join("?" * len(batch))
+                known.update(
+                    row[0] for row in conn.execute(f"SELECT key FROM vectors WHERE key IN ({placeholders})", batch)
+                )
+            fresh = [key for key in keys if key not in known]
+            if not fresh:
+                conn.execute("COMMIT")
+                return
+            block = np.stack([items[key] for key in fresh])
+            dim = int(self._setting("dim", "0")) or block.shape[1]
+            if dim != block.shape[1]:
+                raise sqlite3.DataError(f"размерность {block.shape[1]} не совпадает с кэшем ({dim})")
+            start_row = int(self._setting("rows", "0"))
+            # Строки за пределами rows — хвост прерванной записи, их можно перезаписать.
+            with self.vectors_path.open("r+b" if self.vectors_path.exists() else "w+b") as f:
+                f.seek(start_row * dim * 4)
+                f.write(block.tobytes())
+            conn.executemany(
+                "INSERT INTO vectors (key, row) VALUES (?, ?)",
+                [(key, start_row + offset) for offset, key in enumerate(fresh)],
+            )
+            conn.executemany(
+                "INSERT INTO settings (key, value) VALUES (?, ?) ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+                [("dim", str(dim)), ("rows", str(start_row + len(fresh))), ("model", self.model_name)],
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        self._dim = dim
+        self._stats["stored"] += len(fresh)
+
+    def _remember(self, key: str, vector: np.ndarray) -> None:
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self._config.embed_cache_memory_items:
+            self._memory.popitem(last=False)
+
+    def close(self) -> None:
+        with self._lock:
+            self._mmap = None
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
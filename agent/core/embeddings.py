@@ -1,20 +1,102 @@
 from __future__ import annotations
 
+import queue
 import threading
-from typing import Iterable, List
+import time
+from concurrent.futures import Future
+from typing import Callable, Iterable, List
 
 import numpy as np
 from sentence_transformers import SentenceTransformer
 
-from agent.config import llama_config
+from agent.config import AgentConfig, agent_config, llama_config
+from agent.core.embedding_cache import EmbeddingCache
+
+
+class EmbeddingBatcher:
+    """Merges concurrent encode requests into one model call.
+
+    A daemon thread takes the first waiting request, keeps collecting more for
+    up to ``embed_batch_wait_ms`` or until ``embed_batch_max`` texts, encodes
+    them in one batch and resolves every request's future with its rows.
+    :class:`EmbeddingProvider` submits large requests in slices of at most
+    ``embed_batch_max`` texts, one after another, so queries are not stuck
+    behind a whole indexing run.
+    """
+
+    def __init__(self, encode: Callable[[List[str]], np.ndarray], config: AgentConfig | None = None) -> None:
+        self._encode = encode
+        self._config = config or agent_config
+        self._queue: queue.SimpleQueue[tuple[List[str], Future]] = queue.SimpleQueue()
+        self._lock = threading.Lock()
+        self._thread: threading.Thread | None = None
+        self._stats = {"requests": 0, "batches": 0, "texts": 0}
+
+    def submit(self, texts: List[str]) -> Future:
+        future: Future = Future()
+        self._ensure_thread()
+        self._queue.put((texts, future))
+        return future
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+        stats["avg_batch"] = round(stats["texts"] / stats["batches"], 1) if stats["batches"] else 0.0
+        return stats
+
+    def _ensure_thread(self) -> None:
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._loop, name="embed-batcher", daemon=True)
+                self._thread.start()
+
+    def _loop(self) -> None:
+        while True:
+            batch = [self._queue.get()]
+            size = len(batch[0][0])
+            deadline = time.monotonic() + self._config.embed_batch_wait_ms / 1000
+            while size < self._config.embed_batch_max:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                batch.append(item)
+                size += len(item[0])
+            self._run(batch)
+
+    def _run(self, batch: List[tuple[List[str], Future]]) -> None:
+        batch = [(texts, future) for texts, future in batch if future.set_running_or_notify_cancel()]
+        if not batch:
+            return
+        texts = [text for request, _ in batch for text in request]
+        try:
+            vectors = self._encode(texts)
+        except BaseException as exc:
+            for _, future in batch:
+                future.set_exception(exc)
+            return
+        with self._lock:
+            self._stats["requests"] += len(batch)
+            self._stats["batches"] += 1
+            self._stats["texts"] += len(texts)
+        offset = 0
+        for request, future in batch:
+            future.set_result(vectors[offset : offset + len(request)])
+            offset += len(request)
 
 
 class EmbeddingProvider:
 
-    def __init__(self, model_name: str | None = None) -> None:
+    def __init__(self, model_name: str | None = None, config: AgentConfig | None = None) -> None:
+        self._config = config or agent_config
         self.model_name = model_name or llama_config.embed_model_name
         self._model: SentenceTransformer | None = None
         self._lock = threading.RLock()
+        self.cache = EmbeddingCache(self.model_name, self._config)
+        self.batcher = EmbeddingBatcher(self._encode, self._config)
 
     def _ensure_model(self) -> SentenceTransformer:
         with self._lock:
@@ -22,26 +104,38 @@ class EmbeddingProvider:
                 self._model = SentenceTransformer(self.model_name, device="cpu")
             return self._model
 
-    def embed_documents(self, texts: Iterable[str]) -> List[List[float]]:
+    def _encode(self, texts: List[str]) -> np.ndarray:
         model = self._ensure_model()
         vectors = model.encode(
-            list(texts),
+            texts,
             convert_to_numpy=True,
             normalize_embeddings=True,
             batch_size=32,
         )
-        return vectors.astype(np.float32).tolist()
+        return np.asarray(vectors, dtype=np.float32).reshape(len(texts), -1)
+
+    def embed_documents(self, texts: Iterable[str]) -> List[List[float]]:
+        texts = list(texts)
+        vectors = self.cache.get_many(texts)
+        # Повторы внутри одного вызова считаем один раз.
+        missing = list(dict.fromkeys(text for text, vector in zip(texts, vectors) if vector is None))
+        if missing:
+            if self._config.embed_batching:
+                # Следующая часть ставится в очередь только после предыдущей: запросы,
+                # пришедшие между частями, кодируются раньше остатка индексации.
+                step = max(1, self._config.embed_batch_max)
+                encoded = np.concatenate(
+                    [self.batcher.submit(missing[start : start + step]).result() for start in range(0, len(missing), step)]
+                )
+            else:
+                encoded = self._encode(missing)
+            self.cache.put_many(missing, encoded)
+            fresh = dict(zip(missing, encoded))
+            vectors = [fresh[text] if vector is None else vector for text, vector in zip(texts, vectors)]
+        return [vector.tolist() for vector in vectors]
 
     def embed_query(self, text: str) -> List[float]:
-        model = self._ensure_model()
-        vector = model.encode(
-            text,
-            convert_to_numpy=True,
-            normalize_embeddings=True,
-        )
-        return vector.astype(np.float32).tolist()
+        return self.embed_documents([text])[0]
 
 
 embeddings = EmbeddingProvider()
-
-
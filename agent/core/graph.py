@@ -1,51 +1,70 @@
 from __future__ import annotations
 
 import json
+import threading
 import time
-from typing import Any, Dict, Iterable, List
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache, partial
+from typing import Any, Dict, Iterable, List, Sequence
 
 from langgraph.graph import END, START, StateGraph
 from langchain_core.messages import HumanMessage
 
+from agent.config import agent_config
 from agent.core.llm import invoke_orchestrator
+from agent.core.model_manager import model_manager
 from agent.core.agent_logger import agent_logger
+from agent.core.blob_store import blob_store
+from agent.core.checkpoint import get_checkpointer
+from agent.core.plan_cache import plan_cache
+from agent.core.profiles import GENERAL_PROFILE, AgentProfile, get_profile
+from agent.core.reflection import reflection_engine
+from agent.core.router import intent_router
+from agent.core.speculation import speculator
+from agent.core.tool_cache import tool_cache
 from agent.core.state import AgentState, PlanStep, ToolExecution
-from agent.prompts.planner import planner_prompt
+from agent.core.tokens import estimate_tokens
+from agent.prompts.direct_answer import direct_answer_prompt
+from agent.prompts.planner import build_planner_prompt, planner_prompt
 from agent.prompts.reflector import reflector_prompt
 from agent.prompts.synthesizer import synthesizer_prompt
-from agent.tools.document_loader import document_loader
-from agent.tools.financial import financial_tool
-from agent.tools.legal_rag import legal_rag_tool
-from agent.tools.marketing import PromotionBrief, marketing_tool
+from agent.tools.builtin import tool_registry
+from agent.tools.registry import ToolAdapter, ToolCall
 
 MAX_PLANNER_RETRIES = 2
 
 
-TOOL_REGISTRY = {
-    financial_tool.name: financial_tool,
-    legal_rag_tool.name: legal_rag_tool,
-    marketing_tool.name: marketing_tool,
-    "document_loader": document_loader,
-}
+tool_registry.load_plugins(agent_config.tool_plugins)
 
 
-def describe_tools() -> str:
-    descriptions = [
-        f"{financial_tool.name}: {financial_tool.description}",
-        f"{legal_rag_tool.name}: {legal_rag_tool.description} Работает даже без файлов, использует локальный индекс.",
-        f"{marketing_tool.name}: {marketing_tool.description}",
-        "document_loader: Читает содержимое переданных файлов и возвращает очищенный текст.",
-    ]
-    return "\n".join(f"- {item}" for item in descriptions)
+def describe_tools(names: Sequence[str] | None = None) -> str:
+    return tool_registry.describe(names)
 
 
-def _parse_plan_json(text: str) -> list[PlanStep]:
+def profile_tools(profile: AgentProfile) -> tuple[str, ...]:
+    return profile.tool_names(tool_registry.names())
+
+
+@lru_cache(maxsize=None)
+def _profile_planner_prompt(profile: AgentProfile):
+    if profile == GENERAL_PROFILE:
+        return planner_prompt
+    return build_planner_prompt(profile_tools(profile), focus=profile.focus, max_steps=profile.max_steps)
+
+
+def _messages_tokens(messages: Iterable[Any]) -> int:
+    return sum(estimate_tokens(str(getattr(message, "content", message))) for message in messages)
+
+
+def _parse_plan_json(text: str) -> list[PlanStep] | None:
+    """Parse planner output; ``None`` means invalid JSON, ``[]`` a deliberate empty plan."""
+
     try:
         data = json.loads(text)
     except json.JSONDecodeError:
-        return []
+        return None
     if not isinstance(data, list):
-        return []
+        return None
     plan: list[PlanStep] = []
     for idx, item in enumerate(data, start=1):
         if not isinstance(item, dict):
@@ -55,17 +74,52 @@ def _parse_plan_json(text: str) -> list[PlanStep]:
             continue
         params = item.get("params")
         params = params if isinstance(params, dict) else {}
-        plan.append(
-            {
-                "step": int(item.get("step") or idx),
-                "tool": tool,
-                "action": str(item.get("action", "") or "").strip(),
-                "params": params,
-            }
-        )
+        step: PlanStep = {
+            "step": int(item.get("step") or idx),
+            "tool": tool,
+            "action": str(item.get("action", "") or "").strip(),
+            "params": params,
+        }
+        depends_on = _parse_depends_on(item.get("depends_on"))
+        if depends_on is not None:
+            step["depends_on"] = depends_on
+        plan.append(step)
+    known = {step["step"] for step in plan}
+    for step in plan:
+        if "depends_on" in step:
+            step["depends_on"] = [dep for dep in step["depends_on"] if dep in known and dep != step["step"]]
     return plan
 
 
+def _parse_depends_on(value: Any) -> list[int] | None:
+    if value is None:
+        return None
+    if isinstance(value, (int, str)):
+        value = [value]
+    if not isinstance(value, list):
+        return None
+    deps: list[int] = []
+    for item in value:
+        try:
+            deps.append(int(item))
+        except (TypeError, ValueError):
+            continue
+    return deps
+
+
+def _format_history(state: AgentState, max_answer_chars: int = 600) -> str:
+    history = state.get("history") or []
+    if not history:
+        return "(нет)"
+    lines = []
+    for turn in history:
+        answer = turn.get("answer", "")
+        if len(answer) > max_answer_chars:
+            answer = answer[:max_answer_chars] + "…"
+        lines.append(f"Пользователь: {turn.get('query', '')}\nАгент: {answer}")
+    return "\n".join(lines)
+
+
 def _planner_retry_messages(messages: Iterable[Any], attempt: int, bad_output: str) -> list[Any]:
     prompt = (
         "ПРЕДЫДУЩИЙ ОТВЕТ НЕ БЫЛ ВАЛИДНЫМ JSON массивом. "
@@ -76,55 +130,250 @@ def _planner_retry_messages(messages: Iterable[Any], attempt: int, bad_output: s
     return [*messages, retry_message]
 
 
-def planner_node(state: AgentState) -> AgentState:
+def router_node(state: AgentState) -> AgentState:
+    node_name = "router"
+    start = time.perf_counter()
+    agent_logger.log_node_enter(node_name, state)
+    speculator.start(state)
+    decision = intent_router.route(state)
+    if decision is not None:
+        state["plan"] = decision.plan
+        state["plan_source"] = "router"
+        state["plan_template"] = None
+        state["current_step"] = 0
+        state["completed_steps"] = []
+        agent_logger.log_llm_skipped(
+            state,
+            node="planner",
+            reason="intent_router",
+            details={
+                "route": decision.route.name,
+                "tool": decision.route.tool,
+                "confidence": round(decision.confidence, 4),
+                "margin": round(decision.margin, 4),
+            },
+        )
+    agent_logger.log_node_exit(node_name, state, duration_ms=(time.perf_counter() - start) * 1000)
+    return state
+
+
+def route_after_router(state: AgentState) -> str:
+    return "execute" if state.get("plan_source") == "router" else "plan"
+
+
+def planner_node(state: AgentState, profile: AgentProfile = GENERAL_PROFILE) -> AgentState:
     node_name = "planner"
     start = time.perf_counter()
     agent_logger.log_node_enter(node_name, state)
-    base_messages = planner_prompt.format_messages(
-        query=state["query"],
-        tool_descriptions=describe_tools(),
-        files=", ".join(state.get("files", []) or ["(нет файлов)"]),
+    state["current_step"] = 0
+    state["completed_steps"] = []
+    match = plan_cache.lookup(state)
+    if match is not None:
+        state["plan"] = match.plan
+        state["plan_source"] = "cache"
+        state["plan_template"] = match.template.key
+        agent_logger.log_llm_skipped(
+            state,
+            node=node_name,
+            reason="plan_cache",
+            details={"template": match.template.key, "similarity": round(match.similarity, 4)},
+        )
+        agent_logger.log_node_exit(node_name, state, duration_ms=(time.perf_counter() - start) * 1000)
+        return state
+
+    prompt_inputs = {
+        "query": state["query"],
+        "history": _format_history(state),
+        "files": ", ".join(state.get("files", []) or ["(нет файлов)"]),
+    }
+    base_messages = _profile_planner_prompt(profile).format_messages(
+        tool_descriptions=describe_tools(profile_tools(profile)), **prompt_inputs
     )
+    if profile != GENERAL_PROFILE:
+        prompt_tokens = _messages_tokens(base_messages)
+        baseline_tokens = _messages_tokens(
+            planner_prompt.format_messages(tool_descriptions=describe_tools(), **prompt_inputs)
+        )
+        agent_logger.log_event(
+            state,
+            node=node_name,
+            event_type="planner_prompt",
+            details={
+                "profile": profile.name,
+                "prompt_tokens": prompt_tokens,
+                "baseline_tokens": baseline_tokens,
+                "saved_tokens": baseline_tokens - prompt_tokens,
+            },
+        )
     messages: List[Any] = list(base_messages)
-    plan: list[PlanStep] = []
+    plan: list[PlanStep] | None = None
     last_output = ""
     for attempt in range(1, MAX_PLANNER_RETRIES + 1):
         response = invoke_orchestrator(messages, state=state, node=node_name)
         last_output = getattr(response, "content", "[]")
         plan = _parse_plan_json(last_output)
-        if plan:
+        if plan is not None:
             break
         messages = _planner_retry_messages(base_messages, attempt, last_output)
 
-    state["plan"] = plan
-    state["current_step"] = 0
+    allowed = profile_tools(profile)
+    plan = [step for step in plan or [] if step["tool"] in allowed]
+    state["plan"] = plan[: profile.max_steps]
+    state["plan_source"] = "llm"
+    state["plan_template"] = None
     agent_logger.log_node_exit(node_name, state, duration_ms=(time.perf_counter() - start) * 1000)
     return state
 
 
-def executor_node(state: AgentState) -> AgentState:
-    node_name = "executor"
-    start = time.perf_counter()
-    agent_logger.log_node_enter(node_name, state)
-    plan = state.get("plan", [])
-    index = state.get("current_step", 0)
-    if not plan or index >= len(plan):
-        agent_logger.log_node_exit(node_name, state, duration_ms=(time.perf_counter() - start) * 1000)
-        return state
+def _step_number(step: PlanStep, position: int) -> int:
+    return int(step.get("step") or position + 1)
+
+
+def _ready_steps(plan: List[PlanStep], completed: Iterable[int]) -> list[tuple[int, PlanStep]]:
+    """Steps whose dependencies are done.
+
+    A step without ``depends_on`` waits for every earlier step, so plans written
+    for the sequential executor keep their order. ``depends_on: []`` marks a step
+    as independent.
+    """
+
+    done = set(completed)
+    ready: list[tuple[int, PlanStep]] = []
+    pending: list[tuple[int, PlanStep]] = []
+    for position, step in enumerate(plan):
+        number = _step_number(step, position)
+        if number in done:
+            continue
+        pending.append((position, step))
+        deps = step.get("depends_on")
+        if deps is None:
+            deps = [_step_number(item, idx) for idx, item in enumerate(plan[:position])]
+        if all(dep in done for dep in deps):
+            ready.append((position, step))
+    if not ready and pending:
+        # Цикл в depends_on — выполняем первый оставшийся шаг, чтобы не зависнуть.
+        ready.append(pending[0])
+    return ready
+
+
+def _step_lanes(ready: list[tuple[int, PlanStep]]) -> list[list[tuple[int, PlanStep]]]:
+    """Split ready steps into lanes that run side by side.
+
+    Tools without a model slot get a lane each. Steps whose tool declares an LLM
+    slot share one lane, grouped by slot and starting with the resident model:
+    only one model is loaded at a time, so running them in parallel would just
+    swap weights between calls.
+    """
+
+    lanes: list[list[tuple[int, PlanStep]]] = []
+    llm_steps: list[tuple[str, int, PlanStep]] = []
+    for position, step in ready:
+        tool = (step.get("tool") or "").strip()
+        slot = tool_registry.get(tool).slot if tool in tool_registry else None
+        if slot is None:
+            lanes.append([(position, step)])
+        else:
+            llm_steps.append((slot, position, step))
+    if llm_steps:
+        resident = model_manager.loaded_slot
+        llm_steps.sort(key=lambda item: (item[0] != resident, item[0], item[1]))
+        lanes.append([(position, step) for _, position, step in llm_steps])
+    return lanes
 
-    step = plan[index]
+
+def _execute_lane(lane: list[tuple[int, PlanStep]], state: AgentState) -> list[tuple[int, ToolExecution]]:
+    return [(position, _execute_step(step, position, state)) for position, step in lane]
+
+
+def _execute_step(step: PlanStep, position: int, state: AgentState) -> ToolExecution:
+    start = time.perf_counter()
     result_text, success, error = run_tool(step, state)
     execution: ToolExecution = {
-        "step": step.get("step", index + 1),
+        "step": _step_number(step, position),
         "tool": step.get("tool", "unknown"),
         "input": step.get("action", ""),
         "output": result_text,
         "success": success,
+        "duration_ms": (time.perf_counter() - start) * 1000,
     }
     if error:
         execution["error"] = error
-    state.setdefault("tool_results", []).append(execution)
-    state["current_step"] = index + 1
+    inline = agent_config.blob_inline_chars
+    if state.get("run_id") and len(result_text) > inline:
+        handle = blob_store.put(state["run_id"], result_text)
+        execution["output"] = (
+            f"{result_text[:inline]}\n…[ещё {len(result_text) - inline} символов в {handle}]"
+        )
+        execution["output_ref"] = handle
+        execution["output_chars"] = len(result_text)
+    return execution
+
+
+def _results_for_prompt(state: AgentState, *, expand_chars: int = 0) -> str:
+    """Serialize tool results for a prompt, dereferencing blobs up to ``expand_chars``."""
+
+    rows = []
+    for execution in state.get("tool_results", []):
+        row = {key: value for key, value in execution.items() if key not in {"output_ref", "duration_ms"}}
+        handle = execution.get("output_ref")
+        if handle and expand_chars > 0:
+            full = blob_store.get(handle)
+            if full is not None:
+                row["output"] = full if len(full) <= expand_chars else full[:expand_chars] + "…"
+        rows.append(row)
+    return json.dumps(rows, ensure_ascii=False)
+
+
+def executor_node(state: AgentState) -> AgentState:
+    node_name = "executor"
+    start = time.perf_counter()
+    agent_logger.log_node_enter(node_name, state)
+    plan = state.get("plan", [])
+    completed = state.setdefault("completed_steps", [])
+    if not plan or len(completed) >= len(plan):
+        agent_logger.log_node_exit(node_name, state, duration_ms=(time.perf_counter() - start) * 1000)
+        return state
+
+    ready = _ready_steps(plan, completed)
+    lanes = _step_lanes(ready)
+    if len(lanes) == 1:
+        finished = dict(_execute_lane(lanes[0], state))
+    else:
+        workers = max(1, min(agent_config.max_parallel_steps, len(lanes)))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="plan-step") as pool:
+            futures = [pool.submit(_execute_lane, lane, state) for lane in lanes]
+            finished = dict(item for future in futures for item in future.result())
+    # Порядок слияния — порядок шагов в плане, а не порядок завершения.
+    executions = [finished[position] for position, _ in ready]
+
+    wall_ms = (time.perf_counter() - start) * 1000
+    for execution in executions:
+        agent_logger.log_event(
+            state,
+            node=node_name,
+            event_type="step_timing",
+            details={
+                "step": execution["step"],
+                "tool": execution["tool"],
+                "duration_ms": execution["duration_ms"],
+                "success": execution["success"],
+            },
+        )
+    if len(executions) > 1:
+        agent_logger.log_event(
+            state,
+            node=node_name,
+            event_type="parallel_batch",
+            details={
+                "steps": [execution["step"] for execution in executions],
+                "wall_ms": wall_ms,
+                "sum_step_ms": sum(execution["duration_ms"] for execution in executions),
+            },
+        )
+
+    state.setdefault("tool_results", []).extend(executions)
+    completed.extend(execution["step"] for execution in executions)
+    state["current_step"] = len(completed)
     agent_logger.log_node_exit(node_name, state, duration_ms=(time.perf_counter() - start) * 1000)
     return state
 
@@ -133,22 +382,33 @@ def reflect_node(state: AgentState) -> AgentState:
     node_name = "reflector"
     start = time.perf_counter()
     agent_logger.log_node_enter(node_name, state)
-    messages = reflector_prompt.format_messages(
-        query=state["query"],
-        current_step=state.get("current_step", 0),
-        plan=json.dumps(state.get("plan", []), ensure_ascii=False),
-        tool_results=json.dumps(state.get("tool_results", []), ensure_ascii=False),
-    )
-    response = invoke_orchestrator(messages, state=state, node=node_name)
+    decision = reflection_engine.decide(state)
+    if decision is not None:
+        agent_logger.log_llm_skipped(
+            state,
+            node=node_name,
+            reason="rule_based",
+            details={"continue": decision.proceed, "reflection": decision.reason},
+        )
+        data = {"continue": decision.proceed, "reason": decision.reason}
+    else:
+        messages = reflector_prompt.format_messages(
+            query=state["query"],
+            current_step=state.get("current_step", 0),
+            plan=json.dumps(state.get("plan", []), ensure_ascii=False),
+            tool_results=_results_for_prompt(state),
+        )
+        response = invoke_orchestrator(messages, state=state, node=node_name)
 
-    reflection_raw = getattr(response, "content", "{}")
-    try:
-        data = json.loads(reflection_raw)
-    except json.JSONDecodeError:
-        data = {"continue": False, "reason": reflection_raw}
+        reflection_raw = getattr(response, "content", "{}")
+        try:
+            data = json.loads(reflection_raw)
+        except json.JSONDecodeError:
+            data = {"continue": False, "reason": reflection_raw}
 
     state["reflection"] = data.get("reason", "нет данных")
     state["decision"] = bool(data.get("continue", False))
+    state["reviewed_results"] = len(state.get("tool_results", []))
     state["iteration"] = state.get("iteration", 0) + 1
     agent_logger.log_node_exit(node_name, state, duration_ms=(time.perf_counter() - start) * 1000)
     return state
@@ -160,16 +420,43 @@ def synthesize_node(state: AgentState) -> AgentState:
     agent_logger.log_node_enter(node_name, state)
     messages = synthesizer_prompt.format_messages(
         query=state["query"],
+        history=_format_history(state),
         plan=json.dumps(state.get("plan", []), ensure_ascii=False),
-        tool_results=json.dumps(state.get("tool_results", []), ensure_ascii=False),
+        tool_results=_results_for_prompt(state, expand_chars=agent_config.synthesizer_result_chars),
         reflection=state.get("reflection", ""),
     )
     response = invoke_orchestrator(messages, state=state, node=node_name)
     state["final_answer"] = getattr(response, "content", "")
+    plan_cache.record_outcome(state)
+    speculator.discard(state.get("run_id"))
     agent_logger.log_node_exit(node_name, state, duration_ms=(time.perf_counter() - start) * 1000)
     return state
 
 
+def direct_answer_node(state: AgentState) -> AgentState:
+    node_name = "direct_answer"
+    start = time.perf_counter()
+    agent_logger.log_node_enter(node_name, state)
+    # Пустой план: без исполнителя и рефлектора, один короткий промпт вместо синтезатора.
+    agent_logger.log_llm_skipped(state, node="reflector", reason="empty_plan")
+    agent_logger.log_event(
+        state,
+        node=node_name,
+        event_type="short_circuit",
+        details={"skipped_nodes": ["executor", "reflector", "synthesizer"], "llm_calls_saved": 1},
+    )
+    messages = direct_answer_prompt.format_messages(query=state["query"], history=_format_history(state))
+    response = invoke_orchestrator(messages, state=state, node=node_name, max_tokens=1024)
+    state["final_answer"] = getattr(response, "content", "")
+    speculator.discard(state.get("run_id"))
+    agent_logger.log_node_exit(node_name, state, duration_ms=(time.perf_counter() - start) * 1000)
+    return state
+
+
+def route_after_planner(state: AgentState) -> str:
+    return "execute" if state.get("plan") else "direct"
+
+
 def should_continue(state: AgentState) -> str:
     if state.get("decision"):
         if state.get("iteration", 0) > 9:
@@ -194,69 +481,20 @@ def run_tool(step: PlanStep, state: AgentState) -> tuple[str, bool, str | None]:
     result_text = ""
 
     try:
-        if tool_name == financial_tool.name:
-            files = params.get("files") or state.get("files", [])
-            result_text, summary = financial_tool.analyze_with_metadata(
-                files, action or state["query"], state=state
-            )
-            extra = {"files": summary}
-        elif tool_name == legal_rag_tool.name:
-            query = params.get("query") or action or state["query"]
-            k = int(params.get("k", 3))
-            results = legal_rag_tool.search(query, k=k)
-            extra = {
-                "query": query,
-                "k": k,
-                "hits": [{"path": item["path"], "score": item["score"]} for item in results],
-            }
-            result_text = json.dumps(results, ensure_ascii=False, indent=2)
-        elif tool_name == marketing_tool.name:
-            mode = params.get("mode", "promotion")
-            if mode == "social_post":
-                result_text = marketing_tool.create_social_post(
-                    topic=params.get("topic", action or state["query"]),
-                    tone=params.get("tone", "дружелюбный"),
-                    state=state,
-                )
-            elif mode == "roi":
-                result_text = marketing_tool.estimate_roi(
-                    expected_revenue=float(params.get("expected_revenue", 0)),
-                    budget=float(params.get("budget", 1)),
-                    state=state,
-                )
-            else:
-                brief = PromotionBrief(
-                    goal=params.get("goal", action or state["query"]),
-                    audience=params.get("audience", "гости кофейни"),
-                    budget=params.get("budget"),
-                    duration_days=params.get("duration_days"),
-                )
-                result_text = marketing_tool.generate_promotion(brief, state=state)
-            extra = {"mode": mode}
-        elif tool_name == "document_loader":
-            files = params.get("files") or state.get("files", [])
-            docs = document_loader.load_many(files)
-            summary = []
-            for doc in docs:
-                path = doc.get("path", "")
-                text = doc.get("text", "") or ""
-                meta = {
-                    "path": path,
-                    "chars": len(text),
-                    "lines": text.count("\n") + 1 if text else 0,
-                    "metadata": doc.get("metadata", {}),
-                }
-                summary.append(meta)
-                if path:
-                    agent_logger.log_document_load(
-                        state,
-                        path=path,
-                        metadata={k: v for k, v in meta.items() if k != "path"},
-                    )
-            extra = {"documents": summary}
-            result_text = json.dumps(docs, ensure_ascii=False, indent=2)
+        adapter = tool_registry.get(tool_name)
+        call = ToolCall(tool=tool_name, params=params, action=action, state=state)
+        cache_key = _tool_cache_key(adapter, call)
+        cached = tool_cache.get(tool_name, cache_key) if cache_key else None
+        if cached is not None:
+            result_text = cached.get("result_text", "")
+            extra = {**(cached.get("extra") or {}), "cache": "hit"}
+            if adapter.on_cache_hit is not None:
+                adapter.on_cache_hit(call, extra)
         else:
-            raise ValueError(f"Неизвестный инструмент: {tool_name}")
+            result_text, extra = tool_registry.execute(adapter, call)
+            if cache_key and not (extra or {}).get("incomplete"):
+                tool_cache.put(tool_name, cache_key, {"result_text": result_text, "extra": extra})
+                extra = {**(extra or {}), "cache": "miss"}
     except Exception as exc:  # pragma: no cover - defensive
         success = False
         error = str(exc)
@@ -277,18 +515,47 @@ def run_tool(step: PlanStep, state: AgentState) -> tuple[str, bool, str | None]:
     return result_text, success, error
 
 
-graph = StateGraph(AgentState)
-graph.add_node("planner", planner_node)
-graph.add_node("executor", executor_node)
-graph.add_node("reflector", reflect_node)
-graph.add_node("synthesizer", synthesize_node)
+def _tool_cache_key(adapter: ToolAdapter, call: ToolCall) -> str | None:
+    """Key from the inputs the tool actually consumes after defaults are resolved."""
+
+    if adapter.cache_inputs is None:
+        return None
+    resolved = adapter.cache_inputs(call)
+    if resolved is None:
+        return None
+    inputs, files = resolved
+    return tool_cache.make_key(adapter.name, inputs, files)
+
+
+def build_agent_graph(profile: AgentProfile = GENERAL_PROFILE):
+    graph = StateGraph(AgentState)
+    graph.add_node("router", router_node)
+    graph.add_node("planner", partial(planner_node, profile=profile))
+    graph.add_node("executor", executor_node)
+    graph.add_node("reflector", reflect_node)
+    graph.add_node("synthesizer", synthesize_node)
+    graph.add_node("direct_answer", direct_answer_node)
+
+    graph.add_edge(START, "router")
+    graph.add_conditional_edges("router", route_after_router, {"execute": "executor", "plan": "planner"})
+    graph.add_conditional_edges("planner", route_after_planner, {"execute": "executor", "direct": "direct_answer"})
+    graph.add_edge("executor", "reflector")
+    graph.add_conditional_edges("reflector", should_continue, {"continue": "executor", "finish": "synthesizer"})
+    graph.add_edge("synthesizer", END)
+    graph.add_edge("direct_answer", END)
+    return graph.compile(checkpointer=get_checkpointer())
+
 
-graph.add_edge(START, "planner")
-graph.add_edge("planner", "executor")
-graph.add_edge("executor", "reflector")
-graph.add_conditional_edges("reflector", should_continue, {"continue": "executor", "finish": "synthesizer"})
-graph.add_edge("synthesizer", END)
+# Графы и чекпоинтер создаются при первом запросе, а не при импорте модуля.
+_agent_graphs: dict[str, Any] = {}
+_agent_graphs_lock = threading.Lock()
 
-agent_graph = graph.compile()
 
+def get_agent_graph(agent_type: str | None = None):
+    """Compiled graph of the agent's profile; built once per profile."""
 
+    profile = get_profile(agent_type)
+    with _agent_graphs_lock:
+        if profile.name not in _agent_graphs:
+            _agent_graphs[profile.name] = build_agent_graph(profile)
+        return _agent_graphs[profile.name]
@@ -96,6 +96,11 @@ class ModelManager:
         with self._lock:
             self._release_locked()
 
+    @property
+    def loaded_slot(self) -> Optional[ModelSlot]:
+        loaded = self._loaded
+        return loaded.slot if loaded else None
+
     def get_orchestrator(self) -> Llama:
         return self._load("orchestrator", self._config.orchestrator)
 
@@ -104,11 +109,11 @@ class ModelManager:
 
     @contextmanager
     def use(self, slot: ModelSlot) -> Generator[Llama, None, None]:
-        llm = self.get_orchestrator() if slot == "orchestrator" else self.get_executor()
-        try:
+        # Llama instances are not thread-safe and only one slot is resident at a
+        # time, so parallel plan steps serialize here for the whole generation.
+        with self._lock:
+            llm = self.get_orchestrator() if slot == "orchestrator" else self.get_executor()
             yield llm
-        finally:
-            pass
 
     def backend_report(self) -> dict[ModelSlot, int]:
         return dict(self._backend_usage)
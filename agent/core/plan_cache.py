@@ -0,0 +1,238 @@
+from __future__ import annotations
+
+import copy
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any, Iterable, List, Optional
+
+import numpy as np
+
+from agent.config import AgentConfig, agent_config
+from agent.core.embeddings import EmbeddingProvider, embeddings
+from agent.core.speculation import query_embedding
+from agent.core.state import AgentState, PlanStep
+
+logger = logging.getLogger(__name__)
+
+QUERY_PLACEHOLDER = "$query"
+FILES_PLACEHOLDER = "$files"
+# Параметры, которые планировщик заполняет формулировкой запроса пользователя.
+QUERY_BOUND_PARAMS = ("query", "topic", "goal")
+
+
+@dataclass(slots=True)
+class PlanTemplate:
+    key: str
+    agent_type: str
+    file_signature: str
+    query: str
+    embedding: List[float]
+    plan: List[PlanStep]
+    created: float = field(default_factory=time.time)
+    hits: int = 0
+    successes: int = 0
+    failures: int = 0
+
+
+@dataclass(slots=True)
+class PlanMatch:
+    template: PlanTemplate
+    similarity: float
+    plan: List[PlanStep]
+
+
+def file_signature(files: Iterable[str]) -> str:
+    suffixes = sorted({Path(path).suffix.lower() or "?" for path in files})
+    return "+".join(suffixes) or "none"
+
+
+class PlanCache:
+    """Reuses validated plans for recurring intents.
+
+    Templates are keyed by agent type, attachment type signature and the query
+    embedding. A template is stored only after its plan ran without tool errors,
+    and is dropped once it fails more often than it succeeds.
+    """
+
+    def __init__(self, config: AgentConfig | None = None, embedder: EmbeddingProvider | None = None) -> None:
+        self._config = config or agent_config
+        self._embedder = embedder or embeddings
+        self._lock = threading.RLock()
+        self._templates: dict[str, PlanTemplate] = {}
+        self._stats = {"lookups": 0, "hits": 0, "cache_success": 0, "cache_failure": 0, "stored": 0}
+        self._loaded = False
+
+    @property
+    def enabled(self) -> bool:
+        return self._config.plan_cache_enabled
+
+    def lookup(self, state: AgentState) -> Optional[PlanMatch]:
+        if not self.enabled:
+            return None
+        self._ensure_loaded()
+        files = state.get("files", []) or []
+        agent_type = state.get("agent_type") or "general"
+        signature = file_signature(files)
+        with self._lock:
+            candidates = [
+                item
+                for item in self._templates.values()
+                if item.agent_type == agent_type and item.file_signature == signature
+            ]
+            self._stats["lookups"] += 1
+        if not candidates:
+            return None
+
+        vector = np.asarray(query_embedding(state, self._embedder), dtype=np.float32)
+        matrix = np.asarray([item.embedding for item in candidates], dtype=np.float32)
+        scores = matrix @ vector
+        best = int(np.argmax(scores))
+        similarity = float(scores[best])
+        if similarity < self._config.plan_cache_threshold:
+            return None
+
+        template = candidates[best]
+        with self._lock:
+            template.hits += 1
+            self._stats["hits"] += 1
+        return PlanMatch(template=template, similarity=similarity, plan=self._bind(template.plan, state))
+
+    def record_outcome(self, state: AgentState) -> None:
+        """Update template statistics or store a freshly validated LLM plan."""
+
+        if not self.enabled:
+            return
+        plan = state.get("plan") or []
+        results = state.get("tool_results") or []
+        success = bool(results) and all(item.get("success", False) for item in results)
+        source = state.get("plan_source")
+        if source == "cache":
+            self._record_cached(state.get("plan_template"), success)
+        elif source == "llm" and plan and success:
+            self._store(state, plan)
+
+    def stats(self) -> dict[str, Any]:
+        self._ensure_loaded()
+        with self._lock:
+            stats = dict(self._stats)
+            stats["templates"] = len(self._templates)
+        lookups = stats["lookups"]
+        reused = stats["cache_success"] + stats["cache_failure"]
+        stats["hit_rate"] = round(stats["hits"] / lookups, 3) if lookups else 0.0
+        stats["success_rate"] = round(stats["cache_success"] / reused, 3) if reused else 0.0
+        stats["threshold"] = self._config.plan_cache_threshold
+        return stats
+
+    def _record_cached(self, key: str | None, success: bool) -> None:
+        with self._lock:
+            template = self._templates.get(key or "")
+            self._stats["cache_success" if success else "cache_failure"] += 1
+            if template is not None:
+                if success:
+                    template.successes += 1
+                else:
+                    template.failures += 1
+                    if template.failures >= 2 and template.failures > template.successes:
+                        self._templates.pop(template.key, None)
+        self._save()
+
+    def _store(self, state: AgentState, plan: List[PlanStep]) -> None:
+        self._ensure_loaded()
+        files = state.get("files", []) or []
+        agent_type = state.get("agent_type") or "general"
+        signature = file_signature(files)
+        query = state["query"]
+        key = hashlib.sha256(f"{agent_type}|{signature}|{query}".encode("utf-8")).hexdigest()[:16]
+        template = PlanTemplate(
+            key=key,
+            agent_type=agent_type,
+            file_signature=signature,
+            query=query,
+            embedding=list(map(float, query_embedding(state, self._embedder))),
+            plan=self._unbind(plan),
+            successes=1,
+        )
+        with self._lock:
+            self._templates[key] = template
+            self._stats["stored"] += 1
+            overflow = len(self._templates) - self._config.plan_cache_max_entries
+            if overflow > 0:
+                ranked = sorted(self._templates.values(), key=lambda item: (item.successes + item.hits, item.created))
+                for item in ranked[:overflow]:
+                    self._templates.pop(item.key, None)
+        self._save()
+
+    @staticmethod
+    def _unbind(plan: List[PlanStep]) -> List[PlanStep]:
+        template = copy.deepcopy(plan)
+        for step in template:
+            # action служит задачей инструмента, поэтому привязывается к запросу.
+            step["action"] = QUERY_PLACEHOLDER
+            params = step.setdefault("params", {})
+            if "files" in params:
+                params["files"] = FILES_PLACEHOLDER
+            for name in QUERY_BOUND_PARAMS:
+                if name in params and isinstance(params[name], str):
+                    params[name] = QUERY_PLACEHOLDER
+        return template
+
+    @staticmethod
+    def _bind(plan: List[PlanStep], state: AgentState) -> List[PlanStep]:
+        query = state.get("query", "")
+        files = list(state.get("files", []) or [])
+        bound = copy.deepcopy(plan)
+        for step in bound:
+            if step.get("action") == QUERY_PLACEHOLDER:
+                step["action"] = query
+            params = step.setdefault("params", {})
+            for name, value in list(params.items()):
+                if value == QUERY_PLACEHOLDER:
+                    params[name] = query
+                elif value == FILES_PLACEHOLDER:
+                    params[name] = files
+        return bound
+
+    def _ensure_loaded(self) -> None:
+        with self._lock:
+            if self._loaded:
+                return
+            self._loaded = True
+            path = self._config.plan_cache_path
+            try:
+                with path.open("r", encoding="utf-8") as f:
+                    payload = json.load(f)
+            except (OSError, json.JSONDecodeError):
+                return
+            for item in payload.get("templates", []):
+                try:
+                    template = PlanTemplate(**item)
+                except TypeError:
+                    continue
+                self._templates[template.key] = template
+            self._stats.update(payload.get("stats", {}))
+
+    def _save(self) -> None:
+        with self._lock:
+            payload = {
+                "templates": [asdict(item) for item in self._templates.values()],
+                "stats": dict(self._stats),
+            }
+        path = self._config.plan_cache_path
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            # Уникальное имя: параллельные записи одного ключа не пишут в общий временный файл.
+            tmp = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+            with tmp.open("w", encoding="utf-8") as f:
+                json.dump(payload, f, ensure_ascii=False)
+            tmp.replace(path)
+        except OSError as exc:
+            logger.warning("Не удалось сохранить кэш планов: %s", exc)
+
+
+plan_cache = PlanCache()
@@ -0,0 +1,123 @@
+from __future__ import annotations
+
+import importlib
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Iterable, List, Sequence
+
+from agent.config import AgentConfig, agent_config
+
+logger = logging.getLogger(__name__)
+
+# Модули, которые воркер импортирует при старте, чтобы первый вызов не платил за импорт.
+PRELOAD_MODULES = (
+    "numpy",
+    "pandas",
+    "pypdf",
+    "docx",
+    "agent.tools.document_loader",
+    "agent.tools.tables",
+)
+
+
+def _init_worker(modules: Sequence[str]) -> None:
+    for module in modules:
+        try:
+            importlib.import_module(module)
+        except ImportError:
+            continue
+
+
+def _ping() -> int:
+    return 0
+
+
+class CpuPool:
+    """Warm spawn-based process pool for CPU-bound tool bodies.
+
+    Workers are started once with pandas/pypdf/docx preimported. Callables must
+    be module-level and return small picklable values (text, aggregates), which
+    come back through the pool as is. When the pool is disabled or broken the
+    call runs in the calling thread; a pool that breaks mid-call is replaced on
+    the next submit.
+    """
+
+    def __init__(self, config: AgentConfig | None = None, preload: Sequence[str] = PRELOAD_MODULES) -> None:
+        self._config = config or agent_config
+        self._preload = tuple(preload)
+        self._lock = threading.Lock()
+        self._executor: ProcessPoolExecutor | None = None
+
+    @property
+    def enabled(self) -> bool:
+        return self._config.cpu_pool_enabled and self._config.cpu_pool_workers > 0
+
+    def executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                workers = max(1, self._config.cpu_pool_workers)
+                self._executor = ProcessPoolExecutor(
+                    max_workers=workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_worker,
+                    initargs=(self._preload,),
+                )
+                # Поднимаем все воркеры сразу, а не по первому тяжёлому файлу.
+                for _ in range(workers):
+                    self._executor.submit(_ping)
+            return self._executor
+
+    def warm(self) -> None:
+        if self.enabled:
+            self.executor()
+
+    def submit(self, func: Callable[..., Any], *args: Any) -> Future:
+        if not self.enabled:
+            return self._run_inline(func, args)
+        for attempt in range(2):
+            executor = self.executor()
+            try:
+                future = executor.submit(func, *args)
+                break
+            except (BrokenProcessPool, RuntimeError) as exc:
+                self.shutdown(executor)
+                if attempt or not isinstance(exc, BrokenProcessPool):
+                    logger.warning("Пул процессов недоступен, выполняем в потоке: %s", exc)
+                    return self._run_inline(func, args)
+                # Пул сломан прошлым вызовом, а колбэк ещё не успел его сбросить.
+
+        def _done(done: Future) -> None:
+            # Упавший воркер ломает весь пул: следующий вызов поднимет новый.
+            if not done.cancelled() and isinstance(done.exception(), BrokenProcessPool):
+                self.shutdown(executor)
+
+        future.add_done_callback(_done)
+        return future
+
+    def map(self, func: Callable[..., Any], items: Iterable[Any]) -> List[Any]:
+        futures = [self.submit(func, item) for item in items]
+        return [future.result() for future in futures]
+
+    def shutdown(self, broken: ProcessPoolExecutor | None = None) -> None:
+        with self._lock:
+            if broken is not None and broken is not self._executor:
+                # Пул уже заменён другим вызовом.
+                return
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    @staticmethod
+    def _run_inline(func: Callable[..., Any], args: tuple) -> Future:
+        future: Future = Future()
+        try:
+            future.set_result(func(*args))
+        except BaseException as exc:  # noqa: BLE001
+            future.set_exception(exc)
+        return future
+
+
+cpu_pool = CpuPool()
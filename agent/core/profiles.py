@@ -0,0 +1,57 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Sequence
+
+
+@dataclass(slots=True, frozen=True)
+class AgentProfile:
+    """Tool set and planner limits of one specialised agent graph.
+
+    An empty ``tools`` means every registered tool, plugins included.
+    """
+
+    name: str
+    tools: tuple[str, ...]
+    focus: str = ""
+    max_steps: int = 6
+
+    def tool_names(self, registered: Sequence[str]) -> tuple[str, ...]:
+        if not self.tools:
+            return tuple(registered)
+        return tuple(name for name in self.tools if name in registered)
+
+
+GENERAL_PROFILE = AgentProfile(name="general", tools=())
+
+AGENT_PROFILES: dict[str, AgentProfile] = {
+    GENERAL_PROFILE.name: GENERAL_PROFILE,
+    "lawyer": AgentProfile(
+        name="lawyer",
+        tools=("legal_retriever", "document_loader"),
+        focus="юрист — договоры, условия, юридические риски",
+        max_steps=3,
+    ),
+    "financier": AgentProfile(
+        name="financier",
+        tools=("financial_analyzer",),
+        focus="финансист — продажи, расходы, рентабельность по таблицам",
+        max_steps=2,
+    ),
+    "marketer": AgentProfile(
+        name="marketer",
+        tools=("marketing_generator",),
+        focus="маркетолог — акции, посты, оценка ROI",
+        max_steps=3,
+    ),
+    "accountant": AgentProfile(
+        name="accountant",
+        tools=("financial_analyzer", "document_loader"),
+        focus="бухгалтер — первичные документы, учёт, отчётность",
+        max_steps=3,
+    ),
+}
+
+
+def get_profile(agent_type: str | None) -> AgentProfile:
+    return AGENT_PROFILES.get(agent_type or GENERAL_PROFILE.name, GENERAL_PROFILE)
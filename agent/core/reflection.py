@@ -0,0 +1,70 @@
+from __future__ import annotations
+
+import json
+from dataclasses import dataclass
+from typing import List, Optional
+
+from agent.core.state import AgentState, ToolExecution
+
+
+@dataclass(slots=True)
+class ReflectionDecision:
+    proceed: bool
+    reason: str
+
+
+class ReflectionEngine:
+    """Deterministic reflection for the unambiguous cases.
+
+    ``decide`` returns ``None`` when the LLM reflector has to look at the run:
+    failed tools, empty or suspicious outputs.
+    """
+
+    ERROR_PREFIX = "Ошибка при выполнении"
+
+    def __init__(self, min_output_chars: int = 20) -> None:
+        self.min_output_chars = min_output_chars
+
+    def decide(self, state: AgentState) -> Optional[ReflectionDecision]:
+        plan = state.get("plan", [])
+        if not plan:
+            return ReflectionDecision(proceed=False, reason="План пуст — переходим к ответу.")
+
+        fresh = self._unreviewed(state)
+        if not fresh or any(self._problem(execution) for execution in fresh):
+            return None
+
+        done = len(state.get("completed_steps", []))
+        if done >= len(plan):
+            return ReflectionDecision(
+                proceed=False,
+                reason=f"Все {len(plan)} шагов плана выполнены успешно.",
+            )
+        return ReflectionDecision(
+            proceed=True,
+            reason=f"Выполнено {done} из {len(plan)} шагов без ошибок, продолжаем по плану.",
+        )
+
+    def _unreviewed(self, state: AgentState) -> List[ToolExecution]:
+        results = state.get("tool_results", [])
+        return results[state.get("reviewed_results", 0) :]
+
+    def _problem(self, execution: ToolExecution) -> str | None:
+        if not execution.get("success", False) or execution.get("error"):
+            return "error"
+        output = (execution.get("output") or "").strip()
+        if len(output) < self.min_output_chars:
+            return "empty"
+        if output.startswith(self.ERROR_PREFIX):
+            return "error"
+        if output[0] in "[{":
+            try:
+                data = json.loads(output)
+            except json.JSONDecodeError:
+                return None
+            if not data:
+                return "empty"
+        return None
+
+
+reflection_engine = ReflectionEngine()
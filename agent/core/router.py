@@ -0,0 +1,214 @@
+from __future__ import annotations
+
+import threading
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+from agent.config import AgentConfig, agent_config
+from agent.core.embeddings import EmbeddingProvider, embeddings
+from agent.core.speculation import query_embedding
+from agent.core.state import AgentState, PlanStep
+
+TABLE_SUFFIXES = frozenset({".csv", ".tsv", ".xlsx", ".xls"})
+
+# Прототипы запросов, которым не подходит ни один маршрут: отступ считается и
+# против них, иначе при единственном кандидате проверка отступа ничего не даёт.
+NONE_ROUTE = "__none__"
+NONE_EXAMPLES: tuple[str, ...] = (
+    "привет, как дела",
+    "спасибо за помощь",
+    "что ты умеешь",
+    "объясни простыми словами, что такое ндс",
+    "сравни несколько вариантов и посоветуй лучший",
+    "составь план работ на неделю",
+    "расскажи подробнее про предыдущий ответ",
+)
+
+
+@dataclass(slots=True)
+class Route:
+    name: str
+    tool: str
+    agents: frozenset[str]
+    examples: Sequence[str]
+    params: dict[str, Any] = field(default_factory=dict)
+    query_param: str | None = None
+    requires_files: bool = False
+    file_suffixes: frozenset[str] | None = None
+
+    def accepts(self, agent_type: str | None, files: Sequence[str]) -> bool:
+        if agent_type and agent_type not in self.agents:
+            return False
+        if self.requires_files and not files:
+            return False
+        if self.file_suffixes is not None:
+            if not files or any(Path(path).suffix.lower() not in self.file_suffixes for path in files):
+                return False
+        return True
+
+
+@dataclass(slots=True)
+class RouteDecision:
+    route: Route
+    confidence: float
+    margin: float
+    plan: List[PlanStep]
+
+
+DEFAULT_ROUTES: tuple[Route, ...] = (
+    Route(
+        name="legal_search",
+        tool="legal_retriever",
+        agents=frozenset({"lawyer"}),
+        params={"k": 3},
+        query_param="query",
+        examples=(
+            "какие условия расторжения договора аренды",
+            "найди пункт о штрафах в договоре поставки",
+            "какая неустойка за просрочку оплаты по договору",
+            "срок действия договора и порядок продления",
+            "права и обязанности арендатора",
+            "есть ли в договоре риски для нас",
+        ),
+    ),
+    Route(
+        name="financial_analysis",
+        tool="financial_analyzer",
+        agents=frozenset({"financier", "accountant"}),
+        file_suffixes=TABLE_SUFFIXES,
+        examples=(
+            "проанализируй продажи",
+            "посчитай выручку и средний чек",
+            "какие расходы выросли за квартал",
+            "динамика продаж по месяцам",
+            "найди аномалии в расходах",
+            "сделай финансовый отчёт по таблице",
+        ),
+    ),
+    Route(
+        name="document_read",
+        tool="document_loader",
+        agents=frozenset({"lawyer", "accountant"}),
+        requires_files=True,
+        examples=(
+            "что написано в этом документе",
+            "перескажи приложенный файл",
+            "прочитай договор",
+            "о чём этот документ",
+        ),
+    ),
+    Route(
+        name="promotion",
+        tool="marketing_generator",
+        agents=frozenset({"marketer"}),
+        params={"mode": "promotion"},
+        query_param="goal",
+        examples=(
+            "придумай акцию для привлечения гостей",
+            "маркетинговая кампания на месяц",
+            "как увеличить продажи в будни с помощью акции",
+            "предложи программу лояльности",
+        ),
+    ),
+    Route(
+        name="social_post",
+        tool="marketing_generator",
+        agents=frozenset({"marketer"}),
+        params={"mode": "social_post"},
+        query_param="topic",
+        examples=(
+            "напиши пост для инстаграма",
+            "пост в соцсети о новом меню",
+            "текст для телеграм-канала про скидку",
+        ),
+    ),
+)
+
+
+class IntentRouter:
+    """Picks a single tool from the agent type and a nearest-prototype classifier.
+
+    Each route has a handful of example queries; a query is routed when its best
+    cosine similarity is above ``router_threshold`` and beats both the runner-up
+    route and the "no route" prototypes by ``router_margin``. Otherwise the LLM
+    planner decides.
+    """
+
+    def __init__(
+        self,
+        routes: Iterable[Route] = DEFAULT_ROUTES,
+        none_examples: Sequence[str] = NONE_EXAMPLES,
+        config: AgentConfig | None = None,
+        embedder: EmbeddingProvider | None = None,
+    ) -> None:
+        self.routes = list(routes)
+        self.none_examples = tuple(none_examples)
+        self._config = config or agent_config
+        self._embedder = embedder or embeddings
+        self._lock = threading.Lock()
+        self._prototypes: dict[str, np.ndarray] | None = None
+
+    @property
+    def enabled(self) -> bool:
+        return self._config.router_enabled
+
+    def route(self, state: AgentState) -> Optional[RouteDecision]:
+        if not self.enabled:
+            return None
+        files = list(state.get("files", []) or [])
+        candidates = [route for route in self.routes if route.accepts(state.get("agent_type"), files)]
+        if not candidates:
+            return None
+
+        prototypes = self._ensure_prototypes()
+        vector = np.asarray(query_embedding(state, self._embedder), dtype=np.float32)
+        scored = sorted(
+            ((float(np.max(prototypes[route.name] @ vector)), route) for route in candidates),
+            key=lambda item: item[0],
+            reverse=True,
+        )
+        confidence, best = scored[0]
+        runner_up = next((score for score, route in scored[1:] if route.name != best.name), 0.0)
+        if NONE_ROUTE in prototypes:
+            runner_up = max(runner_up, float(np.max(prototypes[NONE_ROUTE] @ vector)))
+        margin = confidence - runner_up
+        if confidence < self._config.router_threshold or margin < self._config.router_margin:
+            return None
+        return RouteDecision(route=best, confidence=confidence, margin=margin, plan=self._plan(best, state))
+
+    @staticmethod
+    def _plan(route: Route, state: AgentState) -> List[PlanStep]:
+        params = dict(route.params)
+        if route.query_param:
+            params[route.query_param] = state["query"]
+        return [
+            {
+                "step": 1,
+                "tool": route.tool,
+                "action": state["query"],
+                "params": params,
+                "depends_on": [],
+            }
+        ]
+
+    def _ensure_prototypes(self) -> dict[str, np.ndarray]:
+        with self._lock:
+            if self._prototypes is None:
+                groups = [(route.name, route.examples) for route in self.routes]
+                if self.none_examples:
+                    groups.append((NONE_ROUTE, self.none_examples))
+                texts = [example for _, examples in groups for example in examples]
+                vectors = np.asarray(self._embedder.embed_documents(texts), dtype=np.float32)
+                prototypes: dict[str, np.ndarray] = {}
+                offset = 0
+                for name, examples in groups:
+                    prototypes[name] = vectors[offset : offset + len(examples)]
+                    offset += len(examples)
+                self._prototypes = prototypes
+            return self._prototypes
+
+
+intent_router = IntentRouter()
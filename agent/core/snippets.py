@@ -0,0 +1,63 @@
+from __future__ import annotations
+
+from typing import List, Sequence
+
+import numpy as np
+
+from agent.core.chunking import split_sentences
+from agent.core.embeddings import EmbeddingProvider, embeddings
+from agent.core.tokens import estimate_tokens
+
+GAP_MARKER = "…"
+
+
+def extract_snippet(
+    text: str,
+    query_vector: Sequence[float],
+    *,
+    max_tokens: int,
+    embedder: EmbeddingProvider | None = None,
+) -> str:
+    """Sentences most similar to the query, within ``max_tokens``, in document order.
+
+    Non-adjacent sentences are joined with an ellipsis so the reader sees the gap.
+    """
+
+    sentences = split_sentences(text)
+    if not sentences:
+        return ""
+    if estimate_tokens(text) <= max_tokens:
+        return " ".join(sentences)
+
+    vectors = np.asarray((embedder or embeddings).embed_documents(sentences), dtype=np.float32)
+    scores = vectors @ np.asarray(query_vector, dtype=np.float32)
+    # Соседи лучшего предложения часто содержат продолжение пункта — даём им небольшую фору.
+    context = np.maximum(np.pad(scores[1:], (0, 1)), np.pad(scores[:-1], (1, 0)))
+    ranked = np.argsort(-(scores + 0.1 * context))
+
+    chosen: List[int] = []
+    used = 0
+    for idx in ranked:
+        tokens = estimate_tokens(sentences[idx])
+        if used + tokens > max_tokens:
+            if not chosen:
+                # Даже одно предложение не помещается — режем его по бюджету.
+                return sentences[idx][: max_tokens * 4]
+            continue
+        chosen.append(int(idx))
+        used += tokens
+
+    chosen.sort()
+    parts: List[str] = []
+    previous = None
+    for idx in chosen:
+        if previous is not None and idx != previous + 1:
+            parts.append(GAP_MARKER)
+        parts.append(sentences[idx])
+        previous = idx
+    snippet = " ".join(parts)
+    if chosen[0] > 0:
+        snippet = f"{GAP_MARKER} {snippet}"
+    if chosen[-1] < len(sentences) - 1:
+        snippet = f"{snippet} {GAP_MARKER}"
+    return snippet
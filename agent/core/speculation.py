@@ -0,0 +1,156 @@
+from __future__ import annotations
+
+import threading
+import time
+from concurrent.futures import CancelledError, Future, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+from typing import Any, Callable, List, Optional, Sequence
+
+from agent.config import AgentConfig, agent_config
+from agent.core.agent_logger import agent_logger
+from agent.core.embeddings import EmbeddingProvider, embeddings
+from agent.core.state import AgentState
+from agent.tools.document_loader import DocumentLoader, document_loader
+
+
+class _Task:
+    __slots__ = ("key", "future", "work_ms")
+
+    def __init__(self, key: Any) -> None:
+        self.key = key
+        self.future: Future | None = None
+        self.work_ms = 0.0
+
+
+class Speculator:
+    """Starts work that almost every plan needs while the planner LLM is busy.
+
+    At run start the attached files are parsed and the query is embedded in
+    separate background pools, so a long parse never delays the query vector.
+    Consumers take the result only if it was computed for the same inputs. A
+    task still queued is cancelled and computed inline; a running one is awaited
+    (up to ``timeout``), so a slow file is never parsed twice. Leftovers are
+    cancelled or dropped by ``discard``.
+    """
+
+    def __init__(
+        self,
+        config: AgentConfig | None = None,
+        loader: DocumentLoader | None = None,
+        embedder: EmbeddingProvider | None = None,
+    ) -> None:
+        self._config = config or agent_config
+        self._loader = loader or document_loader
+        self._embedder = embedder or embeddings
+        self._lock = threading.Lock()
+        self._pools: dict[str, ThreadPoolExecutor] = {}
+        self._runs: dict[str, dict[str, _Task]] = {}
+
+    def start(self, state: AgentState) -> None:
+        run_id = state.get("run_id")
+        if not self._config.speculation_enabled or not run_id:
+            return
+        with self._lock:
+            if run_id in self._runs:
+                return
+            tasks: dict[str, _Task] = {}
+            files = tuple(state.get("files", []) or [])
+            if files:
+                tasks["documents"] = self._submit("parse", files, self._loader.load_many, list(files))
+            query = state.get("query", "")
+            if query:
+                tasks["query"] = self._submit("embed", query, self._embedder.embed_query, query)
+            self._runs[run_id] = tasks
+
+    def documents(
+        self, state: AgentState, files: Sequence[str], timeout: float | None = None
+    ) -> Optional[List[dict]]:
+        return self._consume(state, "documents", tuple(files), timeout)
+
+    def query_embedding(self, state: AgentState) -> Optional[List[float]]:
+        return self._consume(state, "query", state.get("query", ""), None)
+
+    def discard(self, run_id: str | None) -> None:
+        with self._lock:
+            tasks = self._runs.pop(run_id or "", {})
+        for task in tasks.values():
+            if task.future is not None:
+                task.future.cancel()
+
+    def _submit(self, queue: str, key: Any, func: Callable[..., Any], *args: Any) -> _Task:
+        pool = self._pools.get(queue)
+        if pool is None:
+            # Эмбеддинг запроса короткий и нужен раньше всего — у него своя очередь.
+            workers = max(1, self._config.speculation_workers) if queue == "parse" else 1
+            pool = self._pools[queue] = ThreadPoolExecutor(
+                max_workers=workers, thread_name_prefix=f"speculate-{queue}"
+            )
+        task = _Task(key)
+
+        def _run() -> Any:
+            start = time.perf_counter()
+            try:
+                return func(*args)
+            finally:
+                task.work_ms = (time.perf_counter() - start) * 1000
+
+        task.future = pool.submit(_run)
+        return task
+
+    def _consume(self, state: AgentState, kind: str, key: Any, timeout: float | None) -> Any:
+        with self._lock:
+            task = self._runs.get(state.get("run_id") or "", {}).get(kind)
+        if task is None or task.future is None or task.key != key or task.future.cancelled():
+            return None
+        ready = task.future.done()
+        wait_start = time.perf_counter()
+        if not ready and task.future.cancel():
+            # Задача ещё в очереди: быстрее посчитать на месте, чем ждать.
+            self._log_miss(state, kind, "queued")
+            return None
+        try:
+            # Задача уже выполняется: повторный расчёт на месте удвоил бы работу,
+            # поэтому ждём её в пределах таймаута шага.
+            result = task.future.result(timeout=timeout)
+        except FutureTimeout:
+            self._log_miss(state, kind, "timeout")
+            return None
+        except CancelledError:
+            self._log_miss(state, kind, "cancelled")
+            return None
+        except Exception:
+            self._log_miss(state, kind, "error")
+            return None
+        agent_logger.log_event(
+            state,
+            node="speculation",
+            event_type="speculation_hit",
+            details={
+                "kind": kind,
+                "ready": ready,
+                "work_ms": task.work_ms,
+                "wait_ms": (time.perf_counter() - wait_start) * 1000,
+            },
+        )
+        return result
+
+    @staticmethod
+    def _log_miss(state: AgentState, kind: str, reason: str) -> None:
+        agent_logger.log_event(
+            state,
+            node="speculation",
+            event_type="speculation_miss",
+            details={"kind": kind, "reason": reason},
+        )
+
+
+speculator = Speculator()
+
+
+def query_embedding(state: AgentState, embedder: EmbeddingProvider | None = None) -> List[float]:
+    """Query vector from the speculative pool, or computed now."""
+
+    vector = speculator.query_embedding(state)
+    if vector is not None:
+        return vector
+    return (embedder or embeddings).embed_query(state["query"])
@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import uuid
 from typing import Any, List, Optional, TypedDict
 
 
@@ -8,6 +9,7 @@ class PlanStep(TypedDict, total=False):
     tool: str
     action: str
     params: dict[str, Any]
+    depends_on: List[int]
 
 
 class ToolExecution(TypedDict, total=False):
@@ -15,8 +17,11 @@ class ToolExecution(TypedDict, total=False):
     tool: str
     input: str
     output: str
+    output_ref: str
+    output_chars: int
     success: bool
     error: Optional[str]
+    duration_ms: float
 
 
 class AgentEvent(TypedDict, total=False):
@@ -28,36 +33,56 @@ class AgentEvent(TypedDict, total=False):
 
 class AgentState(TypedDict, total=False):
 
+    run_id: str
+    agent_type: Optional[str]
+    namespace: Optional[str]
     query: str
     files: List[str]
+    history: List[dict[str, str]]
     plan: List[PlanStep]
+    plan_source: Optional[str]
+    plan_template: Optional[str]
     current_step: int
+    completed_steps: List[int]
     tool_results: List[ToolExecution]
     reflection: Optional[str]
     decision: Optional[bool]
+    reviewed_results: int
     final_answer: Optional[str]
     iteration: int
     scratchpad: List[str]
     events: List[AgentEvent]
     loaded_documents: List[dict[str, Any]]
     llm_calls: List[dict[str, Any]]
+    llm_calls_skipped: dict[str, int]
 
 
-def initial_state(query: str, files: list[str]) -> AgentState:
+def initial_state(
+    query: str, files: list[str], agent_type: str | None = None, namespace: str | None = None
+) -> AgentState:
     return {
+        "run_id": uuid.uuid4().hex,
+        "agent_type": agent_type,
+        "namespace": namespace,
         "query": query,
         "files": files,
+        "history": [],
         "plan": [],
+        "plan_source": None,
+        "plan_template": None,
         "current_step": 0,
+        "completed_steps": [],
         "tool_results": [],
         "reflection": None,
         "decision": None,
+        "reviewed_results": 0,
         "final_answer": None,
         "iteration": 0,
         "scratchpad": [],
         "events": [],
         "loaded_documents": [],
         "llm_calls": [],
+        "llm_calls_skipped": {},
     }
 
 
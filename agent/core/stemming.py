@@ -0,0 +1,60 @@
+from __future__ import annotations
+
+import re
+from functools import lru_cache
+from typing import Iterable, List
+
+try:
+    import snowballstemmer
+except ImportError:  # pragma: no cover - optional dependency
+    snowballstemmer = None  # type: ignore[assignment]
+
+
+_CYRILLIC_RE = re.compile(r"[а-яё]")
+# Упрощённый стеммер на случай отсутствия snowballstemmer: отрезает самые частые
+# окончания, оставляя основу не короче четырёх букв.
+_ENDINGS = sorted(
+    {
+        "ами", "ями", "ого", "его", "ому", "ему", "ыми", "ими", "ая", "яя", "ое", "ее", "ые", "ие",
+        "ый", "ий", "ой", "ей", "ую", "юю", "ом", "ем", "ам", "ям", "ах", "ях", "ов", "ев", "ию",
+        "ия", "ть", "ться", "ет", "ют", "ут", "ит", "ат", "ят", "ся", "а", "я", "о", "е", "ы",
+        "и", "у", "ю", "ь", "й",
+    },
+    key=len,
+    reverse=True,
+)
+
+
+def _light_stem(word: str) -> str:
+    for ending in _ENDINGS:
+        if word.endswith(ending) and len(word) - len(ending) >= 4:
+            return word[: -len(ending)]
+    return word
+
+
+@lru_cache(maxsize=1)
+def _snowball():
+    if snowballstemmer is None:
+        return None
+    return snowballstemmer.stemmer("russian")
+
+
+def analyzer_name() -> str:
+    """Identifier of the active stemmer; terms from different analyzers do not match."""
+
+    return "snowball-russian" if _snowball() is not None else "light-ru-1"
+
+
+@lru_cache(maxsize=65536)
+def stem(word: str) -> str:
+    if not _CYRILLIC_RE.search(word):
+        # Номера статей, ИНН и латиница сравниваются как есть.
+        return word
+    stemmer = _snowball()
+    if stemmer is not None:
+        return stemmer.stemWord(word)
+    return _light_stem(word)
+
+
+def stem_tokens(tokens: Iterable[str]) -> List[str]:
+    return [stem(token) for token in tokens]
@@ -0,0 +1,215 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import List, Optional
+
+from agent.config import AgentConfig, LlamaConfig, agent_config, llama_config
+from agent.core.agent_logger import agent_logger
+from agent.core.chunking import split_by_tokens
+from agent.core.llm import invoke_executor
+from agent.core.state import AgentState
+from agent.core.tokens import estimate_tokens
+from agent.prompts.summarizer import chunk_summary_prompt, reduce_prompt
+
+logger = logging.getLogger(__name__)
+
+# Меняется вместе с chunk_summary_prompt, чтобы старые конспекты не попадали из кэша.
+CHUNK_PROMPT_VERSION = "1"
+
+
+@dataclass(slots=True)
+class Digest:
+    text: str
+    chunks: int
+    cached: int
+    source_tokens: int
+    digest_tokens: int
+    skipped: int = 0
+
+    @property
+    def complete(self) -> bool:
+        return self.skipped == 0
+
+
+class DocumentSummarizer:
+    """Map-reduce digest for documents that do not fit the context window.
+
+    The text is split by token budget, chunks are summarized by the executor
+    model (summaries are cached on disk by content hash), then the summaries
+    are merged, hierarchically if needed, into one digest. The digest does not
+    depend on the query, so it can be cached together with the loaded file.
+
+    ``deadline`` (``time.monotonic()`` value) is checked before every model call:
+    once it passes, the remaining chunks are left out and the summaries are
+    joined without further merging, so a caller that gave up on the result
+    does not keep the model busy.
+    """
+
+    def __init__(self, config: AgentConfig | None = None, llama: LlamaConfig | None = None) -> None:
+        self._config = config or agent_config
+        self._llama = llama or llama_config
+        self._lock = threading.Lock()
+        self._pool: ThreadPoolExecutor | None = None
+        self.directory = self._config.doc_summary_cache_dir
+
+    def needs_digest(self, text: str) -> bool:
+        return self._config.doc_max_tokens > 0 and estimate_tokens(text) > self._config.doc_max_tokens
+
+    def digest(
+        self, text: str, *, title: str, state: Optional[AgentState] = None, deadline: float | None = None
+    ) -> Digest:
+        chunks = split_by_tokens(text, self._config.doc_chunk_tokens)
+        cached = 0
+        summaries: List[Optional[str]] = []
+        for chunk in chunks:
+            summary = self._cache_get(self._cache_key(chunk))
+            cached += summary is not None
+            summaries.append(summary)
+
+        # Модель одна и держит блокировку на всю генерацию, поэтому пул ограничен:
+        # он нужен, чтобы нарезка и чтение кэша не ждали очередного вызова LLM.
+        pending = [idx for idx, summary in enumerate(summaries) if summary is None]
+        futures = {
+            idx: self._executor().submit(
+                self._summarize_chunk, chunks[idx], idx + 1, len(chunks), title, state, deadline
+            )
+            for idx in pending
+        }
+        for idx, future in futures.items():
+            summaries[idx] = future.result()
+
+        skipped = sum(summary is None for summary in summaries)
+        parts = [
+            summary if summary is not None else f"[фрагмент {idx} из {len(chunks)} не обработан: истёк бюджет времени]"
+            for idx, summary in enumerate(summaries, start=1)
+        ]
+        result = self._reduce(parts, title=title, state=state, deadline=deadline)
+        digest = Digest(
+            text=result,
+            chunks=len(chunks),
+            cached=cached,
+            source_tokens=estimate_tokens(text),
+            digest_tokens=estimate_tokens(result),
+            skipped=skipped,
+        )
+        if state is not None:
+            agent_logger.log_event(
+                state,
+                node="summarizer",
+                event_type="document_digest",
+                details={
+                    "title": title,
+                    "chunks": digest.chunks,
+                    "cached_chunks": digest.cached,
+                    "source_tokens": digest.source_tokens,
+                    "digest_tokens": digest.digest_tokens,
+                    "skipped_chunks": digest.skipped,
+                },
+            )
+        return digest
+
+    def _summarize_chunk(
+        self,
+        chunk: str,
+        index: int,
+        total: int,
+        title: str,
+        state: Optional[AgentState],
+        deadline: float | None,
+    ) -> Optional[str]:
+        if _expired(deadline):
+            return None
+        messages = chunk_summary_prompt.format_messages(title=title, index=index, total=total, chunk=chunk)
+        summary = invoke_executor(
+            messages, state=state, node="summarizer", max_tokens=self._config.doc_summary_tokens
+        ).content.strip()
+        self._cache_put(self._cache_key(chunk), summary)
+        return summary
+
+    def _reduce(
+        self, summaries: List[str], *, title: str, state: Optional[AgentState], deadline: float | None = None
+    ) -> str:
+        budget = self._config.doc_chunk_tokens
+        while len(summaries) > 1 and estimate_tokens("\n\n".join(summaries)) > budget:
+            if _expired(deadline):
+                return "\n\n".join(summaries)
+            groups = self._group(summaries, budget)
+            if len(groups) == len(summaries):
+                # Каждый конспект уже на пределе бюджета — дальше сжимать нечего.
+                break
+            summaries = [
+                self._merge(group, title=title, state=state) if len(group) > 1 else group[0]
+                for group in groups
+            ]
+        if len(summaries) <= 1:
+            return summaries[0] if summaries else ""
+        if _expired(deadline):
+            return "\n\n".join(summaries)
+        return self._merge(summaries, title=title, state=state)
+
+    def _merge(self, summaries: List[str], *, title: str, state: Optional[AgentState]) -> str:
+        numbered = "\n\n".join(f"[{idx}] {summary}" for idx, summary in enumerate(summaries, start=1))
+        messages = reduce_prompt.format_messages(title=title, summaries=numbered)
+        return invoke_executor(
+            messages, state=state, node="summarizer", max_tokens=self._config.doc_summary_tokens * 2
+        ).content.strip()
+
+    @staticmethod
+    def _group(summaries: List[str], budget: int) -> List[List[str]]:
+        groups: List[List[str]] = [[]]
+        size = 0
+        for summary in summaries:
+            tokens = estimate_tokens(summary)
+            if groups[-1] and size + tokens > budget:
+                groups.append([])
+                size = 0
+            groups[-1].append(summary)
+            size += tokens
+        return groups
+
+    def _executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(
+                    max_workers=max(1, self._config.doc_summary_workers), thread_name_prefix="summarize"
+                )
+            return self._pool
+
+    def _cache_key(self, chunk: str) -> str:
+        payload = f"{CHUNK_PROMPT_VERSION}|{self._llama.executor.filename}|{self._config.doc_summary_tokens}|{chunk}"
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.directory / key[:2] / f"{key}.json"
+
+    def _cache_get(self, key: str) -> Optional[str]:
+        try:
+            with self._path(key).open("r", encoding="utf-8") as f:
+                return json.load(f).get("summary")
+        except (OSError, json.JSONDecodeError):
+            return None
+
+    def _cache_put(self, key: str, summary: str) -> None:
+        path = self._path(key)
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_suffix(f".{threading.get_ident()}.tmp")
+            with tmp.open("w", encoding="utf-8") as f:
+                json.dump({"summary": summary}, f, ensure_ascii=False)
+            tmp.replace(path)
+        except OSError as exc:
+            logger.warning("Не удалось сохранить конспект фрагмента: %s", exc)
+
+
+def _expired(deadline: float | None) -> bool:
+    return deadline is not None and time.monotonic() >= deadline
+
+
+document_summarizer = DocumentSummarizer()
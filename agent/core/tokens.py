@@ -0,0 +1,34 @@
+from __future__ import annotations
+
+try:
+    import tiktoken
+except ImportError:  # pragma: no cover - optional dependency
+    tiktoken = None  # type: ignore[assignment]
+
+
+_TOKEN_ENCODER = None
+
+
+def _ensure_token_encoder():
+    global _TOKEN_ENCODER
+    if _TOKEN_ENCODER is not None:
+        return _TOKEN_ENCODER
+    if tiktoken is None:
+        return None
+    try:
+        _TOKEN_ENCODER = tiktoken.get_encoding("cl100k_base")
+    except Exception:  # pragma: no cover - fallback path
+        _TOKEN_ENCODER = None
+    return _TOKEN_ENCODER
+
+
+def estimate_tokens(text: str) -> int:
+    """Approximate token count (cl100k_base, or chars / 4 without tiktoken)."""
+
+    encoder = _ensure_token_encoder()
+    if encoder is None:
+        return max(1, len(text) // 4) if text else 0
+    try:
+        return len(encoder.encode(text))
+    except Exception:  # pragma: no cover - encoding edge cases
+        return max(1, len(text) // 4) if text else 0
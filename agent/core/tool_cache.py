@@ -0,0 +1,137 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Iterable, Optional
+
+from agent.config import AgentConfig, agent_config
+
+logger = logging.getLogger(__name__)
+
+
+class FileHasher:
+    """sha256 of file contents, memoized by (path, mtime, size)."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._known: dict[str, tuple[int, int, str]] = {}
+
+    def sha256(self, path: str | Path) -> str:
+        path = Path(path)
+        stat = path.stat()
+        key = str(path.resolve())
+        with self._lock:
+            known = self._known.get(key)
+            if known and known[0] == stat.st_mtime_ns and known[1] == stat.st_size:
+                return known[2]
+        digest = hashlib.sha256()
+        with path.open("rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(chunk)
+        value = digest.hexdigest()
+        with self._lock:
+            self._known[key] = (stat.st_mtime_ns, stat.st_size, value)
+        return value
+
+
+class ToolResultCache:
+    """Two-tier (LRU memory + JSON on disk) cache of tool outputs with per-tool TTL."""
+
+    def __init__(self, config: AgentConfig | None = None, hasher: FileHasher | None = None) -> None:
+        self._config = config or agent_config
+        self._hasher = hasher or FileHasher()
+        self._lock = threading.RLock()
+        self._memory: OrderedDict[str, tuple[float, str, dict[str, Any]]] = OrderedDict()
+        self.directory = self._config.tool_cache_dir
+
+    @property
+    def enabled(self) -> bool:
+        return self._config.tool_cache_enabled
+
+    def ttl(self, tool: str) -> int:
+        return self._config.tool_cache_ttls.get(tool, 0)
+
+    def make_key(self, tool: str, inputs: dict[str, Any], files: Iterable[str] = ()) -> Optional[str]:
+        """Build a cache key or ``None`` when the call must not be cached."""
+
+        if not self.enabled or self.ttl(tool) <= 0:
+            return None
+        try:
+            hashes = [self._hasher.sha256(path) for path in files]
+        except OSError:
+            return None
+        payload = json.dumps(
+            {"tool": tool, "inputs": inputs, "files": hashes},
+            ensure_ascii=False,
+            sort_keys=True,
+            default=str,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, tool: str, key: str) -> Optional[dict[str, Any]]:
+        ttl = self.ttl(tool)
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                created, _, value = entry
+                if now - created <= ttl:
+                    self._memory.move_to_end(key)
+                    return value
+                self._memory.pop(key, None)
+
+        path = self._path(tool, key)
+        try:
+            with path.open("r", encoding="utf-8") as f:
+                record = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return None
+        created = float(record.get("created", 0))
+        if now - created > ttl:
+            path.unlink(missing_ok=True)
+            return None
+        value = record.get("value") or {}
+        self._remember(key, created, tool, value)
+        return value
+
+    def put(self, tool: str, key: str, value: dict[str, Any]) -> None:
+        created = time.time()
+        self._remember(key, created, tool, value)
+        path = self._path(tool, key)
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            # Уникальное имя: параллельные записи одного ключа не пишут в общий временный файл.
+            tmp = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+            with tmp.open("w", encoding="utf-8") as f:
+                json.dump({"created": created, "value": value}, f, ensure_ascii=False, default=str)
+            tmp.replace(path)
+        except OSError as exc:
+            logger.warning("Не удалось сохранить кэш %s: %s", tool, exc)
+
+    def invalidate(self, tool: str | None = None) -> None:
+        with self._lock:
+            for key in [key for key, entry in self._memory.items() if tool is None or entry[1] == tool]:
+                self._memory.pop(key, None)
+        target = self.directory / tool if tool else self.directory
+        shutil.rmtree(target, ignore_errors=True)
+
+    def _remember(self, key: str, created: float, tool: str, value: dict[str, Any]) -> None:
+        with self._lock:
+            self._memory[key] = (created, tool, value)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self._config.tool_cache_memory_items:
+                self._memory.popitem(last=False)
+
+    def _path(self, tool: str, key: str) -> Path:
+        return self.directory / tool / f"{key}.json"
+
+
+file_hasher = FileHasher()
+tool_cache = ToolResultCache(hasher=file_hasher)
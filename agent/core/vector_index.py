@@ -0,0 +1,344 @@
+from __future__ import annotations
+
+import dataclasses
+import logging
+import math
+import time
+from typing import Any, Dict, List, Sequence
+
+import faiss
+import numpy as np
+
+from agent.config import AgentConfig, agent_config
+
+logger = logging.getLogger(__name__)
+
+INDEX_TYPES = ("flat", "hnsw", "ivf_flat", "ivf_pq")
+COMPRESSIONS = ("none", "sq8", "pq")
+REDUCTIONS = ("none", "pca", "matryoshka")
+
+# Пороги автоматического выбора по числу векторов.
+HNSW_FROM = 20_000
+IVF_FROM = 200_000
+IVF_PQ_FROM = 2_000_000
+
+
+def choose_index_type(count: int, config: AgentConfig | None = None) -> str:
+    config = config or agent_config
+    if config.legal_index_type in INDEX_TYPES:
+        return config.legal_index_type
+    if count < HNSW_FROM:
+        return "flat"
+    if count < IVF_FROM:
+        return "hnsw"
+    if count < IVF_PQ_FROM:
+        return "ivf_flat"
+    return "ivf_pq"
+
+
+# PQ обучает 2**8 центроидов на каждое подпространство, PCA — d_out главных компонент:
+# на меньшей обучающей выборке faiss падает.
+PQ_MIN_TRAIN = 256
+
+
+def _train_size(count: int, config: AgentConfig) -> int:
+    return min(count, max(1, config.legal_train_sample))
+
+
+def _nlist(count: int, train: int) -> int:
+    # faiss хочет не меньше ~39 точек обучения на кластер.
+    return max(1, min(int(4 * math.sqrt(count)), train // 39 or 1))
+
+
+def _pq_m(dim: int, config: AgentConfig) -> int:
+    if config.legal_pq_m and dim % config.legal_pq_m == 0:
+        return config.legal_pq_m
+    for m in (48, 32, 24, 16, 12, 8, 4, 2, 1):
+        if dim % m == 0 and dim // m >= 4:
+            return m
+    return 1
+
+
+def _compression(kind: str, config: AgentConfig, count: int | None = None) -> str:
+    """Quantizer that ``build_index`` actually uses for ``kind`` over ``count`` vectors.
+
+    Without ``count`` this is the configured codec; too few vectors to train PQ
+    fall back to floats.
+    """
+
+    if kind == "ivf_pq":
+        codec = "pq"
+    elif kind == "hnsw" and config.legal_compression == "pq":
+        # У HNSW+PQ в faiss нет скалярного произведения — берём SQ8.
+        codec = "sq8"
+    else:
+        codec = config.legal_compression if config.legal_compression in {"sq8", "pq"} else "none"
+    if codec == "pq" and count is not None and _train_size(count, config) < PQ_MIN_TRAIN:
+        return "none"
+    return codec
+
+
+def _reduction(dim: int, config: AgentConfig, count: int | None = None) -> str:
+    target = config.legal_reduced_dim
+    if config.legal_reduce not in {"pca", "matryoshka"} or not 0 < target < dim:
+        return "none"
+    if config.legal_reduce == "pca" and count is not None and _train_size(count, config) < target:
+        return "none"
+    return config.legal_reduce
+
+
+def codec_spec(dim: int, kind: str, config: AgentConfig | None = None, *, count: int | None = None) -> str:
+    """Short description of the lossy options of a ``kind`` index, e.g. ``sq8+pca256``; ``none`` for floats.
+
+    With ``count`` the spec is what :func:`build_index` builds over that many vectors.
+    """
+
+    config = config or agent_config
+    parts = []
+    compression = _compression(kind, config, count)
+    if compression != "none":
+        parts.append(compression)
+    reduction = _reduction(dim, config, count)
+    if reduction != "none":
+        parts.append(f"{reduction}{config.legal_reduced_dim}")
+    return "+".join(parts) or "none"
+
+
+def _transforms(dim: int, config: AgentConfig, count: int) -> List[faiss.VectorTransform]:
+    reduction = _reduction(dim, config, count)
+    if reduction == "none":
+        return []
+    target = config.legal_reduced_dim
+    if reduction == "pca":
+        first = faiss.PCAMatrix(dim, target)
+    else:
+        # Matryoshka-модели кладут главное в первые координаты: берём префикс вектора.
+        first = faiss.LinearTransform(dim, target, False)
+        faiss.copy_array_to_vector(np.eye(target, dim, dtype="float32").ravel(), first.A)
+        first.is_trained = True
+    # После сокращения векторы снова нормируются, чтобы скалярное произведение оставалось косинусом.
+    return [first, faiss.NormalizationTransform(target, 2.0)]
+
+
+def build_index(vectors: np.ndarray, ids: np.ndarray, kind: str, config: AgentConfig | None = None) -> faiss.Index:
+    """Inner-product index over normalized ``vectors`` with external int64 ``ids``.
+
+    ``legal_compression`` stores codes instead of floats (SQ8 — 4x smaller, PQ — 16x
+    and more), ``legal_reduce`` projects vectors to ``legal_reduced_dim`` first.
+    """
+
+    config = config or agent_config
+    count = len(vectors)
+    wanted, built = codec_spec(vectors.shape[1], kind, config), codec_spec(vectors.shape[1], kind, config, count=count)
+    if built != wanted:
+        logger.warning(
+            "Для %s не хватает векторов на обучение (%d): индекс %s строится как %s", wanted, count, kind, built
+        )
+    transforms = _transforms(vectors.shape[1], config, count)
+    dim = transforms[-1].d_out if transforms else vectors.shape[1]
+    codec = _compression(kind, config, count)
+    if kind == "hnsw":
+        if config.legal_compression == "pq":
+            logger.info("HNSW строится с SQ8 вместо PQ")
+        if codec == "sq8":
+            base = faiss.IndexHNSWSQ(dim, faiss.ScalarQuantizer.QT_8bit, config.legal_hnsw_m, faiss.METRIC_INNER_PRODUCT)
+        else:
+            base = faiss.IndexHNSWFlat(dim, config.legal_hnsw_m, faiss.METRIC_INNER_PRODUCT)
+        base.hnsw.efConstruction = config.legal_ef_construction
+    elif kind in {"ivf_flat", "ivf_pq"}:
+        nlist = _nlist(count, _train_size(count, config))
+        quantizer = faiss.IndexFlatIP(dim)
+        if codec == "pq":
+            base = faiss.IndexIVFPQ(quantizer, dim, nlist, _pq_m(dim, config), 8, faiss.METRIC_INNER_PRODUCT)
+        elif codec == "sq8":
+            base = faiss.IndexIVFScalarQuantizer(
+                quantizer, dim, nlist, faiss.ScalarQuantizer.QT_8bit, faiss.METRIC_INNER_PRODUCT
+            )
+        else:
+            base = faiss.IndexIVFFlat(quantizer, dim, nlist, faiss.METRIC_INNER_PRODUCT)
+    elif codec == "sq8":
+        base = faiss.IndexScalarQuantizer(dim, faiss.ScalarQuantizer.QT_8bit, faiss.METRIC_INNER_PRODUCT)
+    elif codec == "pq":
+        base = faiss.IndexPQ(dim, _pq_m(dim, config), 8, faiss.METRIC_INNER_PRODUCT)
+    else:
+        base = faiss.IndexFlatIP(dim)
+
+    if transforms:
+        base = faiss.IndexPreTransform(transforms[-1], base)
+        for transform in reversed(transforms[:-1]):
+            base.prepend_transform(transform)
+    if not base.is_trained:
+        base.train(_training_sample(vectors, config.legal_train_sample))
+    index = faiss.IndexIDMap2(base)
+    if len(vectors):
+        index.add_with_ids(vectors, ids)
+    apply_search_params(index, kind, config)
+    return index
+
+
+def rerank(
+    vectors: np.ndarray, ids: np.ndarray, query: np.ndarray, candidates: Sequence[int], k: int
+) -> List[tuple[int, float]]:
+    """Exact scores of ``candidates`` from full-precision ``vectors``, best ``k`` first.
+
+    ``ids`` must be sorted ascending, which holds for the stored legal vectors.
+    """
+
+    candidates = np.array([item for item in candidates if item >= 0], dtype="int64")
+    rows = np.searchsorted(ids, candidates)
+    valid = rows < len(ids)
+    rows, candidates = rows[valid], candidates[valid]
+    found = ids[rows] == candidates
+    rows, candidates = rows[found], candidates[found]
+    if not len(rows):
+        return []
+    scores = np.asarray(vectors[rows], dtype="float32") @ query
+    order = np.argsort(-scores)[:k]
+    return [(int(candidates[idx]), float(scores[idx])) for idx in order]
+
+
+def _training_sample(vectors: np.ndarray, limit: int) -> np.ndarray:
+    if len(vectors) <= limit:
+        return vectors
+    rows = np.random.default_rng(0).choice(len(vectors), size=limit, replace=False)
+    return np.ascontiguousarray(vectors[np.sort(rows)])
+
+
+def apply_search_params(index: faiss.Index, kind: str, config: AgentConfig | None = None, **overrides: int) -> None:
+    config = config or agent_config
+    space = faiss.ParameterSpace()
+    if kind == "hnsw":
+        space.set_index_parameter(index, "efSearch", overrides.get("efSearch", config.legal_ef_search))
+    elif kind in {"ivf_flat", "ivf_pq"}:
+        space.set_index_parameter(index, "nprobe", overrides.get("nprobe", config.legal_nprobe))
+
+
+def _query_sample(vectors: np.ndarray, queries: int) -> np.ndarray:
+    rows = np.random.default_rng(0).choice(len(vectors), size=min(queries, len(vectors)), replace=False)
+    return np.ascontiguousarray(vectors[np.sort(rows)], dtype="float32")
+
+
+def _exact_ids(vectors: np.ndarray, ids: np.ndarray, sample: np.ndarray, k: int) -> np.ndarray:
+    # Точный перебор блоками по самим векторам: копия корпуса в IndexFlatIP
+    # удвоила бы память на больших индексах.
+    _, rows = faiss.knn(sample, np.ascontiguousarray(vectors, dtype="float32"), k, metric=faiss.METRIC_INNER_PRODUCT)
+    return ids[rows]
+
+
+def benchmark(
+    index: faiss.Index,
+    vectors: np.ndarray,
+    ids: np.ndarray,
+    kind: str,
+    *,
+    k: int = 10,
+    queries: int = 200,
+    config: AgentConfig | None = None,
+) -> Dict[str, Any]:
+    """Recall@k against exact search and mean latency for several search settings.
+
+    Stored vectors serve as queries; the index is left with the configured settings.
+    """
+
+    config = config or agent_config
+    if not len(vectors):
+        return {"type": kind, "vectors": 0, "runs": []}
+    sample = _query_sample(vectors, queries)
+    k = min(k, len(vectors))
+    truth_ids = _exact_ids(vectors, ids, sample, k)
+
+    if kind == "hnsw":
+        settings: List[Dict[str, int]] = [{"efSearch": value} for value in (16, 32, 64, 128, 256)]
+    elif kind in {"ivf_flat", "ivf_pq"}:
+        settings = [{"nprobe": value} for value in (1, 4, 16, 64, 128)]
+    else:
+        settings = [{}]
+
+    runs = []
+    for params in settings:
+        apply_search_params(index, kind, config, **params)
+        start = time.perf_counter()
+        _, found = index.search(sample, k)
+        latency_ms = (time.perf_counter() - start) * 1000 / len(sample)
+        hits = sum(len(set(row_found) & set(row_truth)) for row_found, row_truth in zip(found, truth_ids))
+        runs.append({**params, "recall": round(hits / (len(sample) * k), 4), "latency_ms": round(latency_ms, 4)})
+    apply_search_params(index, kind, config)
+    return {"type": kind, "vectors": int(len(vectors)), "k": k, "queries": int(len(sample)), "runs": runs}
+
+
+EVAL_VARIANTS = (
+    {"legal_compression": "none", "legal_reduce": "none"},
+    {"legal_compression": "sq8", "legal_reduce": "none"},
+    {"legal_compression": "pq", "legal_reduce": "none"},
+    {"legal_compression": "none", "legal_reduce": "pca"},
+    {"legal_compression": "none", "legal_reduce": "matryoshka"},
+    {"legal_compression": "sq8", "legal_reduce": "pca"},
+)
+
+
+def evaluate_compression(
+    vectors: np.ndarray,
+    ids: np.ndarray,
+    kind: str,
+    *,
+    k: int = 10,
+    queries: int = 200,
+    rerank_factor: int = 4,
+    config: AgentConfig | None = None,
+) -> Dict[str, Any]:
+    """Recall@k of compressed variants against exact float search, with and without re-ranking.
+
+    Stored vectors serve as queries, as in :func:`benchmark`. Variants that the
+    corpus is too small to train are listed in ``skipped``.
+    """
+
+    config = config or agent_config
+    if not len(vectors):
+        return {"type": kind, "vectors": 0, "variants": []}
+    sample = _query_sample(vectors, queries)
+    k = min(k, len(vectors))
+    truth_ids = [set(row) for row in _exact_ids(vectors, ids, sample, k)]
+    fetch = min(len(vectors), k * max(1, rerank_factor))
+
+    variants = []
+    skipped: List[str] = []
+    seen: set[str] = set()
+    for overrides in EVAL_VARIANTS:
+        variant = dataclasses.replace(config, **overrides)
+        # Спецификация — то, что реально строится: HNSW+PQ совпадает с HNSW+SQ8 и не дублируется.
+        spec = codec_spec(vectors.shape[1], kind, variant, count=len(vectors))
+        if spec != codec_spec(vectors.shape[1], kind, variant):
+            # На маленьком корпусе PQ или PCA не обучить: вариант совпал бы с несжатым.
+            skipped.append(codec_spec(vectors.shape[1], kind, variant))
+            continue
+        if spec in seen:
+            continue
+        seen.add(spec)
+        index = build_index(vectors, ids, kind, variant)
+        apply_search_params(index, kind, variant)
+        start = time.perf_counter()
+        _, found = index.search(sample, fetch)
+        latency_ms = (time.perf_counter() - start) * 1000 / len(sample)
+        plain = sum(len(set(row[:k]) & expected) for row, expected in zip(found, truth_ids))
+        reranked = sum(
+            len({chunk_id for chunk_id, _ in rerank(vectors, ids, query, row, k)} & expected)
+            for query, row, expected in zip(sample, found, truth_ids)
+        )
+        total = len(sample) * k
+        variants.append(
+            {
+                "codec": spec,
+                "bytes": int(faiss.serialize_index(index).nbytes),
+                "recall": round(plain / total, 4),
+                "recall_rerank": round(reranked / total, 4),
+                "latency_ms": round(latency_ms, 4),
+            }
+        )
+    return {
+        "type": kind,
+        "vectors": int(len(vectors)),
+        "k": k,
+        "rerank_fetch": fetch,
+        "variants": variants,
+        "skipped": skipped,
+    }
@@ -0,0 +1,17 @@
+from __future__ import annotations
+
+from langchain_core.prompts import ChatPromptTemplate
+
+
+direct_answer_prompt = ChatPromptTemplate.from_messages(
+    [
+        (
+            "system",
+            (
+                "Ты — ИИ-помощник предпринимателя малого бизнеса. Инструменты для этого "
+                "запроса не нужны: ответь сам, кратко и по делу, по-русски."
+            ),
+        ),
+        ("human", "История диалога:\n{history}\nВопрос: {query}"),
+    ]
+)
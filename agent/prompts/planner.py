@@ -1,41 +1,97 @@
 from __future__ import annotations
 
+from typing import Sequence
+
 from langchain_core.prompts import ChatPromptTemplate
 
 
-planner_prompt = ChatPromptTemplate.from_messages(
-    [
-        (
-            "system",
-            (
-                "Ты — главный оркестратор ИИ-агента. Твоя задача — декомпозировать "
-                "пользовательский запрос предпринимателя на пошаговый план. "
-                "Используй только перечисленные инструменты.\n\n"
-                "КРИТИЧЕСКИ ВАЖНО: ответ ДОЛЖЕН быть ТОЛЬКО валидным JSON-массивом. "
-                "Не добавляй комментарии, текст до/после или Markdown-разметку.\n"
-                "Формат: [{{\"step\":1,\"tool\":\"название\",\"action\":\"что сделать\",\"params\":{{...}}}}]\n\n"
-                "Примеры:\n"
-                "1) Юридический запрос:\n"
-                "[{{\"step\":1,\"tool\":\"legal_retriever\",\"action\":\"найти пункты договора аренды\",\"params\":{{\"query\":\"условия расторжения\",\"k\":3}}}}]\n"
-                "2) Финансовый анализ:\n"
-                "[{{\"step\":1,\"tool\":\"document_loader\",\"action\":\"загрузить файлы\",\"params\":{{}}}},"
-                "{{\"step\":2,\"tool\":\"financial_analyzer\",\"action\":\"проанализировать продажи\",\"params\":{{}}}}]\n\n"
-                "Если инструмент не требуется, не включай его. План должен быть реалистичным, "
-                "с указанием ввода для каждого шага. Если запрос касается договоров, юридических "
-                "рисков или нужно сверить условия документов — обязательно включай использование "
-                "legal_retriever (он ищет по заранее проиндексированным договорам, команда index-documents)."
-            ),
-        ),
-        (
-            "human",
-            (
-                "Запрос пользователя: {query}\n"
-                "Описание доступных инструментов:\n{tool_descriptions}\n"
-                "Доступные файлы: {files}\n"
-                "Если информации недостаточно, запланируй шаги для получения контекста."
-            ),
-        ),
-    ]
+_PLANNER_HEADER = (
+    "Ты — главный оркестратор ИИ-агента. Твоя задача — декомпозировать "
+    "пользовательский запрос предпринимателя на пошаговый план. "
+    "Используй только перечисленные инструменты.\n\n"
+    "КРИТИЧЕСКИ ВАЖНО: ответ ДОЛЖЕН быть ТОЛЬКО валидным JSON-массивом. "
+    "Не добавляй комментарии, текст до/после или Markdown-разметку.\n"
+    "Формат: [{{\"step\":1,\"tool\":\"название\",\"action\":\"что сделать\",\"params\":{{...}},\"depends_on\":[...]}}]\n"
+    "Поле depends_on — номера шагов, результаты которых нужны этому шагу. "
+    "Независимые шаги помечай \"depends_on\":[] — они выполняются параллельно. "
+    "Без depends_on шаг ждёт все предыдущие.\n\n"
+)
+
+# (инструменты, которые должны быть доступны; заголовок; JSON примера)
+_PLANNER_EXAMPLES: tuple[tuple[frozenset[str], str, str], ...] = (
+    (
+        frozenset({"legal_retriever"}),
+        "Юридический запрос",
+        "[{{\"step\":1,\"tool\":\"legal_retriever\",\"action\":\"найти пункты договора аренды\",\"params\":{{\"query\":\"условия расторжения\",\"k\":3}}}}]",
+    ),
+    (
+        frozenset({"document_loader", "financial_analyzer"}),
+        "Финансовый анализ",
+        "[{{\"step\":1,\"tool\":\"document_loader\",\"action\":\"загрузить файлы\",\"params\":{{}},\"depends_on\":[]}},"
+        "{{\"step\":2,\"tool\":\"financial_analyzer\",\"action\":\"проанализировать продажи\",\"params\":{{}},\"depends_on\":[]}}]",
+    ),
+    (
+        frozenset({"financial_analyzer"}),
+        "Финансовый анализ",
+        "[{{\"step\":1,\"tool\":\"financial_analyzer\",\"action\":\"проанализировать продажи\",\"params\":{{}}}}]",
+    ),
+    (
+        frozenset({"marketing_generator"}),
+        "Маркетинг",
+        "[{{\"step\":1,\"tool\":\"marketing_generator\",\"action\":\"придумать акцию\",\"params\":{{\"mode\":\"promotion\",\"goal\":\"больше гостей в будни\"}}}}]",
+    ),
+)
+
+_PLANNER_RULES = (
+    "Если инструмент не требуется, не включай его. Если инструменты не нужны вовсе "
+    "(приветствие, общий вопрос без данных пользователя) — верни пустой массив []. "
+    "План должен быть реалистичным, "
+    "с указанием ввода для каждого шага."
+)
+
+_LEGAL_RULE = (
+    " Если запрос касается договоров, юридических "
+    "рисков или нужно сверить условия документов — обязательно включай использование "
+    "legal_retriever (он ищет по заранее проиндексированным договорам, команда index-documents)."
+)
+
+_PLANNER_HUMAN = (
+    "История диалога:\n{history}\n"
+    "Запрос пользователя: {query}\n"
+    "Описание доступных инструментов:\n{tool_descriptions}\n"
+    "Доступные файлы: {files}\n"
+    "Если информации недостаточно, запланируй шаги для получения контекста."
 )
 
 
+def build_planner_prompt(tools: Sequence[str], *, focus: str = "", max_steps: int | None = None) -> ChatPromptTemplate:
+    """Planner prompt restricted to ``tools``: examples and rules for other tools are left out."""
+
+    available = set(tools)
+    examples: list[str] = []
+    covered: set[frozenset[str]] = set()
+    for required, title, example in _PLANNER_EXAMPLES:
+        if not required <= available or any(required < seen for seen in covered):
+            continue
+        covered.add(required)
+        examples.append(f"{len(examples) + 1}) {title}:\n{example}\n")
+
+    system = _PLANNER_HEADER
+    if focus:
+        system = system.replace(
+            "Используй только перечисленные инструменты.",
+            f"Специализация: {focus}. Используй только перечисленные инструменты.",
+        )
+    if examples:
+        system += "Примеры:\n" + "".join(examples) + "\n"
+    system += _PLANNER_RULES
+    if max_steps:
+        system += f" Не более {max_steps} шагов."
+    if "legal_retriever" in available:
+        system += _LEGAL_RULE
+    return ChatPromptTemplate.from_messages([("system", system), ("human", _PLANNER_HUMAN)])
+
+
+planner_prompt = build_planner_prompt(
+    ("financial_analyzer", "legal_retriever", "marketing_generator", "document_loader")
+)
@@ -0,0 +1,33 @@
+from __future__ import annotations
+
+from langchain_core.prompts import ChatPromptTemplate
+
+
+chunk_summary_prompt = ChatPromptTemplate.from_messages(
+    [
+        (
+            "system",
+            (
+                "Ты сжимаешь фрагмент большого документа для дальнейшего анализа. "
+                "Сохрани все факты, цифры, даты, суммы, стороны, обязательства и сроки. "
+                "Не добавляй выводов и того, чего нет в тексте. Пиши по-русски, списком."
+            ),
+        ),
+        ("human", "Документ: {title}\nФрагмент {index} из {total}:\n{chunk}"),
+    ]
+)
+
+
+reduce_prompt = ChatPromptTemplate.from_messages(
+    [
+        (
+            "system",
+            (
+                "Ты объединяешь конспекты частей одного документа в единую выжимку. "
+                "Убери повторы, сохрани цифры, даты, условия и обязательства сторон. "
+                "Сохраняй порядок разделов документа."
+            ),
+        ),
+        ("human", "Документ: {title}\nКонспекты частей:\n{summaries}"),
+    ]
+)
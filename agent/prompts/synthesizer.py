@@ -17,6 +17,7 @@ synthesizer_prompt = ChatPromptTemplate.from_messages(
         (
             "human",
             (
+                "История диалога:\n{history}\n"
                 "Запрос: {query}\n"
                 "План: {plan}\n"
                 "Результаты инструментов: {tool_results}\n"
@@ -0,0 +1,21 @@
+from __future__ import annotations
+
+import pytest
+
+from agent.config import agent_config
+
+
+@pytest.fixture
+def legal_config(monkeypatch, tmp_path):
+    """Small, deterministic legal index settings; files are parsed in-process."""
+
+    monkeypatch.setattr(agent_config, "cpu_pool_enabled", False)
+    monkeypatch.setattr(agent_config, "embed_cache_enabled", False)
+    monkeypatch.setattr(agent_config, "legal_index_type", "flat")
+    monkeypatch.setattr(agent_config, "legal_compression", "none")
+    monkeypatch.setattr(agent_config, "legal_reduce", "none")
+    monkeypatch.setattr(agent_config, "legal_chunk_tokens", 40)
+    monkeypatch.setattr(agent_config, "legal_chunk_overlap", 0)
+    monkeypatch.setattr(agent_config, "legal_versions_kept", 2)
+    monkeypatch.setattr(agent_config, "legal_reload_interval", 0.0)
+    return agent_config
@@ -0,0 +1,34 @@
+from __future__ import annotations
+
+import pytest
+
+from agent.core.chunking import clause_label, split_clauses, split_sentences
+
+
+@pytest.mark.parametrize(
+    ("text", "expected"),
+    [
+        (
+            "Договор действует до 2024. Стороны вправе продлить его.",
+            ["Договор действует до 2024.", "Стороны вправе продлить его."],
+        ),
+        (
+            "Договор расторгается по ст. 450. После этого стороны свободны.",
+            ["Договор расторгается по ст. 450.", "После этого стороны свободны."],
+        ),
+        ("2.3. Арендатор обязан платить.", ["2.3. Арендатор обязан платить."]),
+        ("См. пункт 4.1 договора.", ["См.", "пункт 4.1 договора."]),
+    ],
+)
+def test_split_sentences_after_numbers(text, expected):
+    assert split_sentences(text) == expected
+
+
+def test_clause_headers_need_capitalised_text():
+    text = "1. Предмет договора\nАренда помещения.\n100 рублей в месяц\n2. Цена\nСумма платежа."
+
+    assert clause_label(text) == "1. Предмет договора"
+    assert split_clauses(text, max_tokens=20) == [
+        "1. Предмет договора\nАренда помещения.\n100 рублей в месяц",
+        "2. Цена\nСумма платежа.",
+    ]
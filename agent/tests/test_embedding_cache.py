@@ -0,0 +1,57 @@
+from __future__ import annotations
+
+import dataclasses
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from agent.config import agent_config  # noqa: E402
+from agent.core.embedding_cache import EmbeddingCache, text_key  # noqa: E402
+
+
+@pytest.fixture
+def config(tmp_path):
+    return dataclasses.replace(
+        agent_config, embed_cache_enabled=True, embed_cache_dir=tmp_path, embed_cache_memory_items=1
+    )
+
+
+def test_round_trip_through_disk(config):
+    vectors = np.arange(12, dtype="float32").reshape(3, 4)
+    cache = EmbeddingCache("test/model", config)
+    cache.put_many(["первый", "второй", "третий"], vectors)
+    cache.close()
+
+    reopened = EmbeddingCache("test/model", config)
+    found = reopened.get_many(["второй", "нет такого", "первый"])
+
+    np.testing.assert_array_equal(found[0], vectors[1])
+    assert found[1] is None
+    np.testing.assert_array_equal(found[2], vectors[0])
+    stats = reopened.stats()
+    assert stats["disk_hits"] == 2
+    assert stats["stored_rows"] == 3
+    reopened.close()
+
+
+def test_keys_ignore_whitespace_and_duplicates_are_stored_once(config):
+    cache = EmbeddingCache("test/model", config)
+    cache.put_many(["срок  аренды"], np.ones((1, 2), dtype="float32"))
+    cache.put_many([" срок аренды "], np.zeros((1, 2), dtype="float32"))
+
+    assert text_key("срок  аренды") == text_key(" срок аренды ")
+    assert cache.stats()["stored_rows"] == 1
+    cache.close()
+
+
+def test_dimension_mismatch_is_not_stored(config):
+    cache = EmbeddingCache("test/model", config)
+    cache.put_many(["а"], np.ones((1, 4), dtype="float32"))
+    cache.put_many(["б"], np.ones((1, 3), dtype="float32"))
+    cache.close()
+
+    reopened = EmbeddingCache("test/model", config)
+    assert reopened.get_many(["б"]) == [None]
+    assert reopened.stats()["stored_rows"] == 1
+    reopened.close()
@@ -0,0 +1,229 @@
+from __future__ import annotations
+
+import dataclasses
+import zlib
+from pathlib import Path
+
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("faiss")
+# Цепочка импортов legal_rag: провайдер эмбеддингов и загрузчик документов.
+pytest.importorskip("sentence_transformers")
+pytest.importorskip("pandas")
+pytest.importorskip("docx")
+pytest.importorskip("pypdf")
+
+import faiss  # noqa: E402
+
+from agent.config import agent_config  # noqa: E402
+from agent.core.bm25 import tokenize  # noqa: E402
+from agent.core.tool_cache import tool_cache  # noqa: E402
+from agent.core.vector_index import build_index  # noqa: E402
+from agent.tools.legal_rag import IndexHandle, LegalIndexPool, LegalRAGTool, read_index  # noqa: E402
+
+
+class HashEmbedder:
+    """Bag-of-words vectors: texts sharing words are close, no model needed."""
+
+    dim = 64
+
+    def embed_documents(self, texts):
+        rows = []
+        for text in texts:
+            vector = np.zeros(self.dim, dtype="float32")
+            for token in tokenize(text):
+                vector[zlib.crc32(token.encode("utf-8")) % self.dim] += 1.0
+            norm = np.linalg.norm(vector)
+            rows.append((vector / norm if norm else vector).tolist())
+        return rows
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+@pytest.fixture
+def tool(legal_config, monkeypatch, tmp_path):
+    monkeypatch.setattr(tool_cache, "directory", tmp_path / "tool-cache")
+    return LegalRAGTool(storage_dir=tmp_path / "legal", embedder=HashEmbedder())
+
+
+@pytest.fixture
+def corpus(tmp_path):
+    directory = tmp_path / "docs"
+    directory.mkdir()
+    (directory / "rent.txt").write_text(
+        "1. Предмет договора\nАрендодатель передаёт помещение в аренду.\n"
+        "2. Расторжение\nДоговор аренды расторгается с уведомлением за месяц.",
+        encoding="utf-8",
+    )
+    (directory / "supply.txt").write_text(
+        "1. Поставка\nПоставщик передаёт товар.\n2. Неустойка\nЗа просрочку поставки взыскивается неустойка.",
+        encoding="utf-8",
+    )
+    return directory
+
+
+def _paths(results):
+    return [item["path"].rsplit("/", 1)[-1] for item in results]
+
+
+def _rss_mb() -> int:
+    return int(Path("/proc/self/status").read_text().split("VmRSS:")[1].split()[0]) // 1024
+
+
+@pytest.mark.parametrize("kind", ["flat", "hnsw", "ivf_flat"])
+def test_mapped_index_answers_like_loaded_one(kind, tmp_path):
+    rng = np.random.default_rng(0)
+    vectors = rng.random((2000, 32), dtype="float32")
+    faiss.normalize_L2(vectors)
+    config = dataclasses.replace(agent_config, legal_compression="none", legal_reduce="none")
+    path = tmp_path / "legal.index"
+    faiss.write_index(build_index(vectors, np.arange(2000, dtype="int64") + 7, kind, config), str(path))
+
+    mapped = read_index(path, kind, mmap=True)
+    loaded = read_index(path, kind, mmap=False)
+
+    np.testing.assert_array_equal(mapped.search(vectors[:5], 3)[1], loaded.search(vectors[:5], 3)[1])
+
+
+@pytest.mark.skipif(not Path("/proc/self/status").exists(), reason="RSS читается из /proc")
+def test_flat_index_codes_stay_on_disk(tmp_path):
+    vectors = np.random.default_rng(0).random((60000, 256), dtype="float32")
+    path = tmp_path / "legal.index"
+    index = faiss.IndexIDMap2(faiss.IndexFlatIP(256))
+    index.add_with_ids(vectors, np.arange(len(vectors), dtype="int64"))
+    faiss.write_index(index, str(path))
+    del index, vectors
+
+    before = _rss_mb()
+    mapped = read_index(path, "flat", mmap=True)
+
+    # Файл около 60 МБ; при чтении в память RSS вырос бы на весь размер.
+    assert _rss_mb() - before < 20
+    assert mapped.ntotal == 60000
+
+
+def test_fuse_ranks_by_reciprocal_rank(legal_config, monkeypatch):
+    monkeypatch.setattr(legal_config, "legal_rrf_k", 60)
+
+    fused = LegalRAGTool._fuse([(1, 0.9), (2, 0.8)], [(2, 5.0), (3, 4.0)])
+
+    assert [chunk_id for chunk_id, _ in fused] == [2, 1, 3]
+    assert fused[0][1] == pytest.approx(1 / 62 + 1 / 61)
+    assert fused[1][1] == pytest.approx(1 / 61)
+
+
+def test_retired_handle_closes_after_last_search(tool):
+    handle = IndexHandle(version="v1", directory=tool.versions_dir / "v1", index=object(), index_type="flat", codec="none")
+    tool._handle = handle
+    first = tool._acquire()
+    second = tool._acquire()
+
+    tool.retire()
+    tool._release(first)
+    assert handle.index is not None
+    tool._release(second)
+    assert handle.index is None
+    assert handle.refs == 0
+
+
+def test_search_without_index_explains_how_to_build_it(tool):
+    with pytest.raises(RuntimeError, match="index-documents"):
+        tool.search("аренда")
+
+
+def test_incremental_add_update_remove(tool, corpus):
+    report = tool.index_documents(corpus)
+    assert (report.added, report.updated, report.removed) == (2, 0, 0)
+    assert _paths(tool.search("неустойка за просрочку поставки", k=1)) == ["supply.txt"]
+
+    report = tool.index_documents(corpus)
+    assert (report.added, report.updated, report.removed, report.unchanged) == (0, 0, 0, 2)
+    assert report.embedded_chunks == 0
+
+    (corpus / "supply.txt").write_text("1. Поставка\nШтраф за недопоставку товара.", encoding="utf-8")
+    report = tool.index_documents(corpus)
+    assert (report.added, report.updated) == (0, 1)
+    hits = tool.search("штраф за недопоставку", k=1)
+    assert _paths(hits) == ["supply.txt"]
+    assert "Штраф" in hits[0]["text"]
+
+    (corpus / "rent.txt").unlink()
+    report = tool.index_documents(corpus)
+    assert report.removed == 1
+    assert _paths(tool.search("договор аренды расторгается", k=3)) == ["supply.txt"]
+
+
+def test_rebuild_keeps_ids_unique(tool, corpus):
+    tool.index_documents(corpus)
+    first = set(tool._vector_ids.tolist())
+
+    report = tool.index_documents(corpus, rebuild=True)
+
+    assert report.added == 2
+    assert first.isdisjoint(tool._vector_ids.tolist())
+    assert _paths(tool.search("помещение в аренду", k=1)) == ["rent.txt"]
+
+
+def test_old_version_keeps_its_chunks_after_reindex(tool, corpus):
+    tool.index_documents(corpus)
+    old = tool._acquire()
+    try:
+        (corpus / "rent.txt").write_text("1. Аренда\nАрендная плата вносится ежемесячно.", encoding="utf-8")
+        tool.index_documents(corpus, rebuild=True)
+
+        stale = tool._search(old, "договор аренды расторгается", 1, None)
+        assert "расторгается" in stale[0]["text"]
+    finally:
+        tool._release(old)
+
+    fresh = tool.search("договор аренды расторгается", k=2)
+    assert all("расторгается" not in item["text"] for item in fresh)
+
+
+def test_broken_version_keeps_previous_handle(tool, corpus):
+    tool.index_documents(corpus)
+    tool.search("аренда")
+    previous = tool._handle.version
+
+    (tool.versions_dir / "broken").mkdir()
+    tool._publish("broken")
+
+    assert _paths(tool.search("помещение в аренду", k=1)) == ["rent.txt"]
+    assert tool._handle.version == previous
+
+
+class WideEmbedder(HashEmbedder):
+    dim = 4096
+
+
+def test_shards_over_memory_cap_are_evicted_when_they_open(legal_config, monkeypatch, tmp_path):
+    monkeypatch.setattr(tool_cache, "directory", tmp_path / "tool-cache")
+    monkeypatch.setattr(legal_config, "legal_hybrid", False)
+    monkeypatch.setattr(legal_config, "legal_max_shards", 8)
+    monkeypatch.setattr(legal_config, "legal_shards_memory_mb", 1)
+    docs = tmp_path / "docs"
+    docs.mkdir()
+    (docs / "contract.txt").write_text(
+        "\n".join(f"{n}. Пункт {n}\nСторона обязуется выполнить условие {n} в срок." for n in range(1, 81)),
+        encoding="utf-8",
+    )
+    default = LegalRAGTool(storage_dir=tmp_path / "legal", embedder=WideEmbedder())
+    builder = LegalIndexPool(default)
+    for org in ("a", "b", "c"):
+        builder.get(org, create=True).index_documents(docs)
+
+    # Новый пул, как у только что запущенного backend: ни один индекс ещё не открыт.
+    pool = LegalIndexPool(LegalRAGTool(storage_dir=tmp_path / "legal", embedder=WideEmbedder()))
+    pool.get("a").search("условие 5")
+    first = pool.resident()["a"]
+    assert 512 * 1024 < first < 1024 * 1024
+
+    shard = pool.get("b")
+    assert set(pool.resident()) == {"a", "b"}
+    shard.search("условие 5")
+
+    assert set(pool.resident()) == {"b"}
+    pool.get("c").search("условие 7")
+    assert set(pool.resident()) == {"c"}
@@ -0,0 +1,57 @@
+from __future__ import annotations
+
+import pytest
+
+from agent.tools.legal_store import LegalMetaStore
+
+ENTRY = {"mtime_ns": 1, "size": 1, "sha256": "0", "metadata": {}}
+
+
+def _chunk(text: str, position: int = 0) -> dict:
+    return {"position": position, "clause": "", "text": text}
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = LegalMetaStore(tmp_path / "legal.meta.sqlite")
+    yield store
+    store.close()
+
+
+def test_readers_keep_rows_of_their_generation(store):
+    with store.transaction() as conn:
+        store.put_document(conn, "a.txt", ENTRY, [(1, _chunk("неустойка за просрочку оплаты"))], 1)
+    with store.transaction() as conn:
+        store.remove_document(conn, "a.txt", 2)
+        store.put_document(conn, "a.txt", ENTRY, [(2, _chunk("штраф за просрочку поставки"))], 2)
+
+    assert set(store.chunks([1, 2], 1)) == {1}
+    assert set(store.chunks([1, 2], 2)) == {2}
+    assert [chunk_id for chunk_id, _ in store.sparse_search("неустойка", 5, 1)] == [1]
+    assert store.sparse_search("неустойка", 5, 2) == []
+    assert store.chunk_count() == 1
+
+
+def test_clear_keeps_old_generation_until_collected(store):
+    with store.transaction() as conn:
+        store.put_document(conn, "a.txt", ENTRY, [(1, _chunk("аренда помещения"))], 1)
+    with store.transaction() as conn:
+        store.clear(conn, 2)
+
+    assert store.document_count() == 0
+    assert set(store.chunks([1], 1)) == {1}
+    assert store.chunks([1], 2) == {}
+
+    with store.transaction() as conn:
+        assert store.collect(conn, 1) == 0
+        assert store.collect(conn, 2) == 1
+    assert store.chunks([1], 1) == {}
+    assert store.sparse_search("аренда", 5, 1) == []
+
+
+def test_chunk_ids_lists_only_live_rows(store):
+    with store.transaction() as conn:
+        store.put_document(conn, "a.txt", ENTRY, [(1, _chunk("первый")), (2, _chunk("второй", 1))], 1)
+        store.remove_document(conn, "a.txt", 2)
+        store.put_document(conn, "a.txt", ENTRY, [(3, _chunk("третий"))], 2)
+        assert store.chunk_ids(conn, "a.txt") == [3]
@@ -0,0 +1,71 @@
+from __future__ import annotations
+
+import dataclasses
+import os
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+
+from agent.config import agent_config
+from agent.core.process_pool import CpuPool
+
+
+def _pid() -> int:
+    return os.getpid()
+
+
+def _fail(message: str) -> None:
+    raise ValueError(message)
+
+
+def _crash() -> None:
+    os._exit(1)
+
+
+@pytest.fixture
+def pool():
+    config = dataclasses.replace(agent_config, cpu_pool_enabled=True, cpu_pool_workers=1)
+    pool = CpuPool(config, preload=())
+    yield pool
+    pool.shutdown()
+
+
+def test_disabled_pool_runs_inline():
+    pool = CpuPool(dataclasses.replace(agent_config, cpu_pool_enabled=False))
+
+    assert pool.submit(_pid).result() == os.getpid()
+    with pytest.raises(ValueError, match="inline"):
+        pool.submit(_fail, "inline").result()
+
+
+def test_results_and_errors_come_from_the_worker(pool):
+    assert pool.submit(_pid).result(timeout=60) != os.getpid()
+    with pytest.raises(ValueError, match="в воркере"):
+        pool.submit(_fail, "в воркере").result(timeout=60)
+
+
+def test_broken_pool_is_replaced(pool):
+    with pytest.raises(BrokenProcessPool):
+        pool.submit(_crash).result(timeout=60)
+
+    assert pool.submit(_pid).result(timeout=60) != os.getpid()
+
+
+def test_pooled_loader_keeps_page_limit(pool, monkeypatch, tmp_path):
+    pypdf = pytest.importorskip("pypdf")
+    pytest.importorskip("pandas")
+    pytest.importorskip("docx")
+    from agent.tools import document_loader as module
+
+    writer = pypdf.PdfWriter()
+    for _ in range(3):
+        writer.add_blank_page(width=100, height=100)
+    path = tmp_path / "doc.pdf"
+    with path.open("wb") as f:
+        writer.write(f)
+    monkeypatch.setattr(module, "cpu_pool", pool)
+
+    [doc] = module.DocumentLoader(max_pages=1).load_many([path])
+
+    assert doc["metadata"]["pages"] == 1
+    assert doc["metadata"]["total_pages"] == 3
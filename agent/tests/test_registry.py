@@ -0,0 +1,37 @@
+from __future__ import annotations
+
+import dataclasses
+
+import pytest
+
+pytest.importorskip("llama_cpp")
+
+from agent.config import agent_config  # noqa: E402
+from agent.tools.registry import ToolAdapter, ToolRegistry  # noqa: E402
+
+
+def _adapter(name: str) -> ToolAdapter:
+    return ToolAdapter(name=name, description="", handler=lambda call: ("", None), max_concurrency=1, timeout_s=5)
+
+
+def test_config_limits_override_adapter_defaults():
+    config = dataclasses.replace(agent_config, tool_timeouts={"known": 42}, tool_concurrency={"known": 3})
+    registry = ToolRegistry(config)
+
+    known = registry.register(_adapter("known"))
+    plugin = registry.register(_adapter("plugin"))
+
+    assert (known.timeout_s, known.max_concurrency) == (42, 3)
+    assert (plugin.timeout_s, plugin.max_concurrency) == (5, 1)
+
+
+def test_builtin_tools_take_limits_from_config():
+    from agent.tools.builtin import tool_registry
+
+    for name in ("financial_analyzer", "legal_retriever", "marketing_generator", "document_loader"):
+        adapter = tool_registry.get(name)
+        assert adapter.timeout_s == agent_config.tool_timeouts[name]
+        assert adapter.max_concurrency == agent_config.tool_concurrency[name]
+    # Выжимки документов идут через модель-исполнитель.
+    assert tool_registry.get("document_loader").slot == "executor"
+    assert tool_registry.get("legal_retriever").slot is None
@@ -0,0 +1,70 @@
+from __future__ import annotations
+
+import dataclasses
+import threading
+
+import pytest
+
+pytest.importorskip("sentence_transformers")
+pytest.importorskip("pandas")
+pytest.importorskip("docx")
+pytest.importorskip("pypdf")
+
+from agent.config import agent_config  # noqa: E402
+from agent.core.speculation import Speculator  # noqa: E402
+
+
+class SlowLoader:
+    def __init__(self) -> None:
+        self.calls = 0
+        self.started = threading.Event()
+        self.release = threading.Event()
+
+    def load_many(self, files):
+        self.calls += 1
+        self.started.set()
+        self.release.wait(5)
+        return [{"path": path, "text": "текст"} for path in files]
+
+
+class NoEmbedder:
+    def embed_query(self, text):
+        return [0.0]
+
+
+def _speculator(loader, workers=1):
+    config = dataclasses.replace(agent_config, speculation_enabled=True, speculation_workers=workers)
+    return Speculator(config, loader=loader, embedder=NoEmbedder())
+
+
+def test_running_parse_is_awaited_not_repeated(monkeypatch):
+    monkeypatch.setattr("agent.core.speculation.agent_logger.log_event", lambda *args, **kwargs: None)
+    loader = SlowLoader()
+    speculator = _speculator(loader)
+    state = {"run_id": "r1", "files": ["a.txt"], "query": ""}
+    speculator.start(state)
+    assert loader.started.wait(5)
+
+    threading.Timer(0.3, loader.release.set).start()
+    docs = speculator.documents(state, ["a.txt"], timeout=5)
+
+    assert docs == [{"path": "a.txt", "text": "текст"}]
+    assert loader.calls == 1
+
+
+def test_queued_parse_is_cancelled_and_other_files_are_ignored(monkeypatch):
+    monkeypatch.setattr("agent.core.speculation.agent_logger.log_event", lambda *args, **kwargs: None)
+    loader = SlowLoader()
+    speculator = _speculator(loader)
+    first = {"run_id": "r1", "files": ["a.txt"], "query": ""}
+    second = {"run_id": "r2", "files": ["b.txt"], "query": ""}
+    speculator.start(first)
+    speculator.start(second)
+    assert loader.started.wait(5)
+
+    assert speculator.documents(first, ["other.txt"]) is None
+    assert speculator.documents(second, ["b.txt"]) is None
+    loader.release.set()
+    speculator.discard("r1")
+    speculator.discard("r2")
+    assert loader.calls == 1
@@ -0,0 +1,48 @@
+from __future__ import annotations
+
+import dataclasses
+import json
+import threading
+
+import pytest
+
+from agent.config import agent_config
+from agent.core.tool_cache import ToolResultCache
+
+
+@pytest.fixture
+def cache(tmp_path):
+    config = dataclasses.replace(
+        agent_config, tool_cache_enabled=True, tool_cache_dir=tmp_path, tool_cache_ttls={"tool": 60}
+    )
+    return ToolResultCache(config)
+
+
+def test_concurrent_puts_of_one_key_leave_a_valid_record(cache, tmp_path):
+    key = cache.make_key("tool", {"query": "q"})
+    start = threading.Barrier(8)
+
+    def write(n: int) -> None:
+        start.wait()
+        for _ in range(20):
+            cache.put("tool", key, {"result_text": str(n) * 1000})
+
+    threads = [threading.Thread(target=write, args=(n,)) for n in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    record = json.loads((tmp_path / "tool" / f"{key}.json").read_text(encoding="utf-8"))
+    assert len(set(record["value"]["result_text"])) == 1
+    assert not list((tmp_path / "tool").glob("*.tmp"))
+
+
+def test_key_depends_on_file_contents(cache, tmp_path):
+    doc = tmp_path / "doc.txt"
+    doc.write_text("раз", encoding="utf-8")
+    first = cache.make_key("tool", {}, [str(doc)])
+    doc.write_text("два", encoding="utf-8")
+
+    assert cache.make_key("tool", {}, [str(doc)]) != first
+    assert cache.make_key("untracked", {}, [str(doc)]) is None
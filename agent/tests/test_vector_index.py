@@ -0,0 +1,87 @@
+from __future__ import annotations
+
+import dataclasses
+
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("faiss")
+
+from agent.config import agent_config  # noqa: E402
+from agent.core.vector_index import build_index, codec_spec, evaluate_compression, rerank  # noqa: E402
+
+
+def _unit(rows: np.ndarray) -> np.ndarray:
+    return (rows / np.linalg.norm(rows, axis=1, keepdims=True)).astype("float32")
+
+
+def test_rerank_maps_candidates_to_their_rows():
+    vectors = _unit(np.eye(4, dtype="float32") + 0.01)
+    ids = np.array([10, 20, 30, 40], dtype="int64")
+
+    result = rerank(vectors, ids, vectors[2], [40, -1, 30, 99, 5], k=2)
+
+    assert [chunk_id for chunk_id, _ in result] == [30, 40]
+    assert result[0][1] == pytest.approx(1.0, abs=1e-5)
+
+
+def test_rerank_ignores_unknown_candidates():
+    vectors = _unit(np.ones((2, 3), dtype="float32"))
+    ids = np.array([1, 2], dtype="int64")
+
+    assert rerank(vectors, ids, vectors[0], [-1, 3, 7], k=5) == []
+
+
+def test_flat_index_removes_ids_in_place(monkeypatch):
+    from agent.config import agent_config
+
+    monkeypatch.setattr(agent_config, "legal_compression", "none")
+    monkeypatch.setattr(agent_config, "legal_reduce", "none")
+    vectors = _unit(np.random.default_rng(0).normal(size=(20, 8)).astype("float32"))
+    ids = np.arange(100, 120, dtype="int64")
+    index = build_index(vectors, ids, "flat")
+
+    index.remove_ids(np.array([105, 110], dtype="int64"))
+
+    _, found = index.search(vectors[[5, 6]], 1)
+    assert index.ntotal == 18
+    assert found[0][0] != 105
+    assert found[1][0] == 106
+
+
+@pytest.mark.parametrize(
+    ("kind", "compression", "reduce"),
+    [("flat", "pq", "none"), ("ivf_pq", "none", "none"), ("flat", "none", "pca"), ("hnsw", "sq8", "pca")],
+)
+def test_small_corpus_falls_back_to_trainable_codec(kind, compression, reduce):
+    config = dataclasses.replace(
+        agent_config, legal_compression=compression, legal_reduce=reduce, legal_reduced_dim=256
+    )
+    vectors = _unit(np.random.default_rng(0).normal(size=(60, 384)).astype("float32"))
+    ids = np.arange(60, dtype="int64")
+
+    index = build_index(vectors, ids, kind, config)
+
+    assert index.ntotal == 60
+    assert codec_spec(384, kind, config, count=60) in {"none", "sq8"}
+    assert index.search(vectors[:1], 1)[1][0][0] == 0
+
+
+def test_codec_is_trained_once_the_corpus_allows_it():
+    config = dataclasses.replace(agent_config, legal_compression="pq", legal_reduce="pca", legal_reduced_dim=32)
+    vectors = _unit(np.random.default_rng(0).normal(size=(300, 64)).astype("float32"))
+
+    index = build_index(vectors, np.arange(300, dtype="int64"), "flat", config)
+
+    assert codec_spec(64, "flat", config, count=300) == "pq+pca32"
+    assert index.ntotal == 300
+
+
+def test_eval_skips_variants_the_corpus_cannot_train():
+    config = dataclasses.replace(agent_config, legal_reduced_dim=256)
+    vectors = _unit(np.random.default_rng(0).normal(size=(60, 384)).astype("float32"))
+
+    result = evaluate_compression(vectors, np.arange(60, dtype="int64"), "flat", k=5, queries=20, config=config)
+
+    assert [row["codec"] for row in result["variants"]] == ["none", "sq8", "matryoshka256"]
+    assert result["skipped"] == ["pq", "pca256", "sq8+pca256"]
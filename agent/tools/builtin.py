@@ -0,0 +1,197 @@
+from __future__ import annotations
+
+import json
+import time
+from pathlib import Path
+from typing import Any, Dict
+
+from agent.config import agent_config
+from agent.core.agent_logger import agent_logger
+from agent.core.context_packer import context_packer
+from agent.core.speculation import speculator
+from agent.core.summarizer import document_summarizer
+from agent.tools.document_loader import document_loader
+from agent.tools.financial import financial_tool
+from agent.tools.legal_rag import legal_indexes, legal_rag_tool
+from agent.tools.marketing import PromotionBrief, marketing_tool
+from agent.tools.registry import ToolAdapter, ToolCall, ToolRegistry, ToolResult, tool_registry
+
+
+def _run_financial(call: ToolCall) -> ToolResult:
+    result_text, summary = financial_tool.analyze_with_metadata(call.files, call.text(), state=call.state)
+    return result_text, {"files": summary}
+
+
+def _financial_cache_inputs(call: ToolCall):
+    # Текст отчёта и extra содержат пути загрузок: без путей в ключе попадание
+    # вернуло бы файлы другого пользователя.
+    return {"task": call.text(), "paths": _resolved_paths(call.files)}, call.files
+
+
+def _resolved_paths(files) -> list[str]:
+    return [str(Path(path).resolve()) for path in files]
+
+
+def _run_legal(call: ToolCall) -> ToolResult:
+    query = call.text("query")
+    k = int(call.params.get("k", 3))
+    results = legal_indexes.get(call.state.get("namespace")).search(query, k=k)
+    extra = {
+        "query": query,
+        "k": k,
+        "hits": [{"path": item["path"], "score": item["score"]} for item in results],
+    }
+    return json.dumps(results, ensure_ascii=False, indent=2), extra
+
+
+def _legal_cache_inputs(call: ToolCall):
+    inputs = {
+        "query": call.text("query").strip(),
+        "k": int(call.params.get("k", 3)),
+        "namespace": call.state.get("namespace"),
+        "index": legal_indexes.get(call.state.get("namespace")).index_version(),
+        "snippet_tokens": agent_config.legal_snippet_tokens,
+    }
+    return inputs, ()
+
+
+def _run_marketing(call: ToolCall) -> ToolResult:
+    params = call.params
+    state = call.state
+    mode = params.get("mode", "promotion")
+    if mode == "social_post":
+        result_text = marketing_tool.create_social_post(
+            topic=params.get("topic", call.text()),
+            tone=params.get("tone", "дружелюбный"),
+            state=state,
+        )
+    elif mode == "roi":
+        result_text = marketing_tool.estimate_roi(
+            expected_revenue=float(params.get("expected_revenue", 0)),
+            budget=float(params.get("budget", 1)),
+            state=state,
+        )
+    else:
+        brief = PromotionBrief(
+            goal=params.get("goal", call.text()),
+            audience=params.get("audience", "гости кофейни"),
+            budget=params.get("budget"),
+            duration_days=params.get("duration_days"),
+        )
+        result_text = marketing_tool.generate_promotion(brief, state=state)
+    return result_text, {"mode": mode}
+
+
+def _log_loaded_document(call: ToolCall, meta: Dict[str, Any]) -> None:
+    if path := meta.get("path"):
+        agent_logger.log_document_load(
+            call.state,
+            path=path,
+            metadata={k: v for k, v in meta.items() if k != "path"},
+        )
+
+
+def _run_document_loader(call: ToolCall) -> ToolResult:
+    files = call.files
+    docs = speculator.documents(call.state, files, timeout=agent_config.tool_timeouts.get("document_loader"))
+    if docs is None:
+        docs = document_loader.load_many(files)
+    packed = context_packer.needs_packing(docs)
+    if packed:
+        # Несколько файлов не помещаются в бюджет: оставляем самые релевантные фрагменты.
+        docs = context_packer.to_documents(docs, context_packer.pack(docs, call.query, state=call.state))
+    prepared = []
+    summary = []
+    # Бюджет выжимок меньше таймаута инструмента: после таймаута воркер не должен
+    # продолжать занимать модель, поэтому срок проверяется перед каждым вызовом LLM.
+    budget = agent_config.doc_digest_budget_s
+    deadline = time.monotonic() + budget if budget > 0 else None
+    incomplete = False
+    for doc in docs:
+        text = doc.get("text", "") or ""
+        meta = {
+            "path": doc.get("path", ""),
+            "chars": len(text),
+            "lines": text.count("\n") + 1 if text else 0,
+            "metadata": doc.get("metadata", {}),
+        }
+        if not packed and meta["metadata"].get("type") != "table" and document_summarizer.needs_digest(text):
+            # Документ не помещается в контекст: дальше идёт выжимка map-reduce.
+            digest = document_summarizer.digest(
+                text, title=Path(meta["path"]).name, state=call.state, deadline=deadline
+            )
+            meta["digest"] = {
+                "chunks": digest.chunks,
+                "cached_chunks": digest.cached,
+                "skipped_chunks": digest.skipped,
+                "source_tokens": digest.source_tokens,
+                "digest_tokens": digest.digest_tokens,
+            }
+            incomplete = incomplete or not digest.complete
+            doc = {**doc, "text": digest.text, "metadata": {**meta["metadata"], "digest": meta["digest"]}}
+        prepared.append(doc)
+        summary.append(meta)
+        _log_loaded_document(call, meta)
+    extra: Dict[str, Any] = {"documents": summary}
+    if incomplete:
+        # Неполную выжимку не кэшируем: конспекты готовых фрагментов уже в кэше,
+        # следующий вызов доделает остальные.
+        extra["incomplete"] = True
+    return json.dumps(prepared, ensure_ascii=False, indent=2), extra
+
+
+def _document_loader_cache_inputs(call: ToolCall):
+    files = call.files
+    inputs: Dict[str, Any] = {"paths": _resolved_paths(files)}
+    if len(files) > 1:
+        # При нескольких файлах результат зависит от запроса: отбор фрагментов идёт по релевантности.
+        inputs["query"] = call.query
+    return inputs, files
+
+
+def _document_loader_cache_hit(call: ToolCall, extra: Dict[str, Any]) -> None:
+    for meta in extra.get("documents", []):
+        _log_loaded_document(call, meta)
+
+
+def register_builtin_tools(registry: ToolRegistry) -> None:
+    # Таймауты и лимиты параллелизма берутся из AgentConfig.tool_timeouts / tool_concurrency.
+    registry.register(
+        ToolAdapter(
+            name=financial_tool.name,
+            description=financial_tool.description,
+            handler=_run_financial,
+            slot="executor",
+            cache_inputs=_financial_cache_inputs,
+        )
+    )
+    registry.register(
+        ToolAdapter(
+            name=legal_rag_tool.name,
+            description=f"{legal_rag_tool.description} Работает даже без файлов, использует локальный индекс.",
+            handler=_run_legal,
+            cache_inputs=_legal_cache_inputs,
+        )
+    )
+    registry.register(
+        ToolAdapter(
+            name=marketing_tool.name,
+            description=marketing_tool.description,
+            handler=_run_marketing,
+            slot="orchestrator",
+        )
+    )
+    registry.register(
+        ToolAdapter(
+            name="document_loader",
+            description="Читает содержимое переданных файлов и возвращает очищенный текст.",
+            handler=_run_document_loader,
+            # Выжимки длинных документов делает модель-исполнитель.
+            slot="executor",
+            cache_inputs=_document_loader_cache_inputs,
+            on_cache_hit=_document_loader_cache_hit,
+        )
+    )
+
+
+register_builtin_tools(tool_registry)
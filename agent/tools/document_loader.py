@@ -7,19 +7,26 @@ import pandas as pd
 from docx import Document as DocxDocument
 from pypdf import PdfReader
 
+from agent.config import agent_config
+from agent.core.process_pool import cpu_pool
+
 
 class DocumentLoader:
 
     SUPPORTED_SUFFIXES = {".csv", ".tsv", ".xlsx", ".xls", ".pdf", ".docx", ".txt"}
 
-    def __init__(self, max_rows: int = 200) -> None:
+    def __init__(self, max_rows: int = 200, max_pages: int | None = None) -> None:
         self.max_rows = max_rows
+        # 0 — читать PDF целиком; длинные документы сжимает DocumentSummarizer.
+        self.max_pages = agent_config.pdf_max_pages if max_pages is None else max_pages
 
     def load_many(self, paths: Sequence[str | Path]) -> List[dict]:
+        # Разбор PDF/DOCX/таблиц упирается в CPU: файлы читаются параллельно в пуле процессов.
+        futures = [cpu_pool.submit(load_document, str(path), self.max_rows, self.max_pages) for path in paths]
         contexts = []
-        for path in paths:
+        for path, future in zip(paths, futures):
             try:
-                contexts.append(self.load_file(path))
+                contexts.append(future.result())
             except Exception as exc:
                 contexts.append(
                     {
@@ -73,12 +80,12 @@ class DocumentLoader:
     def _read_pdf(self, path: Path) -> dict:
         reader = PdfReader(str(path))
         pages = []
-        for page in reader.pages[:20]:
+        for page in reader.pages[: self.max_pages or None]:
             pages.append(page.extract_text() or "")
         return {
             "path": str(path),
             "text": "\n".join(pages),
-            "metadata": {"type": "pdf", "pages": len(pages)},
+            "metadata": {"type": "pdf", "pages": len(pages), "total_pages": len(reader.pages)},
         }
 
     def _read_docx(self, path: Path) -> dict:
@@ -91,6 +98,12 @@ class DocumentLoader:
         }
 
 
+def load_document(path: str, max_rows: int, max_pages: int) -> dict:
+    """Worker entry point for the CPU pool."""
+
+    return DocumentLoader(max_rows, max_pages).load_file(path)
+
+
 document_loader = DocumentLoader()
 
 
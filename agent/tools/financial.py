@@ -1,15 +1,14 @@
 from __future__ import annotations
 
 import json
-from pathlib import Path
 from typing import Iterable, List, Tuple
 
-import numpy as np
-import pandas as pd
 from langchain_core.messages import HumanMessage, SystemMessage
 
 from agent.core.llm import invoke_executor
+from agent.core.process_pool import cpu_pool
 from agent.core.state import AgentState
+from agent.tools.tables import summarize_table
 
 
 class FinancialTool:
@@ -27,11 +26,12 @@ class FinancialTool:
     def analyze_with_metadata(
         self, files: Iterable[str], task: str, *, state: AgentState | None = None
     ) -> Tuple[str, List[dict]]:
-        frames = [self._read_table(Path(path)) for path in files]
-        if not frames:
+        paths = [str(path) for path in files]
+        if not paths:
             raise ValueError("Не переданы файлы для анализа")
 
-        summary = [self._summarize_dataframe(df, path) for df, path in zip(frames, files)]
+        # Чтение и агрегация идут в пуле процессов: из воркера возвращаются только агрегаты.
+        summary = cpu_pool.map(summarize_table, paths)
         prompt = self._build_prompt(summary, task)
         report = self._call_llm(prompt, state=state)
         return report, summary
@@ -61,35 +61,6 @@ class FinancialTool:
         )
         return result.content
 
-    def _read_table(self, path: Path) -> pd.DataFrame:
-        suffix = path.suffix.lower()
-        if suffix == ".csv":
-            return pd.read_csv(path)
-        if suffix == ".tsv":
-            return pd.read_csv(path, sep="\t")
-        if suffix in {".xlsx", ".xls"}:
-            return pd.read_excel(path)
-        raise ValueError(f"Файл {path.name} не является табличным форматом")
-
-    def _summarize_dataframe(self, df: pd.DataFrame, path: str) -> dict:
-        numeric = df.select_dtypes(include=[np.number]).copy()
-        summary = {"path": path, "row_count": len(df), "columns": list(df.columns), "stats": []}
-        for column in numeric.columns:
-            series = numeric[column].dropna()
-            if series.empty:
-                continue
-            summary["stats"].append(
-                {
-                    "column": column,
-                    "sum": float(series.sum()),
-                    "mean": float(series.mean()),
-                    "min": float(series.min()),
-                    "max": float(series.max()),
-                    "std": float(series.std(ddof=0)),
-                }
-            )
-        return summary
-
 
 financial_tool = FinancialTool()
 
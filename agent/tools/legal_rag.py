@@ -1,15 +1,106 @@
 from __future__ import annotations
 
 import json
+import logging
+import os
+import re
+import shutil
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
 from pathlib import Path
-from typing import List
+from typing import Callable, List
 
 import faiss
 import numpy as np
 
-from agent.config import DATA_DIR
+from agent.config import DATA_DIR, agent_config
+from agent.core.chunking import clause_label, split_clauses
 from agent.core.embeddings import EmbeddingProvider, embeddings
+from agent.core.snippets import extract_snippet
+from agent.core.stemming import analyzer_name
+from agent.core.tool_cache import file_hasher, tool_cache
+from agent.core.vector_index import (
+    apply_search_params,
+    benchmark,
+    build_index,
+    choose_index_type,
+    codec_spec,
+    evaluate_compression,
+    rerank,
+)
 from agent.tools.document_loader import DocumentLoader
+from agent.tools.legal_store import LegalMetaStore
+
+logger = logging.getLogger(__name__)
+
+META_VERSION = 7
+
+CURRENT_FILE = "CURRENT"
+INDEX_FILE = "legal.index"
+VECTORS_FILE = "legal.vectors.npy"
+IDS_FILE = "legal.ids.npy"
+REPORT_FILE = "legal.report.json"
+INFO_FILE = "index.json"
+
+
+@dataclass(slots=True)
+class IndexReport:
+    added: int = 0
+    updated: int = 0
+    removed: int = 0
+    unchanged: int = 0
+    failed: int = 0
+    embedded_chunks: int = 0
+    documents: int = 0
+    index_type: str = ""
+    codec: str = "none"
+    benchmark: dict = field(default_factory=dict)
+
+
+@dataclass(slots=True)
+class IndexHandle:
+    """One published index version as seen by searches.
+
+    ``refs`` counts searches in flight; a retired handle is closed when the last
+    of them releases it, so a swap never pulls the index from under a search.
+    ``generation`` selects the chunk rows of this version in the SQLite store.
+    """
+
+    version: str
+    directory: Path
+    index: faiss.Index | None
+    index_type: str
+    codec: str
+    generation: int = 0
+    full: tuple[np.ndarray, np.ndarray] | None = None
+    sparse: bool = True
+    refs: int = 0
+    retired: bool = False
+
+    def close(self) -> None:
+        self.index = None
+        self.full = None
+
+
+def read_index(path: Path, kind: str, *, mmap: bool) -> faiss.Index:
+    """Open a FAISS index memory-mapped when the index type supports it.
+
+    IVF maps its inverted lists with ``IO_FLAG_MMAP``. Flat codes and the
+    vectors of HNSW are mapped only by ``IO_FLAG_MMAP_IFC``; plain ``MMAP``
+    still copies them into memory. The HNSW graph itself is always read.
+    """
+
+    if mmap:
+        flag = faiss.IO_FLAG_MMAP if kind.startswith("ivf") else faiss.IO_FLAG_MMAP_IFC
+        try:
+            return faiss.read_index(str(path), flag | faiss.IO_FLAG_READ_ONLY)
+        except RuntimeError as exc:
+            logger.info("Индекс %s не поддерживает mmap, читаем в память: %s", path.name, exc)
+    return faiss.read_index(str(path))
 
 
 class LegalRAGTool:
@@ -27,68 +118,640 @@ class LegalRAGTool:
     ) -> None:
         self.storage_dir = storage_dir or (DATA_DIR / "legal")
         self.storage_dir.mkdir(parents=True, exist_ok=True)
-        self.index_path = self.storage_dir / "legal.index"
-        self.meta_path = self.storage_dir / "legal.meta.json"
+        # Каждая сборка пишется в свой каталог versions/<имя>, а CURRENT атомарно
+        # переключается на него через os.replace.
+        self.versions_dir = self.storage_dir / "versions"
+        self.current_path = self.storage_dir / CURRENT_FILE
         self._embedder = embedder or embeddings
         self._loader = loader or DocumentLoader()
+        # Манифест и тексты фрагментов; в памяти процесса их нет.
+        self._store = LegalMetaStore(self.storage_dir / "legal.meta.sqlite")
+        # Состояние индексатора: полные векторы в памяти нужны только ему.
         self._index: faiss.Index | None = None
-        self._meta: List[dict] = []
+        self._index_type = ""
+        self._codec = "none"
+        self._vectors: np.ndarray | None = None
+        self._vector_ids: np.ndarray | None = None
+        self._version: str | None = None
+        # Состояние поиска: опубликованная версия и проверка CURRENT.
+        self._handle: IndexHandle | None = None
+        # Вызывается после открытия новой версии: пул шардов пересчитывает занятую память.
+        self.on_open: Callable[[LegalRAGTool], None] | None = None
+        self._reader_lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self._checked_at = 0.0
+        self._reload_requested = False
+        self._failed_version: str | None = None
+
+    def index_documents(
+        self, directory: str | Path, *, rebuild: bool = False, run_benchmark: bool = False
+    ) -> IndexReport:
+        """Bring the index in line with ``directory``: embed only new or changed files.
+
+        Files are matched by path; unchanged mtime and size skip the file, otherwise
+        the sha256 decides. Changed and deleted files lose their chunks by id.
+        ``run_benchmark`` measures recall and latency of the new version.
+        """
 
-    def index_documents(self, directory: str | Path) -> int:
         directory = Path(directory)
         if not directory.exists():
             raise FileNotFoundError(directory)
 
-        docs = []
-        for file in directory.rglob("*"):
-            if file.is_file() and file.suffix.lower() in self._loader.SUPPORTED_SUFFIXES:
-                docs.append(self._loader.load_file(file))
-
-        if not docs:
+        files = {
+            str(file.resolve()): file
+            for file in sorted(directory.rglob("*"))
+            if file.is_file() and file.suffix.lower() in self._loader.SUPPORTED_SUFFIXES
+        }
+        if not files:
             raise ValueError("В директории не найдено поддерживаемых документов")
 
-        vectors = self._embedder.embed_documents([doc["text"] for doc in docs])
-        matrix = np.array(vectors, dtype="float32")
-        faiss.normalize_L2(matrix)
+        rebuild = not self._load_for_write() or rebuild
+        if rebuild:
+            self._vectors = np.zeros((0, 0), dtype="float32")
+            self._vector_ids = np.zeros(0, dtype="int64")
+            self._index, self._index_type, self._codec = None, "", "none"
+        manifest = {} if rebuild else self._store.manifest()
+        # Идентификаторы не переиспользуются даже при пересборке: поиск по прежней
+        # версии индекса не сопоставит старый id с чужим фрагментом.
+        next_id = int(self._store.get_setting("next_id", "0"))
+        report = IndexReport()
+        root = str(directory.resolve())
 
-        index = faiss.IndexFlatIP(matrix.shape[1])
-        index.add(matrix)
-        faiss.write_index(index, str(self.index_path))
-        self._index = index
+        stale = [
+            path
+            for path in manifest
+            if path not in files and (Path(path).is_relative_to(root) or not Path(path).exists())
+        ]
+        changed: List[tuple[str, dict]] = []
+        touched: List[tuple[str, int, int]] = []
+        for path, file in files.items():
+            stat = file.stat()
+            entry = manifest.get(path)
+            if entry and entry["mtime_ns"] == stat.st_mtime_ns and entry["size"] == stat.st_size:
+                report.unchanged += 1
+                continue
+            digest = file_hasher.sha256(file)
+            if entry and entry["sha256"] == digest:
+                touched.append((path, stat.st_mtime_ns, stat.st_size))
+                report.unchanged += 1
+                continue
+            changed.append((path, {"mtime_ns": stat.st_mtime_ns, "size": stat.st_size, "sha256": digest}))
 
-        with self.meta_path.open("w", encoding="utf-8") as f:
-            json.dump(docs, f, ensure_ascii=False, indent=2)
-        self._meta = docs
-        return len(docs)
+        docs = self._loader.load_many([path for path, _ in changed])
+        prepared: List[tuple[str, dict, List[tuple[int, dict]]]] = []
+        failed: List[str] = []
+        for (path, entry), doc in zip(changed, docs):
+            text = doc.get("text") or ""
+            entry["metadata"] = doc.get("metadata", {})
+            if not text.strip():
+                # Файл без текста не попадает в манифест: иначе неизменные mtime и
+                # размер навсегда исключат его из повторной попытки разбора.
+                logger.warning(
+                    "Не удалось извлечь текст из %s: %s", path, entry["metadata"].get("error", "пустой документ")
+                )
+                failed.append(path)
+                continue
+            pieces = split_clauses(
+                text,
+                agent_config.legal_chunk_tokens,
+                overlap_tokens=agent_config.legal_chunk_overlap,
+            )
+            chunks = []
+            for position, piece in enumerate(pieces):
+                chunks.append((next_id, {"position": position, "clause": clause_label(piece), "text": piece}))
+                next_id += 1
+            prepared.append((path, entry, chunks))
+            if path in manifest:
+                report.updated += 1
+            else:
+                report.added += 1
+        report.removed = len(stale)
+        report.failed = len(failed)
 
-    def _ensure_index(self) -> None:
-        if self._index is not None and self._meta:
-            return
-        if not self.index_path.exists() or not self.meta_path.exists():
-            raise RuntimeError("Индекс юридических документов пока не создан. Запустите команду index-documents.")
-        self._index = faiss.read_index(str(self.index_path))
-        with self.meta_path.open("r", encoding="utf-8") as f:
-            self._meta = json.load(f)
+        new_chunks = [chunk for _, _, chunks in prepared for chunk in chunks]
+        new_ids = np.array([chunk_id for chunk_id, _ in new_chunks], dtype="int64")
+        matrix = np.zeros((0, 0), dtype="float32")
+        if new_chunks:
+            matrix = np.array(
+                self._embedder.embed_documents([chunk["text"] for _, chunk in new_chunks]), dtype="float32"
+            )
+            faiss.normalize_L2(matrix)
+        report.embedded_chunks = len(new_chunks)
+
+        analyzer = analyzer_name()
+        # Поколение новой версии: её фрагменты не видны читателям прежних версий,
+        # а удалённые остаются видны им до сборки мусора в _prune_versions.
+        generation = int(self._store.get_setting("generation", "0")) + 1
+        with self._store.transaction() as conn:
+            if rebuild:
+                self._store.clear(conn, generation)
+            # Термины FTS5, построенные другим стеммером, не совпадут с терминами запроса:
+            # пересчитываем их из сохранённых текстов без повторного эмбеддинга.
+            reanalyze = not rebuild and self._store.get_setting("analyzer") != analyzer
+            if reanalyze:
+                logger.warning("Анализатор терминов сменился на %s: пересчитываем разреженный индекс", analyzer)
+                self._store.reanalyze(conn)
+            removed_ids: List[int] = []
+            # Прежние фрагменты файла, который теперь не читается, тоже устарели.
+            replaced = [path for path, _, _ in prepared] + failed
+            for path in stale + [path for path in replaced if path in manifest]:
+                removed_ids.extend(self._store.chunk_ids(conn, path))
+                self._store.remove_document(conn, path, generation)
+            for path, mtime_ns, size in touched:
+                self._store.touch_document(conn, path, mtime_ns, size)
+            for path, entry, chunks in prepared:
+                self._store.put_document(conn, path, entry, chunks, generation)
+
+            # Смена LEGAL_COMPRESSION/LEGAL_REDUCE пересобирает индекс из сохранённых векторов.
+            recode = bool(len(self._vectors)) and (
+                codec_spec(
+                    self._vectors.shape[1], choose_index_type(len(self._vector_ids)), count=len(self._vector_ids)
+                )
+                != self._codec
+            )
+            modified = bool(
+                report.added or report.updated or report.removed or removed_ids or rebuild or recode or reanalyze
+            )
+            version = self._version
+            settings = {"version": META_VERSION, "next_id": next_id, "analyzer": analyzer}
+            if modified:
+                self._update_vectors(removed_ids, new_ids, matrix)
+                report.index_type, report.codec = self._index_type, self._codec
+                version = self._write_version(generation)
+                settings["generation"] = generation
+            settings["index_version"] = version
+            self._store.set_settings(conn, settings)
+        report.documents = self._store.document_count()
+        if modified:
+            # Публикуем только после коммита SQLite: новая версия не видна без своих фрагментов.
+            self._publish(version)
+            tool_cache.invalidate(self.name)
+            if run_benchmark and self._index is not None:
+                report.benchmark = benchmark(self._index, self._vectors, self._vector_ids, self._index_type)
+                with (self.versions_dir / version / REPORT_FILE).open("w", encoding="utf-8") as f:
+                    json.dump(report.benchmark, f, ensure_ascii=False, indent=2)
+        return report
+
+    def _update_vectors(self, removed_ids: List[int], new_ids: np.ndarray, matrix: np.ndarray) -> None:
+        stale = False
+        if removed_ids and len(self._vector_ids):
+            removed = np.array(removed_ids, dtype="int64")
+            keep = ~np.isin(self._vector_ids, removed)
+            self._vectors, self._vector_ids = self._vectors[keep], self._vector_ids[keep]
+            stale = not self._remove_from_index(removed)
+        if len(new_ids):
+            self._vectors = matrix if not len(self._vectors) else np.vstack([self._vectors, matrix])
+            self._vector_ids = np.concatenate([self._vector_ids, new_ids])
+
+        kind = choose_index_type(len(self._vector_ids))
+        # На маленьком корпусе PQ/PCA не обучаются, и кодек зависит от числа векторов:
+        # когда их станет достаточно, индекс пересоберётся со сжатием.
+        codec = codec_spec(self._vectors.shape[1], kind, count=len(self._vectors)) if len(self._vectors) else "none"
+        if self._index is None or stale or kind != self._index_type or codec != self._codec:
+            self._index = build_index(self._vectors, self._vector_ids, kind) if len(self._vectors) else None
+        elif len(new_ids):
+            self._index.add_with_ids(matrix, new_ids)
+        self._index_type, self._codec = kind, codec
+
+    def _remove_from_index(self, ids: np.ndarray) -> bool:
+        """Drop ``ids`` from the index in place; ``False`` when it has to be rebuilt."""
+
+        # HNSW не умеет удалять векторы: его пересобираем из хранилища векторов без
+        # повторного эмбеддинга. Flat, IVF, SQ и PQ удаляют через IndexIDMap2.
+        if self._index is None or self._index_type == "hnsw":
+            return False
+        try:
+            self._index.remove_ids(ids)
+        except RuntimeError as exc:
+            logger.info("Индекс не поддерживает удаление, пересобираем: %s", exc)
+            return False
+        return True
+
+    def _load_for_write(self) -> bool:
+        """Load the published index and vectors into memory; ``False`` when a full rebuild is needed."""
+
+        version = self.current_version()
+        if self._vectors is not None and self._vector_ids is not None and self._version == version:
+            return True
+        if (
+            version is None
+            or self._store.get_setting("version") != str(META_VERSION)
+            or self._store.get_setting("index_version") != version
+        ):
+            return False
+        directory = self.versions_dir / version
+        info = self._read_info(directory)
+        if info is None:
+            return False
+        self._index_type, self._codec = info["index_type"], info["codec"]
+        self._index = None
+        if (directory / INDEX_FILE).exists():
+            self._index = read_index(directory / INDEX_FILE, self._index_type, mmap=False)
+            apply_search_params(self._index, self._index_type)
+        self._vectors = np.load(directory / VECTORS_FILE)
+        self._vector_ids = np.load(directory / IDS_FILE)
+        self._version = version
+        return True
+
+    def _write_version(self, generation: int) -> str:
+        """Write the in-memory index into a new, not yet published version directory."""
+
+        version = f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:6]}"
+        directory = self.versions_dir / version
+        directory.mkdir(parents=True)
+        if self._index is not None:
+            faiss.write_index(self._index, str(directory / INDEX_FILE))
+        np.save(directory / VECTORS_FILE, self._vectors)
+        np.save(directory / IDS_FILE, self._vector_ids)
+        info = {
+            "index_type": self._index_type,
+            "codec": self._codec,
+            "vectors": int(len(self._vector_ids)),
+            "generation": generation,
+        }
+        with (directory / INFO_FILE).open("w", encoding="utf-8") as f:
+            json.dump(info, f, ensure_ascii=False)
+        return version
+
+    def _publish(self, version: str) -> None:
+        tmp = self.current_path.with_name(f"{CURRENT_FILE}.{os.getpid()}.tmp")
+        tmp.write_text(version + "\n", encoding="utf-8")
+        os.replace(tmp, self.current_path)
+        self._version = version
+        self.request_reload()
+        self._prune_versions()
+
+    def _prune_versions(self) -> None:
+        # Версии, отображённые через mmap в других процессах, переживают удаление
+        # каталога: файл освобождается, когда его закроет последний читатель.
+        keep = {self.current_version()}
+        with self._reader_lock:
+            if self._handle is not None:
+                keep.add(self._handle.version)
+        versions = sorted(path for path in self.versions_dir.iterdir() if path.is_dir())
+        keep.update(path.name for path in versions[-max(1, agent_config.legal_versions_kept) :])
+        for path in versions:
+            if path.name not in keep:
+                shutil.rmtree(path, ignore_errors=True)
+        generations = [
+            info.get("generation", 0)
+            for info in (self._read_info(path) for path in versions if path.name in keep)
+            if info is not None
+        ]
+        if generations:
+            # Фрагменты, удалённые не позже самой старой оставленной версии, больше никому не видны.
+            with self._store.transaction() as conn:
+                self._store.collect(conn, min(generations))
+        for name in (INDEX_FILE, VECTORS_FILE, IDS_FILE, REPORT_FILE):
+            # Файлы индекса прежней раскладки без версий.
+            (self.storage_dir / name).unlink(missing_ok=True)
+
+    @staticmethod
+    def _read_info(directory: Path) -> dict | None:
+        try:
+            with (directory / INFO_FILE).open("r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return None
+
+    def current_version(self) -> str | None:
+        try:
+            return self.current_path.read_text(encoding="utf-8").strip() or None
+        except OSError:
+            return None
+
+    def index_version(self) -> str:
+        """Name of the published index version; changes on every rebuild, also from another process."""
+
+        return self.current_version() or "missing"
+
+    def request_reload(self) -> None:
+        """Make the next search re-read CURRENT instead of waiting for the poll interval."""
 
-    def search(self, query: str, k: int = 3) -> List[dict]:
-        self._ensure_index()
+        self._failed_version = None
+        self._reload_requested = True
+
+    def retire(self) -> None:
+        """Drop the open version; searches still using it finish first."""
+
+        with self._reader_lock:
+            handle, self._handle = self._handle, None
+        if handle is not None:
+            self._retire(handle)
+
+    def _acquire(self) -> IndexHandle:
+        if self._reload_due():
+            self._reload()
+        with self._reader_lock:
+            handle = self._handle
+            if handle is None:
+                raise RuntimeError("Индекс юридических документов пока не создан. Запустите команду index-documents.")
+            handle.refs += 1
+            return handle
+
+    def _release(self, handle: IndexHandle) -> None:
+        with self._reader_lock:
+            handle.refs -= 1
+            if handle.retired and handle.refs == 0:
+                handle.close()
+
+    def _retire(self, handle: IndexHandle) -> None:
+        with self._reader_lock:
+            handle.retired = True
+            if handle.refs == 0:
+                handle.close()
+
+    def _reload_due(self) -> bool:
+        now = time.monotonic()
+        if (
+            self._handle is not None
+            and not self._reload_requested
+            and now - self._checked_at < agent_config.legal_reload_interval
+        ):
+            return False
+        self._checked_at = now
+        self._reload_requested = False
+        version = self.current_version()
+        return version is not None and (
+            self._handle is None or version not in {self._handle.version, self._failed_version}
+        )
+
+    def _reload(self) -> None:
+        # Новая версия открывается вне _reader_lock: поиски продолжают работать
+        # на старой, пока новая читается с диска.
+        with self._load_lock:
+            version = self.current_version()
+            if version is None or (self._handle is not None and self._handle.version == version):
+                return
+            try:
+                handle = self._open(version)
+            except Exception:
+                if self._handle is None:
+                    raise
+                # Битая или недописанная версия не должна ломать поиск: остаёмся на прежней
+                # и не пробуем её снова, пока CURRENT не сменится или не придёт SIGHUP.
+                logger.exception(
+                    "Юридический индекс %s: не удалось открыть версию %s, поиск остаётся на %s",
+                    self.storage_dir,
+                    version,
+                    self._handle.version,
+                )
+                self._failed_version = version
+                return
+            with self._reader_lock:
+                previous, self._handle = self._handle, handle
+            if previous is not None:
+                self._retire(previous)
+            logger.info("Юридический индекс %s: открыта версия %s", self.storage_dir, version)
+        if self.on_open is not None:
+            self.on_open(self)
+
+    def _open(self, version: str) -> IndexHandle:
+        if self._store.get_setting("version") != str(META_VERSION):
+            raise RuntimeError("Индекс юридических документов устарел. Перестройте его командой index-documents.")
+        directory = self.versions_dir / version
+        info = self._read_info(directory)
+        if info is None:
+            raise RuntimeError(f"Версия индекса {version} повреждена. Перестройте его командой index-documents.")
+        index = None
+        if (directory / INDEX_FILE).exists():
+            index = read_index(directory / INDEX_FILE, info["index_type"], mmap=True)
+            apply_search_params(index, info["index_type"])
+        handle = IndexHandle(
+            version=version,
+            directory=directory,
+            index=index,
+            index_type=info["index_type"],
+            codec=info["codec"],
+            generation=info.get("generation", 0),
+        )
+        indexed_with = self._store.get_setting("analyzer")
+        if indexed_with != analyzer_name():
+            # Например, snowballstemmer установлен у индексатора, но не у backend.
+            logger.warning(
+                "Индекс %s построен анализатором %s, а поиск использует %s: BM25 отключён до переиндексации",
+                self.storage_dir,
+                indexed_with,
+                analyzer_name(),
+            )
+            handle.sparse = False
+        if handle.codec != "none" and agent_config.legal_rerank_factor > 0:
+            # Полные векторы для уточнения сжатого индекса: через mmap читаются только строки кандидатов.
+            handle.full = np.load(directory / VECTORS_FILE, mmap_mode="r"), np.load(directory / IDS_FILE)
+        return handle
+
+    def search(self, query: str, k: int = 3, *, snippet_tokens: int | None = None) -> List[dict]:
+        handle = self._acquire()
+        try:
+            return self._search(handle, query, k, snippet_tokens)
+        finally:
+            self._release(handle)
+
+    def _search(self, handle: IndexHandle, query: str, k: int, snippet_tokens: int | None) -> List[dict]:
+        index = handle.index
+        if index is None or not index.ntotal:
+            return []
+        # Ищем с запасом по фрагментам, чтобы после группировки осталось k документов.
+        candidates = min(index.ntotal, max(k, k * agent_config.legal_chunk_candidates))
+        sparse = None
+        if agent_config.legal_hybrid and handle.sparse:
+            # BM25 по FTS5 идёт в соседнем потоке, пока считается эмбеддинг запроса и поиск FAISS.
+            sparse = _sparse_executor().submit(self._store.sparse_search, query, candidates, handle.generation)
         vector = np.array([self._embedder.embed_query(query)], dtype="float32")
         faiss.normalize_L2(vector)
-        distances, indices = self._index.search(vector, min(k, len(self._meta)))
+        full = handle.full
+        if full is None:
+            distances, ids = index.search(vector, candidates)
+            dense = [(int(chunk_id), float(score)) for score, chunk_id in zip(distances[0], ids[0]) if chunk_id >= 0]
+        else:
+            # Сжатый индекс отбирает кандидатов с запасом, порядок уточняется по полным векторам.
+            fetch = min(index.ntotal, candidates * agent_config.legal_rerank_factor)
+            _, ids = index.search(vector, fetch)
+            dense = rerank(full[0], full[1], vector[0], ids[0], candidates)
+        ranking = dense if sparse is None else self._fuse(dense, sparse.result())
+        rows = self._store.chunks((chunk_id for chunk_id, _ in ranking), handle.generation)
+
+        hits: dict[str, List[tuple[float, int, dict]]] = {}
+        for chunk_id, score in ranking:
+            chunk = rows.get(chunk_id)
+            if chunk is None:
+                continue
+            hits.setdefault(chunk["doc"], []).append((score, chunk_id, chunk))
+
+        ranked = sorted(hits.items(), key=lambda item: item[1][0][0], reverse=True)[:k]
+        best = {path: sorted(matches[:3], key=lambda item: item[2]["position"]) for path, matches in ranked}
+        # Тексты читаются только для фрагментов, которые попадут в ответ.
+        texts = self._store.chunks(
+            (chunk_id for matches in best.values() for _, chunk_id, _ in matches), handle.generation, with_text=True
+        )
+        metadata = self._store.document_metadata(best)
+
+        budget = agent_config.legal_snippet_tokens if snippet_tokens is None else snippet_tokens
         results = []
-        for score, idx in zip(distances[0], indices[0]):
-            meta = self._meta[idx]
+        for path, matches in ranked:
+            text = "\n".join(texts[chunk_id]["text"] for _, chunk_id, _ in best[path] if chunk_id in texts)
             results.append(
                 {
-                    "path": meta["path"],
-                    "text": meta["text"][:2000],
-                    "score": float(score),
-                    "metadata": meta.get("metadata", {}),
+                    "path": path,
+                    "text": extract_snippet(text, vector[0], max_tokens=budget, embedder=self._embedder),
+                    "score": matches[0][0],
+                    "clauses": [chunk["clause"] for _, _, chunk in best[path] if chunk["clause"]],
+                    "metadata": metadata.get(path, {}),
                 }
             )
         return results
 
+    def evaluate_compression(self, *, k: int = 10, queries: int = 200) -> dict:
+        """Recall loss of the compression options against float search on the indexed corpus."""
 
-legal_rag_tool = LegalRAGTool()
+        version = self.current_version()
+        if version is None:
+            raise RuntimeError("Индекс юридических документов пока не создан. Запустите команду index-documents.")
+        directory = self.versions_dir / version
+        vectors = np.load(directory / VECTORS_FILE, mmap_mode="r")
+        ids = np.load(directory / IDS_FILE)
+        return evaluate_compression(
+            vectors,
+            ids,
+            choose_index_type(len(ids)),
+            k=k,
+            queries=queries,
+            rerank_factor=agent_config.legal_rerank_factor,
+        )
+
+    @staticmethod
+    def _fuse(*rankings: List[tuple[int, float]]) -> List[tuple[int, float]]:
+        """Reciprocal rank fusion: ``sum(1 / (k + rank))`` over the lists, best first."""
+
+        fused: dict[int, float] = {}
+        for ranking in rankings:
+            for rank, (chunk_id, _) in enumerate(ranking, start=1):
+                fused[chunk_id] = fused.get(chunk_id, 0.0) + 1.0 / (agent_config.legal_rrf_k + rank)
+        return sorted(fused.items(), key=lambda item: item[1], reverse=True)
+
+    def footprint(self) -> int:
+        """Bytes held by the open index version; 0 while no version is open.
+
+        Flat codes, HNSW vectors and IVF lists are memory-mapped and only the
+        HNSW graph is read into memory, so the file size is an upper bound.
+        The full vectors count only when they are mapped for re-ranking.
+        """
 
+        with self._reader_lock:
+            handle = self._handle
+            if handle is None:
+                return 0
+            paths = [handle.directory / INDEX_FILE] if handle.index is not None else []
+            if handle.full is not None:
+                paths.append(handle.directory / VECTORS_FILE)
+        total = 0
+        for path in paths:
+            try:
+                total += path.stat().st_size
+            except OSError:
+                pass
+        return total
 
+
+_sparse_lock = threading.Lock()
+_sparse_pool: ThreadPoolExecutor | None = None
+
+
+def _sparse_executor() -> ThreadPoolExecutor:
+    # Один пул на все индексы: BM25-запросы короткие, а шардов может быть много.
+    global _sparse_pool
+    with _sparse_lock:
+        if _sparse_pool is None:
+            _sparse_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="legal-bm25")
+        return _sparse_pool
+
+
+_NAMESPACE_RE = re.compile(r"[\w-]+")
+
+
+class LegalIndexPool:
+    """Legal indexes per organization under ``DATA_DIR/legal/orgs/<id>``.
+
+    Only recently used shards stay open: past ``legal_max_shards`` or
+    ``legal_shards_memory_mb`` (open versions of all indexes, the shared one
+    included, see :meth:`LegalRAGTool.footprint`) the least recently used shard
+    is retired and closed once its in-flight searches end. The limits are checked
+    when a shard is created and whenever an index opens a version.
+    Requests without an organization go to the shared index in
+    ``DATA_DIR/legal``. An organization without its own index gets an error,
+    unless ``legal_shared_fallback`` sends it to the shared index too.
+    """
+
+    def __init__(self, default: LegalRAGTool, root: Path | None = None) -> None:
+        self.default = default
+        self.root = root or (default.storage_dir / "orgs")
+        self._lock = threading.Lock()
+        self._shards: OrderedDict[str, LegalRAGTool] = OrderedDict()
+        # Индекс шарда открывается лениво, при первом поиске, поэтому лимит памяти
+        # проверяется и после каждого открытия версии, а не только при создании шарда.
+        default.on_open = self._opened
+
+    def directory(self, namespace: str) -> Path:
+        if not _NAMESPACE_RE.fullmatch(namespace):
+            raise ValueError(f"Недопустимый идентификатор организации: {namespace!r}")
+        return self.root / namespace
+
+    def get(self, namespace: str | int | None, *, create: bool = False) -> LegalRAGTool:
+        if namespace is None or namespace == "":
+            return self.default
+        namespace = str(namespace)
+        with self._lock:
+            tool = self._shards.get(namespace)
+            if tool is not None:
+                self._shards.move_to_end(namespace)
+                return tool
+            directory = self.directory(namespace)
+            if not create and not (directory / CURRENT_FILE).exists():
+                if agent_config.legal_shared_fallback:
+                    return self.default
+                # Общий индекс может содержать чужие договоры: без явного разрешения
+                # организация без своего индекса его не видит.
+                raise RuntimeError(
+                    f"Индекс юридических документов организации {namespace} не построен. "
+                    f"Запустите команду index-documents --org {namespace}."
+                )
+            tool = LegalRAGTool(storage_dir=directory, embedder=self.default._embedder, loader=self.default._loader)
+            tool.on_open = self._opened
+            self._shards[namespace] = tool
+            self._evict(keep=tool)
+            return tool
+
+    def request_reload(self) -> None:
+        """Re-read CURRENT of every open index on the next search (SIGHUP handler)."""
+
+        self.default.request_reload()
+        with self._lock:
+            for tool in self._shards.values():
+                tool.request_reload()
+
+    def resident(self) -> dict[str, int]:
+        with self._lock:
+            return {namespace: tool.footprint() for namespace, tool in self._shards.items()}
+
+    def _opened(self, tool: LegalRAGTool) -> None:
+        with self._lock:
+            self._evict(keep=tool)
+
+    def _evict(self, keep: LegalRAGTool | None = None) -> None:
+        # Только что открытый шард не выгружаем: его поиск ещё не начался.
+        limit = agent_config.legal_shards_memory_mb * 1024 * 1024
+        total = self.default.footprint() + sum(tool.footprint() for tool in self._shards.values())
+        for namespace in list(self._shards):
+            if len(self._shards) <= 1 or (len(self._shards) <= agent_config.legal_max_shards and total <= limit):
+                break
+            tool = self._shards[namespace]
+            if tool is keep:
+                continue
+            del self._shards[namespace]
+            total -= tool.footprint()
+            tool.retire()
+            logger.info("Индекс организации %s выгружен из памяти", namespace)
+
+
+legal_rag_tool = LegalRAGTool()
+legal_indexes = LegalIndexPool(legal_rag_tool)
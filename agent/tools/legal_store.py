@@ -0,0 +1,218 @@
+from __future__ import annotations
+
+import json
+import sqlite3
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Sequence
+
+from agent.core.bm25 import analyze
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS settings (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS documents (
+    path TEXT PRIMARY KEY,
+    mtime_ns INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    sha256 TEXT NOT NULL,
+    metadata TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS chunks (
+    id INTEGER PRIMARY KEY,
+    doc TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    clause TEXT NOT NULL,
+    text TEXT NOT NULL,
+    added INTEGER NOT NULL DEFAULT 0,
+    removed INTEGER
+);
+CREATE INDEX IF NOT EXISTS chunks_doc ON chunks (doc);
+CREATE VIRTUAL TABLE IF NOT EXISTS chunks_fts USING fts5(terms);
+"""
+
+# Колонки поколений, которых нет в базах прежнего формата.
+_GENERATION_COLUMNS = (("added", "INTEGER NOT NULL DEFAULT 0"), ("removed", "INTEGER"))
+
+# Фрагмент виден версии индекса поколения g, если добавлен не позже g и удалён позже g.
+_VISIBLE = "added <= ? AND (removed IS NULL OR removed > ?)"
+
+
+class LegalMetaStore:
+    """SQLite store for the legal index manifest, chunk texts and the sparse index.
+
+    Search reads only the rows of the returned hits, so the process does not
+    keep the corpus text in memory. ``chunks_fts`` is an FTS5 table over stemmed
+    terms keyed by chunk id; its built-in ``bm25()`` ranks the sparse hits.
+
+    Chunks carry the generation of the index version that added them and of
+    the one that removed them. Readers pass their generation and keep seeing
+    their rows while newer versions are written; removed rows are deleted by
+    :meth:`collect` once no kept version can see them.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self._lock = threading.RLock()
+        self._conn: sqlite3.Connection | None = None
+
+    def exists(self) -> bool:
+        return self.path.exists()
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(_SCHEMA)
+            columns = {row[1] for row in self._conn.execute("PRAGMA table_info(chunks)")}
+            for name, spec in _GENERATION_COLUMNS:
+                if name not in columns:
+                    self._conn.execute(f"ALTER TABLE chunks ADD COLUMN {name} {spec}")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS chunks_removed ON chunks (removed)")
+        return self._conn
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        with self._lock:
+            conn = self._connection()
+            with conn:
+                yield conn
+
+    def get_setting(self, key: str, default: str | None = None) -> str | None:
+        with self._lock:
+            row = self._connection().execute("SELECT value FROM settings WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+    @staticmethod
+    def set_settings(conn: sqlite3.Connection, values: Dict[str, Any]) -> None:
+        conn.executemany(
+            "INSERT INTO settings (key, value) VALUES (?, ?) ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+            [(key, str(value)) for key, value in values.items()],
+        )
+
+    def manifest(self) -> Dict[str, dict]:
+        """path -> mtime_ns, size, sha256; without chunk texts."""
+
+        with self._lock:
+            rows = self._connection().execute("SELECT path, mtime_ns, size, sha256 FROM documents").fetchall()
+        return {path: {"mtime_ns": mtime, "size": size, "sha256": digest} for path, mtime, size, digest in rows}
+
+    def document_count(self) -> int:
+        with self._lock:
+            return self._connection().execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+
+    def chunk_count(self) -> int:
+        with self._lock:
+            return self._connection().execute("SELECT COUNT(*) FROM chunks WHERE removed IS NULL").fetchone()[0]
+
+    @staticmethod
+    def chunk_ids(conn: sqlite3.Connection, path: str) -> List[int]:
+        return [row[0] for row in conn.execute("SELECT id FROM chunks WHERE doc = ? AND removed IS NULL", (path,))]
+
+    @staticmethod
+    def remove_document(conn: sqlite3.Connection, path: str, generation: int) -> None:
+        conn.execute("UPDATE chunks SET removed = ? WHERE doc = ? AND removed IS NULL", (generation, path))
+        conn.execute("DELETE FROM documents WHERE path = ?", (path,))
+
+    @staticmethod
+    def put_document(
+        conn: sqlite3.Connection, path: str, entry: dict, chunks: Sequence[tuple[int, dict]], generation: int
+    ) -> None:
+        conn.execute(
+            "INSERT OR REPLACE INTO documents (path, mtime_ns, size, sha256, metadata) VALUES (?, ?, ?, ?, ?)",
+            (path, entry["mtime_ns"], entry["size"], entry["sha256"], json.dumps(entry.get("metadata", {}), ensure_ascii=False)),
+        )
+        conn.executemany(
+            "INSERT INTO chunks (id, doc, position, clause, text, added) VALUES (?, ?, ?, ?, ?, ?)",
+            [
+                (chunk_id, path, chunk["position"], chunk["clause"], chunk["text"], generation)
+                for chunk_id, chunk in chunks
+            ],
+        )
+        conn.executemany(
+            "INSERT INTO chunks_fts (rowid, terms) VALUES (?, ?)",
+            [(chunk_id, " ".join(analyze(chunk["text"]))) for chunk_id, chunk in chunks],
+        )
+
+    @staticmethod
+    def clear(conn: sqlite3.Connection, generation: int) -> None:
+        conn.execute("UPDATE chunks SET removed = ? WHERE removed IS NULL", (generation,))
+        conn.execute("DELETE FROM documents")
+
+    @staticmethod
+    def collect(conn: sqlite3.Connection, oldest: int) -> int:
+        """Delete chunks that no version of generation ``oldest`` or newer can see."""
+
+        conn.execute(
+            "DELETE FROM chunks_fts WHERE rowid IN (SELECT id FROM chunks WHERE removed <= ?)", (oldest,)
+        )
+        return conn.execute("DELETE FROM chunks WHERE removed <= ?", (oldest,)).rowcount
+
+    @staticmethod
+    def reanalyze(conn: sqlite3.Connection) -> None:
+        """Rebuild the sparse terms from the stored chunk texts with the current analyzer."""
+
+        conn.execute("DELETE FROM chunks_fts")
+        rows = conn.execute("SELECT id, text FROM chunks")
+        while batch := rows.fetchmany(1000):
+            conn.executemany(
+                "INSERT INTO chunks_fts (rowid, terms) VALUES (?, ?)",
+                [(chunk_id, " ".join(analyze(text))) for chunk_id, text in batch],
+            )
+
+    @staticmethod
+    def touch_document(conn: sqlite3.Connection, path: str, mtime_ns: int, size: int) -> None:
+        conn.execute("UPDATE documents SET mtime_ns = ?, size = ? WHERE path = ?", (mtime_ns, size, path))
+
+    def chunks(self, ids: Iterable[int], generation: int, *, with_text: bool = False) -> Dict[int, dict]:
+        ids = [int(item) for item in ids]
+        if not ids:
+            return {}
+        columns = "id, doc, position, clause" + (", text" if with_text else "")
+        placeholders = ",".join("?" * len(ids))
+        with self._lock:
+            rows = self._connection().execute(
+                f"SELECT {columns} FROM chunks WHERE id IN ({placeholders}) AND {_VISIBLE}",
+                [*ids, generation, generation],
+            ).fetchall()
+        result: Dict[int, dict] = {}
+        for row in rows:
+            item = {"doc": row[1], "position": row[2], "clause": row[3]}
+            if with_text:
+                item["text"] = row[4]
+            result[row[0]] = item
+        return result
+
+    def sparse_search(self, query: str, limit: int, generation: int) -> List[tuple[int, float]]:
+        """Chunk ids of index generation ``generation`` ranked by BM25 over stemmed terms, best first."""
+
+        terms = sorted(set(analyze(query)))
+        if not terms:
+            return []
+        expression = " OR ".join(f'"{term}"' for term in terms)
+        with self._lock:
+            rows = self._connection().execute(
+                "SELECT chunks_fts.rowid, bm25(chunks_fts) FROM chunks_fts JOIN chunks ON chunks.id = chunks_fts.rowid "
+                f"WHERE chunks_fts MATCH ? AND {_VISIBLE} ORDER BY bm25(chunks_fts) LIMIT ?",
+                (expression, generation, generation, limit),
+            ).fetchall()
+        # bm25() в FTS5 отрицательный: чем меньше, тем лучше.
+        return [(int(rowid), -float(score)) for rowid, score in rows]
+
+    def document_metadata(self, paths: Iterable[str]) -> Dict[str, dict]:
+        paths = list(paths)
+        if not paths:
+            return {}
+        placeholders = ",".join("?" * len(paths))
+        with self._lock:
+            rows = self._connection().execute(
+                f"SELECT path, metadata FROM documents WHERE path IN ({placeholders})", paths
+            ).fetchall()
+        return {path: json.loads(metadata) for path, metadata in rows}
@@ -0,0 +1,170 @@
+from __future__ import annotations
+
+import asyncio
+import importlib
+import inspect
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterable, List, Literal, Optional, Sequence
+
+from agent.config import AgentConfig, agent_config
+from agent.core.model_manager import ModelSlot
+from agent.core.process_pool import cpu_pool
+from agent.core.state import AgentState
+
+ExecutionMode = Literal["sync", "async", "process"]
+ToolResult = tuple[str, Optional[Dict[str, Any]]]
+
+
+@dataclass(slots=True)
+class ToolCall:
+    """Arguments of one plan step as seen by a tool adapter."""
+
+    tool: str
+    params: Dict[str, Any]
+    action: str
+    state: AgentState
+
+    @property
+    def query(self) -> str:
+        return self.state.get("query", "")
+
+    @property
+    def files(self) -> List[str]:
+        return list(self.params.get("files") or self.state.get("files", []) or [])
+
+    def text(self, *names: str) -> str:
+        """First non-empty param among ``names``, else the step action, else the user query."""
+
+        for name in names:
+            value = self.params.get(name)
+            if value:
+                return str(value)
+        return self.action or self.query
+
+    def detached(self) -> "ToolCall":
+        """Copy safe to send to another process: only query, files, run id and namespace survive."""
+
+        state: AgentState = {
+            "run_id": self.state.get("run_id", ""),
+            "namespace": self.state.get("namespace"),
+            "query": self.query,
+            "files": list(self.state.get("files", []) or []),
+        }
+        return ToolCall(tool=self.tool, params=dict(self.params), action=self.action, state=state)
+
+
+@dataclass(slots=True)
+class ToolAdapter:
+    """Declaration of a tool: how to run it and how much of it may run at once.
+
+    ``handler`` receives a :class:`ToolCall` and returns ``(text, extra)``. In
+    ``async`` mode it is a coroutine function; in ``process`` mode it must be a
+    module-level function, it gets a detached call and cannot log to the state.
+    ``cache_inputs`` returns ``(inputs, files)`` for the result cache or ``None``.
+    ``max_concurrency`` and ``timeout_s`` are defaults for tools that
+    ``AgentConfig.tool_concurrency`` / ``tool_timeouts`` do not list.
+    """
+
+    name: str
+    description: str
+    handler: Callable[[ToolCall], Any]
+    slot: ModelSlot | None = None
+    mode: ExecutionMode = "sync"
+    max_concurrency: int = 1
+    timeout_s: float | None = None
+    cache_inputs: Callable[[ToolCall], Optional[tuple[Dict[str, Any], Sequence[str]]]] | None = None
+    on_cache_hit: Callable[[ToolCall, Dict[str, Any]], None] | None = None
+    _semaphore: threading.BoundedSemaphore = field(init=False, repr=False)
+
+    def __post_init__(self) -> None:
+        if self.mode == "async" and not inspect.iscoroutinefunction(self.handler):
+            raise ValueError(f"{self.name}: async-режим требует корутину")
+        self._semaphore = threading.BoundedSemaphore(max(1, self.max_concurrency))
+
+
+class ToolRegistry:
+    """Named tool adapters plus the bounded pools that run them."""
+
+    def __init__(self, config: AgentConfig | None = None) -> None:
+        self._config = config or agent_config
+        self._adapters: dict[str, ToolAdapter] = {}
+        self._lock = threading.Lock()
+        self._threads: ThreadPoolExecutor | None = None
+        self._loaded_plugins: set[str] = set()
+
+    def register(self, adapter: ToolAdapter, *, replace: bool = False) -> ToolAdapter:
+        adapter.timeout_s = self._config.tool_timeouts.get(adapter.name, adapter.timeout_s)
+        concurrency = self._config.tool_concurrency.get(adapter.name)
+        if concurrency:
+            adapter.max_concurrency = concurrency
+            adapter._semaphore = threading.BoundedSemaphore(max(1, concurrency))
+        with self._lock:
+            if adapter.name in self._adapters and not replace:
+                raise ValueError(f"Инструмент {adapter.name} уже зарегистрирован")
+            self._adapters[adapter.name] = adapter
+        return adapter
+
+    def get(self, name: str) -> ToolAdapter:
+        adapter = self._adapters.get(name)
+        if adapter is None:
+            raise ValueError(f"Неизвестный инструмент: {name}")
+        return adapter
+
+    def __contains__(self, name: object) -> bool:
+        return name in self._adapters
+
+    def names(self) -> List[str]:
+        return list(self._adapters)
+
+    def describe(self, names: Iterable[str] | None = None) -> str:
+        selected = list(names) if names is not None else self.names()
+        return "\n".join(
+            f"- {name}: {self._adapters[name].description}" for name in selected if name in self._adapters
+        )
+
+    def load_plugins(self, modules: Iterable[str]) -> None:
+        """Import plugin modules; each registers its adapters on import."""
+
+        for module in modules:
+            if module in self._loaded_plugins:
+                continue
+            importlib.import_module(module)
+            self._loaded_plugins.add(module)
+
+    def execute(self, adapter: ToolAdapter, call: ToolCall) -> ToolResult:
+        timeout = adapter.timeout_s
+        if not adapter._semaphore.acquire(timeout=timeout or None):
+            raise TimeoutError(f"{adapter.name}: нет свободного слота за {timeout} с")
+        try:
+            future = self._submit(adapter, call)
+        except BaseException:
+            adapter._semaphore.release()
+            raise
+        # Слот освобождается, когда работа действительно закончилась, а не по таймауту:
+        # зависший разбор продолжает занимать слот и не даёт запустить лишние копии.
+        future.add_done_callback(lambda _: adapter._semaphore.release())
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeoutError as exc:
+            future.cancel()
+            raise TimeoutError(f"{adapter.name}: превышен таймаут {timeout} с") from exc
+
+    def _submit(self, adapter: ToolAdapter, call: ToolCall) -> Future:
+        if adapter.mode == "process":
+            return cpu_pool.submit(adapter.handler, call.detached())
+        if adapter.mode == "async":
+            return self._thread_pool().submit(asyncio.run, adapter.handler(call))
+        return self._thread_pool().submit(adapter.handler, call)
+
+    def _thread_pool(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._threads is None:
+                workers = max(4, sum(item.max_concurrency for item in self._adapters.values()))
+                self._threads = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="tool")
+            return self._threads
+
+
+tool_registry = ToolRegistry()
@@ -0,0 +1,43 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+
+def read_table(path: Path) -> pd.DataFrame:
+    suffix = path.suffix.lower()
+    if suffix == ".csv":
+        return pd.read_csv(path)
+    if suffix == ".tsv":
+        return pd.read_csv(path, sep="\t")
+    if suffix in {".xlsx", ".xls"}:
+        return pd.read_excel(path)
+    raise ValueError(f"Файл {path.name} не является табличным форматом")
+
+
+def summarize_dataframe(df: pd.DataFrame, path: str) -> dict:
+    numeric = df.select_dtypes(include=[np.number]).copy()
+    summary = {"path": path, "row_count": len(df), "columns": list(df.columns), "stats": []}
+    for column in numeric.columns:
+        series = numeric[column].dropna()
+        if series.empty:
+            continue
+        summary["stats"].append(
+            {
+                "column": column,
+                "sum": float(series.sum()),
+                "mean": float(series.mean()),
+                "min": float(series.min()),
+                "max": float(series.max()),
+                "std": float(series.std(ddof=0)),
+            }
+        )
+    return summary
+
+
+def summarize_table(path: str) -> dict:
+    """Read and aggregate one table; runs in the CPU pool, only the dict leaves the worker."""
+
+    return summarize_dataframe(read_table(Path(path)), path)
@@ -1,6 +1,7 @@
 from __future__ import annotations
 
 import asyncio
+import signal
 
 import uvicorn
 import uvloop
@@ -16,11 +17,20 @@ from litestar.openapi.plugins import JsonRenderPlugin, SwaggerRenderPlugin
 from litestar.openapi.spec import Components, SecurityScheme
 from litestar.static_files import create_static_files_router
 
+from agent.core.process_pool import cpu_pool
+from agent.tools.legal_rag import legal_indexes
 from app.api.router import api_router
 from app.infra import ioc
 from app.infra.config import config
 
 
+def _reload_legal_indexes_on_sighup() -> None:
+    # kill -HUP <pid> после index-documents: новая версия индекса открывается сразу,
+    # не дожидаясь опроса CURRENT.
+    if hasattr(signal, "SIGHUP"):
+        asyncio.get_running_loop().add_signal_handler(signal.SIGHUP, legal_indexes.request_reload)
+
+
 async def _main() -> None:
     async with AsyncContextWrapper(
         make_async_container(ioc.MainProvider())
@@ -91,6 +101,7 @@ async def _main() -> None:
                 ),
             ),
             path=config.base_api_url,
+            on_startup=[cpu_pool.warm, _reload_legal_indexes_on_sighup],
         )
         setup_dishka(container, app)
         await uvicorn.Server(
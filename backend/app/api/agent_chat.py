@@ -12,6 +12,7 @@ from litestar.exceptions import WebSocketDisconnect
 
 from app.application.auth import AuthenticationService
 from app.application.exceptions import InvalidToken
+from app.domain.dao import OrganizationDao
 from app.infra.agent_bridge import AgentAttachment, run_agent_with_streaming
 from app.infra.db.repo import ChatRepository
 from app.infra.db.repo.uow import UnitOfWork
@@ -38,6 +39,10 @@ async def agent_websocket(socket: WebSocket[Any, Any, Any]) -> None:
         return
 
     await socket.send_json({"type": "connected", "user_id": user.id})
+    # Юридический поиск идёт по индексу организации пользователя.
+    async with OrganizationDao() as dao:
+        organization = await dao.get_organization_by_user_id(user.id)
+    organization_id = organization.id if organization else None
 
     while True:
         try:
@@ -92,6 +97,7 @@ async def agent_websocket(socket: WebSocket[Any, Any, Any]) -> None:
                 text=text,
                 attachments=attachments,
                 session_id=session_id,
+                organization_id=organization_id,
             )
 
 
@@ -7,9 +7,12 @@ from typing import Any, Iterable, Sequence
 from litestar.connection import WebSocket
 
 from agent.core.agent_logger import agent_logger
-from agent.core.graph import agent_graph
+from agent.core.blob_store import blob_store
+from agent.core.checkpoint import invoke_with_checkpoint, session_thread_id
+from agent.core.graph import get_agent_graph
 from agent.core.llm import get_llm_stats, reset_llm_stats
 from agent.core.model_manager import model_manager
+from agent.core.speculation import speculator
 from agent.core.state import AgentState, initial_state
 from app.infra.db.repo import ChatRepository
 
@@ -34,6 +37,7 @@ async def run_agent_with_streaming(
     text: str,
     attachments: Sequence[AgentAttachment] | None = None,
     session_id: int | None = None,
+    organization_id: int | None = None,
 ) -> dict[str, Any]:
 
     attachments = list(attachments or [])
@@ -71,10 +75,17 @@ async def run_agent_with_streaming(
         _forward_events(event_queue=event_queue, websocket=websocket, session_id=session_id)
     )
 
-    state = initial_state(query=text, files=[item.path for item in attachments])
+    state = initial_state(
+        query=text,
+        files=[item.path for item in attachments],
+        agent_type=agent_type,
+        namespace=str(organization_id) if organization_id is not None else None,
+    )
 
     try:
-        result = await asyncio.to_thread(_invoke_agent, state)
+        result = await asyncio.to_thread(
+            _invoke_agent, state, session_thread_id(session_id)
+        )
         final_answer = result.get("final_answer") or ""
         agent_message = await repository.save_message(
             session_id=session_id,
@@ -91,6 +102,7 @@ async def run_agent_with_streaming(
                 "tool_results": result.get("tool_results", []),
                 "events": result.get("events", []),
                 "llm_stats": result.get("llm_stats", {}),
+                "llm_calls_skipped": result.get("llm_calls_skipped", {}),
                 "llm_backend": result.get("llm_backend", {}),
                 "agent_message_id": agent_message.id,
             }
@@ -116,10 +128,20 @@ async def run_agent_with_streaming(
         await forwarder
 
 
-def _invoke_agent(state: AgentState) -> AgentState:
+def _invoke_agent(state: AgentState, thread_id: str) -> AgentState:
     reset_llm_stats()
-    result = agent_graph.invoke(state)
+    try:
+        result = invoke_with_checkpoint(
+            get_agent_graph(state.get("agent_type")), state, thread_id
+        )
+    finally:
+        speculator.discard(state.get("run_id"))
+    # Полные выводы инструментов нужны только промптам внутри прогона,
+    # клиент получает сводки и дескрипторы. После ошибки блобы остаются для
+    # продолжения с чекпоинта и удаляются по TTL.
+    blob_store.release(result.get("run_id"))
     result["llm_stats"] = get_llm_stats().to_dict()
+    result["llm_stats"]["skipped_calls"] = sum(result.get("llm_calls_skipped", {}).values())
     result["llm_backend"] = model_manager.backend_report()
     return result
 